@@ -0,0 +1,276 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+A Python client for the glTF render server (or router), for tools that render
+many images. It keeps its connections open between requests, retries when the
+server is too busy, and offers an asyncio API (atop a pool of threads) that
+keeps a bounded number of requests in flight.
+"""
+
+import asyncio
+import concurrent.futures
+import email
+import email.utils
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+import time
+import typing
+
+import requests
+import requests.adapters
+
+# A glTF scene: its file's path, or its contents.
+Scene = typing.Union[str, os.PathLike, bytes]
+
+
+class RenderError(Exception):
+    """An error response from the render server."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class RenderClient:
+    """A blocking client. It's safe to share one client among threads."""
+
+    def __init__(
+        self,
+        url: str = "http://127.0.0.1:8000",
+        *,
+        max_connections: int = 8,
+        max_retries: int = 5,
+        timeout: float = 600.0,
+    ):
+        """The max_connections is how many connections to keep open (i.e.,
+        the most concurrent requests that don't need a new connection). When
+        the server answers 503 (Service Unavailable), we wait as long as its
+        Retry-After header asks and try again, up to max_retries times. The
+        timeout (in seconds) applies to each request.
+        """
+        self._url = url.rstrip("/")
+        self._max_retries = max_retries
+        self._timeout = timeout
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_connections
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def close(self):
+        """Closes all of our connections."""
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def render(
+        self,
+        scene: Scene,
+        *,
+        cameras: typing.Optional[typing.List[dict]] = None,
+        **fields,
+    ) -> typing.Union[bytes, typing.List[bytes]]:
+        """Renders the given scene via /render, and returns the PNG image.
+
+        The fields are the form fields of Drake's render API, e.g.,
+        image_type="color", width=640, etc. (except for the scene_sha256,
+        which we compute). When cameras is given, the server renders one image
+        per item of that list (each of which overrides some of the fields),
+        and we return the list of PNG images, in order.
+        """
+        content = _read_scene(scene)
+        data = self._form(fields, cameras=cameras)
+        data["scene_sha256"] = hashlib.sha256(content).hexdigest()
+        files = {"scene": ("scene.gltf", content)}
+        response = self._post("/render", data=data, files=files)
+        return self._images(response, multiple=cameras is not None)
+
+    def create_session(self, scene: Scene) -> str:
+        """Uploads the given scene to render it repeatedly via
+        render_session(), and returns the session's id.
+        """
+        files = {"scene": ("scene.gltf", _read_scene(scene))}
+        response = self._post("/session", files=files)
+        return response.json()["session_id"]
+
+    def render_session(
+        self,
+        session_id: str,
+        *,
+        poses: typing.Optional[
+            typing.Dict[str, typing.Sequence[float]]
+        ] = None,
+        cameras: typing.Optional[typing.List[dict]] = None,
+        **fields,
+    ) -> typing.Union[bytes, typing.List[bytes]]:
+        """Renders the given session's scene, like render(). The poses map
+        glTF node names to their new local transforms, each as 16 numbers in
+        the column-major order of a glTF node's "matrix".
+        """
+        data = self._form(fields, cameras=cameras)
+        if poses is not None:
+            data["poses"] = json.dumps(
+                {k: [float(x) for x in v] for k, v in poses.items()}
+            )
+        response = self._post(f"/session/{session_id}/render", data=data)
+        return self._images(response, multiple=cameras is not None)
+
+    def delete_session(self, session_id: str):
+        """Ends the given session."""
+        self._request("DELETE", f"/session/{session_id}")
+
+    @staticmethod
+    def _form(fields: dict, *, cameras) -> dict:
+        """Returns the form data for the given fields and cameras."""
+        result = {k: str(v) for k, v in fields.items() if v is not None}
+        if cameras is not None:
+            result["cameras"] = json.dumps(cameras)
+        return result
+
+    def _post(self, path: str, **kwargs) -> requests.Response:
+        return self._request("POST", path, **kwargs)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Sends the request, retrying while the server is unavailable, and
+        returns the (successful) response.
+        """
+        for attempt in range(self._max_retries + 1):
+            response = self._session.request(
+                method, self._url + path, timeout=self._timeout, **kwargs
+            )
+            if response.status_code != 503 or attempt == self._max_retries:
+                break
+            time.sleep(_retry_delay(response, attempt))
+        if not response.ok:
+            try:
+                message = response.json()["message"]
+            except (ValueError, KeyError, TypeError):
+                message = response.text
+            raise RenderError(response.status_code, message)
+        return response
+
+    @staticmethod
+    def _images(
+        response: requests.Response, *, multiple: bool
+    ) -> typing.Union[bytes, typing.List[bytes]]:
+        """Returns the PNG image(s) in the response."""
+        if not multiple:
+            return response.content
+        content_type = response.headers["Content-Type"]
+        message = email.message_from_bytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + response.content
+        )
+        parts = sorted(
+            message.get_payload(),
+            key=lambda x: int(
+                x.get_param("name", header="content-disposition")
+            ),
+        )
+        return [x.get_payload(decode=True) for x in parts]
+
+
+class ThreadedAsyncRenderClient:
+    """An asyncio wrapper around a RenderClient, which keeps at most
+    max_in_flight requests in flight at once (and waits for a free slot before
+    sending any more). To keep every render process busy, set max_in_flight to
+    at least the server's number of --workers.
+
+    This is not a native asyncio HTTP client: each request still blocks one of
+    max_in_flight threads until its response arrives, and only the waiting for
+    it happens in the event loop.
+    """
+
+    def __init__(
+        self,
+        url: str = "http://127.0.0.1:8000",
+        *,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        timeout: float = 600.0,
+    ):
+        """See RenderClient for the other arguments."""
+        self._client = RenderClient(
+            url,
+            max_connections=max_in_flight,
+            max_retries=max_retries,
+            timeout=timeout,
+        )
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_in_flight)
+
+    async def close(self):
+        """Closes all of our connections."""
+        self._executor.shutdown(wait=False)
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def render(self, scene: Scene, **kwargs):
+        """See RenderClient.render()."""
+        return await self._call(self._client.render, scene, **kwargs)
+
+    async def render_many(
+        self, jobs: typing.Iterable[dict]
+    ) -> typing.List[typing.Union[bytes, typing.List[bytes]]]:
+        """Renders all of the given jobs (each of which is a dict of the
+        keyword arguments to render(), including the scene) concurrently, and
+        returns their results, in order.
+        """
+        return await asyncio.gather(*(self.render(**x) for x in jobs))
+
+    async def create_session(self, scene: Scene) -> str:
+        """See RenderClient.create_session()."""
+        return await self._call(self._client.create_session, scene)
+
+    async def render_session(self, session_id: str, **kwargs):
+        """See RenderClient.render_session()."""
+        return await self._call(
+            self._client.render_session, session_id, **kwargs
+        )
+
+    async def delete_session(self, session_id: str):
+        """See RenderClient.delete_session()."""
+        return await self._call(self._client.delete_session, session_id)
+
+    async def _call(self, function, *args, **kwargs):
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(function, *args, **kwargs)
+            )
+
+
+def _read_scene(scene: Scene) -> bytes:
+    """Returns the contents of the given scene."""
+    if isinstance(scene, bytes):
+        return scene
+    return Path(scene).read_bytes()
+
+
+def _retry_delay(response: requests.Response, attempt: int) -> float:
+    """Returns how many seconds to wait before retrying after the given 503
+    response: what its Retry-After header asks for or, absent that, an
+    exponential backoff.
+    """
+    value = response.headers.get("Retry-After")
+    if value is not None:
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return min(0.1 * 2**attempt, 10.0)
@@ -0,0 +1,68 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+The render server's model of how long its render jobs take, which its
+scheduler uses to pick the next job.
+"""
+
+import threading
+import typing
+
+import numpy as np
+
+# The ridge regularization (which keeps the fit well-defined before it has
+# seen every kind of job), and how much weight each job keeps for every newer
+# one (so that the fit follows, e.g., warming caches).
+_RIDGE = 1e-3
+_FORGETTING = 0.98
+
+
+class CostModel:
+    """Predicts how many seconds a job will take from its features (a vector
+    of numbers, e.g., how many images of each type it renders), from a
+    least-squares fit to the jobs it's seen so far. The fit weighs the older
+    jobs less and less (see _FORGETTING). Until it has seen any jobs, it
+    predicts zero for every job.
+    """
+
+    def __init__(self, feature_names: typing.Sequence[str]):
+        """The feature_names name each element of the feature vectors, for
+        report().
+        """
+        self._lock = threading.Lock()
+        self._feature_names = tuple(feature_names)
+        size = len(self._feature_names)
+        self._gram = np.zeros((size, size))
+        self._moment = np.zeros(size)
+        self._weights = np.zeros(size)
+        self._num_samples = 0
+
+    def predict(self, features: np.ndarray) -> float:
+        """Returns the expected duration of a job, in seconds."""
+        with self._lock:
+            return max(float(self._weights @ features), 0.0)
+
+    def update(self, features: np.ndarray, seconds: float):
+        """Adds a job that took the given duration to the fit."""
+        with self._lock:
+            self._gram = _FORGETTING * self._gram + np.outer(
+                features, features
+            )
+            self._moment = _FORGETTING * self._moment + (seconds * features)
+            self._weights = np.linalg.solve(
+                self._gram + _RIDGE * np.eye(len(features)),
+                self._moment,
+            )
+            self._num_samples += 1
+
+    def report(self) -> dict:
+        """Returns the fit's weights (in seconds per unit of each feature)
+        and its number of jobs, for /metrics.
+        """
+        with self._lock:
+            return {
+                "num_samples": self._num_samples,
+                "weights": dict(
+                    zip(self._feature_names, self._weights.tolist())
+                ),
+            }
@@ -10,17 +10,21 @@ lighting) is provided by a Blender file.
 """
 
 import argparse
+import concurrent.futures
 import dataclasses as dc
 import logging
+import multiprocessing
 import os
 from pathlib import Path
 import signal
-import socket
 import subprocess
 import tempfile
 import time
 import typing
+import urllib.request
 
+import cv2
+import numpy as np
 from pydrake.common import configure_logging
 from pydrake.common.yaml import yaml_load_typed
 from pydrake.multibody.parsing import (
@@ -50,6 +54,9 @@ from pydrake.visualization import (
 from python import runfiles
 import tqdm
 
+# The frame rate of the videos we create.
+_VIDEO_FPS = 16
+
 
 @dc.dataclass
 class Scenario:
@@ -89,21 +96,44 @@ class _ProgressBar:
         self._tqdm.update(self._current_time - old_time)
 
 
-def _run(args):
-    """Runs the demo."""
-    scenario = yaml_load_typed(
-        schema=Scenario, filename=args.scenario_file, defaults=Scenario()
+def _load_scenario(scenario_file):
+    return yaml_load_typed(
+        schema=Scenario, filename=scenario_file, defaults=Scenario()
     )
 
-    # Create the scene.
-    builder = DiagramBuilder()
-    plant, scene_graph = AddMultibodyPlant(
+
+def _add_plant(builder, scenario):
+    """Adds the scenario's (finalized) plant to the builder, and returns it."""
+    plant, _ = AddMultibodyPlant(
         config=MultibodyPlantConfig(), builder=builder
     )
-    added_models = ProcessModelDirectives(
+    ProcessModelDirectives(
         directives=ModelDirectives(directives=scenario.directives), plant=plant
     )
     plant.Finalize()
+    return plant
+
+
+def _image_kinds(args):
+    """Returns the kinds of images to render, per the command line."""
+    kinds = []
+    if args.color:
+        kinds.append("color")
+    if args.depth:
+        kinds.append("depth")
+    if args.label:
+        kinds.append("label")
+    assert len(kinds) > 0, "At least one image type must be specified."
+    return kinds
+
+
+def _run(args):
+    """Runs the demo."""
+    scenario = _load_scenario(args.scenario_file)
+
+    # Create the scene.
+    builder = DiagramBuilder()
+    _add_plant(builder, scenario)
 
     def add_still(port_name: str, base_name: str, writer: ImageWriter):
         image_type = port_name.split("_")[0]
@@ -159,15 +189,10 @@ def _run(args):
                     port_name="label_image", base_name=name, writer=writer
                 )
         else:
-            kinds = []
-            if args.color:
-                kinds.append("color")
-            if args.depth:
-                kinds.append("depth")
-            if args.label:
-                kinds.append("label")
-            assert len(kinds) > 0, "At least one image type must be specified."
-            writer = VideoWriter(filename=f"{name}.mp4", fps=16, backend="cv2")
+            kinds = _image_kinds(args)
+            writer = VideoWriter(
+                filename=f"{name}.mp4", fps=_VIDEO_FPS, backend="cv2"
+            )
             builder.AddSystem(writer)
             writer.ConnectRgbdSensor(
                 builder=builder, sensor=sensor, kinds=kinds
@@ -190,6 +215,139 @@ def _run(args):
             writer.Save()
 
 
+class _FrameRenderer:
+    """Renders the scenario's cameras at given plant positions, in one of the
+    worker processes of _run_offline().
+    """
+
+    def __init__(self, scenario_file, kinds):
+        scenario = _load_scenario(scenario_file)
+        builder = DiagramBuilder()
+        self._plant = _add_plant(builder, scenario)
+        # The image output ports of each camera, one per kind of image.
+        self._cameras = []
+        for _, camera in scenario.cameras.items():
+            ApplyCameraConfig(config=camera, builder=builder)
+            sensor = builder.GetSubsystemByName(f"rgbd_sensor_{camera.name}")
+            ports = []
+            for kind in kinds:
+                if kind == "color":
+                    ports.append(sensor.GetOutputPort("color_image"))
+                    continue
+                if kind == "depth":
+                    colorizer = builder.AddSystem(ColorizeDepthImage())
+                    builder.Connect(
+                        sensor.GetOutputPort("depth_image_16u"),
+                        colorizer.GetInputPort("depth_image_16u"),
+                    )
+                else:
+                    colorizer = builder.AddSystem(ColorizeLabelImage())
+                    builder.Connect(
+                        sensor.GetOutputPort("label_image"),
+                        colorizer.get_input_port(),
+                    )
+                ports.append(colorizer.get_output_port())
+            self._cameras.append((camera.name, ports))
+        self._diagram = builder.Build()
+        self._context = self._diagram.CreateDefaultContext()
+
+    def render(self, index, time, positions, out_dir):
+        """Renders every camera with the plant at the given positions, and
+        saves each camera's images (side by side, as RGB) to out_dir.
+        """
+        self._context.SetTime(time)
+        self._plant.SetPositions(
+            self._plant.GetMyContextFromRoot(self._context), positions
+        )
+        for name, ports in self._cameras:
+            images = []
+            for port in ports:
+                system_context = port.get_system().GetMyContextFromRoot(
+                    self._context
+                )
+                images.append(port.Eval(system_context).data[:, :, :3])
+            np.save(out_dir / f"{name}_{index:05}.npy", np.hstack(images))
+
+
+# The _FrameRenderer of each of _run_offline()'s worker processes.
+_frame_renderer = None
+
+
+def _init_frame_renderer(scenario_file, kinds):
+    global _frame_renderer
+    _frame_renderer = _FrameRenderer(scenario_file, kinds)
+
+
+def _render_frame(frame):
+    _frame_renderer.render(*frame)
+
+
+def _run_offline(args):
+    """Runs the demo in offline mode: first simulates (recording the plant's
+    positions at each video frame), then renders args.parallel frames at a
+    time, and finally writes out the videos.
+    """
+    scenario = _load_scenario(args.scenario_file)
+    kinds = _image_kinds(args)
+
+    # Simulate.
+    logging.info("Simulating")
+    start_time = time.time()
+    builder = DiagramBuilder()
+    plant = _add_plant(builder, scenario)
+    simulator = Simulator(builder.Build())
+    ApplySimulatorConfig(scenario.simulator_config, simulator)
+    plant_context = plant.GetMyContextFromRoot(simulator.get_context())
+    out_dir = Path(os.environ["TMPDIR"]) / "frames"
+    out_dir.mkdir()
+    num_frames = int(scenario.simulation_duration * _VIDEO_FPS) + 1
+    frames = []
+    for index in tqdm.tqdm(range(num_frames)):
+        frame_time = index / _VIDEO_FPS
+        simulator.AdvanceTo(frame_time)
+        positions = plant.GetPositions(plant_context).copy()
+        frames.append((index, frame_time, positions, out_dir))
+    logging.info(f"Simulated in {time.time() - start_time:.1f} seconds")
+
+    # Render. Each worker process has its own copy of the diagram, so that
+    # the render requests go out (to the server's workers) in parallel. We
+    # spawn the processes afresh, rather than forking this one.
+    logging.info(f"Rendering {num_frames} frames, {args.parallel} at a time")
+    start_time = time.time()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.parallel,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_frame_renderer,
+        initargs=(args.scenario_file, kinds),
+    ) as pool:
+        futures = [pool.submit(_render_frame, x) for x in frames]
+        for future in tqdm.tqdm(
+            concurrent.futures.as_completed(futures), total=len(futures)
+        ):
+            future.result()
+    elapsed = time.time() - start_time
+    logging.info(
+        f"Rendered in {elapsed:.1f} seconds "
+        f"({num_frames / elapsed:.2f} frames per second)"
+    )
+
+    # Write the frames out in order, just like VideoWriter would have.
+    for _, camera in scenario.cameras.items():
+        writer = None
+        for index in range(num_frames):
+            image = np.load(out_dir / f"{camera.name}_{index:05}.npy")
+            if writer is None:
+                height, width, _ = image.shape
+                writer = cv2.VideoWriter(
+                    f"{camera.name}.mp4",
+                    cv2.VideoWriter_fourcc(*"mp4v"),
+                    _VIDEO_FPS,
+                    (width, height),
+                )
+            writer.write(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        writer.release()
+
+
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -236,7 +394,21 @@ def main():
         help="If true, stores the label image. If none of --color, --depth, "
         "or --label are specified, it is the same as --color.",
     )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="N",
+        help="Render offline: simulate first, and then render the video's "
+        "frames N at a time (with N server workers) once the simulation is "
+        "done. This is much faster than rendering during the simulation, "
+        "which renders one frame at a time.",
+    )
     args = parser.parse_args()
+    if args.parallel is not None:
+        if args.parallel < 1:
+            parser.error("--parallel must be at least 1")
+        if args.still:
+            parser.error("--parallel only applies to videos, not --still")
 
     if args.scenario_file is None:
         scenario_file = _find_resource("drake_blender/examples/ball_bin.yaml")
@@ -258,18 +430,26 @@ def main():
         ]
         if args.bpy_settings_file:
             command.append(f"--bpy_settings_file={args.bpy_settings_file}")
+        if args.parallel is not None:
+            command.append(f"--workers={args.parallel}")
+        # Only warm up the kinds of images we'll actually be asking for.
+        command.append("--warmup_image_types")
+        for image_type in ("color", "depth", "label"):
+            if getattr(args, image_type):
+                command.append(image_type)
         server_process = subprocess.Popen(
             command, stdout=log_file, stderr=subprocess.STDOUT
         )
-        # Wait until the server is ready.
+        # Wait until the server is warmed up and ready.
         while True:
-            with socket.socket() as s:
-                try:
-                    s.connect(("127.0.0.1", 8000))
+            try:
+                with urllib.request.urlopen("http://127.0.0.1:8000/readyz"):
                     # Success!
                     break
-                except ConnectionRefusedError as e:
-                    time.sleep(0.1)
+            except OSError:
+                # Either the server isn't listening yet, or it responded with
+                # an HTTP error because it is still warming up.
+                time.sleep(0.1)
             assert server_process.poll() is None
         logging.info("The drake-blender server is ready")
     else:
@@ -277,7 +457,10 @@ def main():
 
     # Run the demo.
     try:
-        _run(args)
+        if args.parallel is not None:
+            _run_offline(args)
+        else:
+            _run(args)
     finally:
         if server_process is not None:
             server_process.send_signal(signal.SIGINT)
@@ -110,6 +110,22 @@ class BallBinTest(unittest.TestCase):
         self.assertTrue((self.out_dir / "vtk_camera.mp4").exists())
         self.assertTrue((self.out_dir / "blender_camera.mp4").exists())
 
+    def test_parallel_video(self):
+        """Checks that the offline mode creates the same 2x video files."""
+        scenario_file = self._get_scenario_file(
+            nerf_function=self._small_video
+        )
+
+        run_args = self.default_run_args + [
+            "--parallel=2",
+            f"--scenario_file={scenario_file}",
+        ]
+
+        result = subprocess.run(run_args, cwd=self.out_dir)
+        result.check_returncode()
+        self.assertTrue((self.out_dir / "vtk_camera.mp4").exists())
+        self.assertTrue((self.out_dir / "blender_camera.mp4").exists())
+
     def test_dynamics(self):
         """A regression test to confirm that the simulation runs successfully
         to end."""
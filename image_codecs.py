@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+The image encodings that the render server (and its benchmark) use, in plain
+NumPy: Drake's depth images, PNG files, and Blender's cryptomatte ids.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+UINT16_MAX = 2**16 - 1
+
+
+def depth_to_uint16(
+    depth: np.ndarray, *, min_depth: float, max_depth: float
+) -> np.ndarray:
+    """Converts a depth image in meters to Drake's 16-bit depth image in
+    millimeters. Returns closer than min_depth become 0 ("too close"). Returns
+    beyond max_depth become the maximum value ("too far"), as do missing
+    returns (which Blender reports as the far clipping distance).
+    """
+    result = np.rint(depth * 1000).clip(0, UINT16_MAX).astype(np.uint16)
+    result[depth < min_depth] = 0
+    result[~(depth <= max_depth)] = UINT16_MAX
+    return result
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encodes a 16-bit grayscale image (of shape (height, width)), or an 8-bit
+    RGB or RGBA image (of shape (height, width, 3 or 4)), as a PNG file.
+    """
+    if image.dtype == np.uint16 and image.ndim == 2:
+        bit_depth, color_type = 16, 0
+    elif image.dtype == np.uint8 and image.ndim == 3 and image.shape[2] == 3:
+        bit_depth, color_type = 8, 2
+    elif image.dtype == np.uint8 and image.ndim == 3 and image.shape[2] == 4:
+        bit_depth, color_type = 8, 6
+    else:
+        raise NotImplementedError(f"{image.dtype} {image.shape}")
+    height, width = image.shape[:2]
+    # Each row is a filter type byte (zero, for none) and big-endian pixels.
+    data = image.astype(image.dtype.newbyteorder(">")).view(np.uint8)
+    data = data.reshape(height, -1)
+    rows = np.zeros((height, 1 + data.shape[1]), dtype=np.uint8)
+    rows[:, 1:] = data
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data)
+        return (
+            struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+        )
+
+    header = struct.pack(
+        ">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0
+    )
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", header),
+            chunk(b"IDAT", zlib.compress(rows.tobytes(), level=1)),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+def murmur3_32(data: bytes, seed: int = 0) -> int:
+    """Returns the 32-bit MurmurHash3 of the given data."""
+    mask = 0xFFFFFFFF
+    c1 = 0xCC9E2D51
+    c2 = 0x1B873593
+
+    def mix(k):
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        return (k * c2) & mask
+
+    h = seed
+    end = len(data) - len(data) % 4
+    for (k,) in struct.iter_unpack("<I", data[:end]):
+        h ^= mix(k)
+        h = ((h << 13) | (h >> 19)) & mask
+        h = (h * 5 + 0xE6546B64) & mask
+    if end < len(data):
+        h ^= mix(int.from_bytes(data[end:], "little"))
+    h ^= len(data)
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & mask
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & mask
+    h ^= h >> 16
+    return h
+
+
+def cryptomatte_id(name: str) -> int:
+    """Returns the bits of the float32 that identifies the object with the
+    given name in Blender's cryptomatte passes. (This is the same hash that
+    Blender computes; its exponent is clamped to avoid infinities and NaNs.)
+    """
+    h = murmur3_32(name.encode("utf-8"))
+    exponent = min(max((h >> 23) & 0xFF, 1), 254)
+    return (h & 0x807FFFFF) | (exponent << 23)
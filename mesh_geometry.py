@@ -0,0 +1,178 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+The mesh geometry behind the render server's frustum culling and its
+level-of-detail proxies.
+
+The functions that take or make Blender meshes import bpy (and mathutils) when
+they're called, so that importing this module stays cheap; by then, the server
+has already imported them (see server._import_bpy()).
+"""
+
+import dataclasses as dc
+import math
+import typing
+
+import numpy as np
+
+
+def to_camera_frame(
+    camera: "bpy.types.Object", points: np.ndarray
+) -> np.ndarray:
+    """Returns the given world points (an array of shape (N, 3)) in the given
+    camera's frame. Blender's cameras look down their -Z axis, with +Y up.
+    """
+    matrix = np.linalg.inv(np.array(camera.matrix_world))
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+class MeshBounds:
+    """The world-space bounding boxes of some meshes, for frustum culling
+    (see server.Blender._frustum_culling()).
+    """
+
+    def __init__(self, bpy_objects: typing.Iterable["bpy.types.Object"]):
+        """Takes the bounds of the given objects' meshes (skipping any other
+        objects) in their current poses.
+        """
+        self._names = []
+        corners = []
+        for bpy_object in bpy_objects:
+            if bpy_object.type != "MESH":
+                continue
+            matrix = np.array(bpy_object.matrix_world)
+            local = np.array([tuple(x) for x in bpy_object.bound_box])
+            corners.append(local @ matrix[:3, :3].T + matrix[:3, 3])
+            self._names.append(bpy_object.name)
+        # The eight corners of each box, of shape (N, 8, 3).
+        self._corners = np.array(corners).reshape(-1, 8, 3)
+
+    def outside(
+        self,
+        params: "server.RenderParams",
+        camera: "bpy.types.Object",
+        *,
+        margin,
+    ) -> typing.List[str]:
+        """Returns the names of the meshes that lie entirely outside of the
+        view frustum of the given camera (per the params' intrinsics and
+        clipping planes), grown by the given margin (in meters).
+        """
+        if not self._names:
+            return []
+        points = to_camera_frame(camera, self._corners.reshape(-1, 3))
+        x, y, depth = points[:, 0], points[:, 1], -points[:, 2]
+        # Each plane of the frustum, as the (unnormalized) signed distance of
+        # a point from it (positive inside), and the length of its normal.
+        # The sides lie a pixel beyond the image's edges.
+        fx, fy = params.focal_x, params.focal_y
+        left = params.center_x + 1
+        right = params.width - params.center_x
+        top = params.center_y + 1
+        bottom = params.height - params.center_y
+        planes = [
+            (depth - params.near, 1.0),
+            (params.far - depth, 1.0),
+            (fx * x + left * depth, math.hypot(fx, left)),
+            (-fx * x + right * depth, math.hypot(fx, right)),
+            (-fy * y + top * depth, math.hypot(fy, top)),
+            (fy * y + bottom * depth, math.hypot(fy, bottom)),
+        ]
+        outside = np.zeros(len(self._names), dtype=bool)
+        for distance, norm in planes:
+            distance = (distance / norm).reshape(-1, 8)
+            outside |= np.all(distance < -margin, axis=1)
+        return [name for name, x in zip(self._names, outside) if x]
+
+
+@dc.dataclass
+class MeshProxy:
+    """A decimated copy of a mesh, stored as plain arrays so that it outlives
+    the reloads of the base scene (see server.Blender._level_of_detail()).
+    """
+
+    num_faces: int
+
+    error: float
+    """How far (in the mesh's own units) the proxy strays from the original
+    mesh, at most: the one-sided Hausdorff distance from (a sample of) the
+    original's vertices to the proxy's surface."""
+
+    positions: np.ndarray
+    loop_vertices: np.ndarray
+    loop_starts: np.ndarray
+    material_indices: np.ndarray
+    smooth: np.ndarray
+    uv_layers: typing.Dict[str, np.ndarray]
+
+    @staticmethod
+    def from_mesh(mesh: "bpy.types.Mesh", *, error: float) -> "MeshProxy":
+        def get(collection, attribute, dtype, width=1):
+            result = np.empty(len(collection) * width, dtype=dtype)
+            collection.foreach_get(attribute, result)
+            return result
+
+        return MeshProxy(
+            num_faces=len(mesh.polygons),
+            error=error,
+            positions=get(mesh.vertices, "co", np.float32, 3),
+            loop_vertices=get(mesh.loops, "vertex_index", np.int32),
+            loop_starts=get(mesh.polygons, "loop_start", np.int32),
+            material_indices=get(mesh.polygons, "material_index", np.int32),
+            smooth=get(mesh.polygons, "use_smooth", bool),
+            uv_layers={
+                x.name: get(x.data, "uv", np.float32, 2)
+                for x in mesh.uv_layers
+            },
+        )
+
+    def to_mesh(self, name: str) -> "bpy.types.Mesh":
+        import bpy
+
+        mesh = bpy.data.meshes.new(name)
+        mesh.vertices.add(len(self.positions) // 3)
+        mesh.vertices.foreach_set("co", self.positions)
+        mesh.loops.add(len(self.loop_vertices))
+        mesh.loops.foreach_set("vertex_index", self.loop_vertices)
+        mesh.polygons.add(len(self.loop_starts))
+        mesh.polygons.foreach_set("loop_start", self.loop_starts)
+        mesh.polygons.foreach_set("material_index", self.material_indices)
+        mesh.polygons.foreach_set("use_smooth", self.smooth)
+        for uv_name, uvs in self.uv_layers.items():
+            mesh.uv_layers.new(name=uv_name).data.foreach_set("uv", uvs)
+        mesh.update()
+        return mesh
+
+
+def decimate(mesh: "bpy.types.Mesh", ratio: float) -> "bpy.types.Mesh":
+    """Returns a new mesh with (roughly) the given fraction of the given mesh's
+    faces, per Blender's Decimate modifier.
+    """
+    import bpy
+
+    bpy_object = bpy.data.objects.new("lod_decimate", mesh)
+    bpy.context.scene.collection.objects.link(bpy_object)
+    try:
+        modifier = bpy_object.modifiers.new("decimate", "DECIMATE")
+        modifier.ratio = ratio
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        return bpy.data.meshes.new_from_object(
+            bpy_object.evaluated_get(depsgraph)
+        )
+    finally:
+        bpy.data.objects.remove(bpy_object)
+
+
+def proxy_error(proxy: "bpy.types.Mesh", points: np.ndarray) -> float:
+    """Returns how far the given points (of the original mesh) lie from the
+    given proxy's surface, at most.
+    """
+    import mathutils.bvhtree
+
+    positions = np.empty(len(proxy.vertices) * 3, dtype=np.float32)
+    proxy.vertices.foreach_get("co", positions)
+    tree = mathutils.bvhtree.BVHTree.FromPolygons(
+        positions.reshape(-1, 3).tolist(),
+        [tuple(x.vertices) for x in proxy.polygons],
+    )
+    return max(tree.find_nearest(x)[3] for x in points.tolist())
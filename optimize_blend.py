@@ -0,0 +1,395 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Compiles a blend file into a render-ready one for the render server's
+--blend_file: it makes linked libraries local, bakes in the settings from a
+--bpy_settings_file, applies modifiers, removes everything that never shows
+up in a render (and every datablock that nothing uses), and optionally
+downscales big textures. Then it reports how much faster (and leaner) the
+result is to load, which the server does at startup and for every render.
+"""
+
+import argparse
+import dataclasses as dc
+import json
+import os
+from pathlib import Path
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+# This module comes with Blender, and takes a while to import, so we wait until
+# we need it (see _import_bpy()). That way, e.g., --help starts right away.
+bpy = None
+
+# The modifiers that don't (only) change their object's mesh, so applying
+# them would lose something. We leave objects with any of these alone.
+_UNAPPLIABLE_MODIFIERS = ("PARTICLE_SYSTEM", "FLUID", "DYNAMIC_PAINT")
+
+
+def _import_bpy():
+    """Imports bpy (see above), unless that's been done."""
+    global bpy
+    if bpy is None:
+        import bpy
+
+
+def _rss_bytes() -> int:
+    """Returns the current resident set size of this process, in bytes. On
+    platforms without /proc, falls back to the peak resident set size.
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kibibytes, but macOS reports bytes.
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+@dc.dataclass
+class LoadStats:
+    """What it takes to load one blend file (see _probe())."""
+
+    seconds: float
+    """The median wall time of loading the file."""
+
+    rss_mb: float
+    """How much the process's resident memory grew by loading the file, in
+    MiB."""
+
+    file_mb: float
+    """The size of the file, in MiB."""
+
+    num_datablocks: int
+    """How many datablocks the file holds."""
+
+
+@dc.dataclass
+class Changes:
+    """What optimize() changed, for the report."""
+
+    libraries_made_local: int = 0
+    objects_with_modifiers_applied: int = 0
+    objects_removed: int = 0
+    images_downscaled: int = 0
+    datablocks_purged: int = 0
+
+
+def _all_datablocks() -> typing.List["bpy.types.ID"]:
+    """Returns every datablock in bpy.data."""
+    result = []
+    for prop in bpy.data.bl_rna.properties:
+        if prop.type == "COLLECTION":
+            result.extend(getattr(bpy.data, prop.identifier))
+    return result
+
+
+def _make_libraries_local() -> int:
+    """Turns every datablock that was linked from (or overrides one in)
+    another blend file into a local one, and drops the libraries, so that the
+    result loads on its own. Returns the number of libraries dropped.
+    """
+    count = len(bpy.data.libraries)
+    if count == 0:
+        return 0
+    for datablock in _all_datablocks():
+        if datablock.library is not None or datablock.override_library:
+            datablock.make_local(clear_liboverride=True)
+    bpy.data.batch_remove(list(bpy.data.libraries))
+    return count
+
+
+def _show_in_viewport_as_in_render():
+    """Makes the viewport show what a render shows, so that the (viewport)
+    depsgraph evaluates the scene like a render would.
+    """
+    view_layer = bpy.context.view_layer
+    for obj in bpy.data.objects:
+        obj.hide_viewport = obj.hide_render
+        if obj.name in view_layer.objects:
+            obj.hide_set(False)
+        for modifier in getattr(obj, "modifiers", []):
+            modifier.show_viewport = modifier.show_render
+            # E.g., subdivision surfaces have their own levels for renders.
+            if hasattr(modifier, "render_levels"):
+                modifier.levels = modifier.render_levels
+    for collection in bpy.data.collections:
+        collection.hide_viewport = collection.hide_render
+    layer_collections = [view_layer.layer_collection]
+    while layer_collections:
+        layer_collection = layer_collections.pop()
+        layer_collection.hide_viewport = False
+        layer_collections.extend(layer_collection.children)
+    view_layer.update()
+
+
+def _apply_modifiers() -> int:
+    """Replaces the modifiers of each mesh object in the view layer with the
+    mesh they evaluate to (per their render settings), and returns the
+    number of objects changed.
+    """
+    objects = [
+        x
+        for x in bpy.context.view_layer.objects
+        if x.type == "MESH"
+        and len(x.modifiers) > 0
+        and not any(m.type in _UNAPPLIABLE_MODIFIERS for m in x.modifiers)
+    ]
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for obj in objects:
+        mesh = bpy.data.meshes.new_from_object(
+            obj.evaluated_get(depsgraph),
+            preserve_all_data_layers=True,
+            depsgraph=depsgraph,
+        )
+        obj.modifiers.clear()
+        obj.data = mesh
+    return len(objects)
+
+
+def _remove_unrendered_objects() -> int:
+    """Removes every object that doesn't show up in a render of the scene,
+    and isn't needed by one that does (e.g., as its parent, its instances,
+    or the target of its constraints). Returns the number removed.
+    """
+    scene = bpy.context.scene
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    needed = set()
+    for instance in depsgraph.object_instances:
+        needed.add(instance.object.original)
+        if instance.is_instance:
+            needed.add(instance.parent.original)
+    if scene.camera is not None:
+        needed.add(scene.camera)
+
+    # Follow what the needed objects use, e.g., a parent, or a collection
+    # that's instanced (and then all of that collection's objects).
+    uses = dict()
+    for datablock, users in bpy.data.user_map().items():
+        for user in users:
+            uses.setdefault(user, set()).add(datablock)
+    pending = list(needed)
+    while pending:
+        datablock = pending.pop()
+        for used in uses.get(datablock, ()):
+            if isinstance(used, bpy.types.Collection):
+                more = set(used.all_objects) - needed
+            elif isinstance(used, bpy.types.Object) and used not in needed:
+                more = {used}
+            else:
+                continue
+            needed |= more
+            pending.extend(more)
+
+    removed = [x for x in bpy.data.objects if x not in needed]
+    bpy.data.batch_remove(removed)
+    return len(removed)
+
+
+def _downscale_images(max_size: int) -> int:
+    """Downscales every image (file) with more than max_size pixels on its
+    longer side to that size, and packs the result into the blend file.
+    Returns the number of images downscaled.
+    """
+    count = 0
+    for image in bpy.data.images:
+        if image.source != "FILE":
+            continue
+        width, height = image.size
+        scale = max_size / max(width, height, 1)
+        if scale >= 1:
+            continue
+        image.scale(
+            max(round(width * scale), 1), max(round(height * scale), 1)
+        )
+        image.pack()
+        count += 1
+    return count
+
+
+def _purge_unused() -> int:
+    """Removes every datablock that nothing uses (even ones that were kept
+    only by their fake user), and returns the number removed.
+    """
+    for datablock in _all_datablocks():
+        if datablock.use_fake_user and not isinstance(
+            datablock, (bpy.types.WorkSpace, bpy.types.Screen)
+        ):
+            datablock.use_fake_user = False
+    return bpy.data.orphans_purge(
+        do_local_ids=True, do_linked_ids=True, do_recursive=True
+    )
+
+
+def optimize(
+    *,
+    blend_file: Path,
+    output: Path,
+    bpy_settings_file: Path = None,
+    max_texture_size: int = None,
+) -> Changes:
+    """Writes the render-ready version of the given blend file to the output
+    path (see the module docstring), and returns what changed.
+    """
+    _import_bpy()
+    bpy.ops.wm.open_mainfile(filepath=str(blend_file), load_ui=False)
+    changes = Changes()
+    changes.libraries_made_local = _make_libraries_local()
+
+    # Apply the user's custom settings, the same way that the server does.
+    if bpy_settings_file is not None:
+        with open(bpy_settings_file) as f:
+            code = compile(f.read(), bpy_settings_file, "exec")
+        exec(code, {"bpy": bpy}, dict())
+
+    _show_in_viewport_as_in_render()
+    changes.objects_with_modifiers_applied = _apply_modifiers()
+    changes.objects_removed = _remove_unrendered_objects()
+    if max_texture_size is not None:
+        changes.images_downscaled = _downscale_images(max_texture_size)
+    changes.datablocks_purged = _purge_unused()
+
+    bpy.context.preferences.filepaths.save_version = 0
+    bpy.ops.wm.save_as_mainfile(
+        filepath=str(output.absolute()), compress=False, relative_remap=True
+    )
+    return changes
+
+
+def _probe(blend_file: Path, *, repeat: int, output: Path):
+    """Loads the given blend file `repeat` times in this (fresh) process, and
+    writes its LoadStats to the output path as JSON.
+    """
+    _import_bpy()
+    before = _rss_bytes()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bpy.ops.wm.open_mainfile(filepath=str(blend_file), load_ui=False)
+        durations.append(time.perf_counter() - start)
+    stats = LoadStats(
+        seconds=statistics.median(durations),
+        rss_mb=(_rss_bytes() - before) / 2**20,
+        file_mb=blend_file.stat().st_size / 2**20,
+        num_datablocks=len(_all_datablocks()),
+    )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(dc.asdict(stats), f)
+
+
+def measure(blend_file: Path, *, repeat: int = 3) -> LoadStats:
+    """Returns what it takes to load the given blend file, as measured in a
+    fresh process (so that nothing else is loaded yet).
+    """
+    with tempfile.TemporaryDirectory(prefix="drake_blender_") as temp_dir:
+        output = Path(temp_dir) / "probe.json"
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                f"--probe={blend_file}",
+                f"--repeat={repeat}",
+                f"--probe_output={output}",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output, encoding="utf-8") as f:
+            return LoadStats(**json.load(f))
+
+
+def _print_report(changes: Changes, before: LoadStats, after: LoadStats):
+    for field in dc.fields(changes):
+        name = field.name.replace("_", " ").capitalize()
+        print(f"{name}: {getattr(changes, field.name)}")
+    rows = (
+        ("Load time (s)", "seconds", "{:.3f}"),
+        ("Load memory (MiB)", "rss_mb", "{:.1f}"),
+        ("File size (MiB)", "file_mb", "{:.1f}"),
+        ("Datablocks", "num_datablocks", "{}"),
+    )
+    print(f"{'':<20} {'before':>10} {'after':>10} {'saved':>8}")
+    for label, name, number in rows:
+        old, new = getattr(before, name), getattr(after, name)
+        saved = f"{1 - new / old:.0%}" if old else "-"
+        print(
+            f"{label:<20} {number.format(old):>10} {number.format(new):>10} "
+            f"{saved:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--blend_file",
+        type=Path,
+        metavar="FILE",
+        help="The blend file to optimize.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        metavar="FILE",
+        help="Where to write the optimized blend file. Any relative paths "
+        "in it (e.g., to external textures) are updated to suit.",
+    )
+    parser.add_argument(
+        "--bpy_settings_file",
+        type=Path,
+        metavar="FILE",
+        help="Path to a *.py file that the optimizer will exec() once, and "
+        "bake into the output; its settings then need not be passed to the "
+        "server anymore. Its global namespace contains only `bpy`.",
+    )
+    parser.add_argument(
+        "--max_texture_size",
+        type=int,
+        metavar="PIXELS",
+        help="Downscale every texture image to at most this many pixels on "
+        "its longer side, and pack it into the output. Default: off.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="How many times to load each file when timing it; the median "
+        "is reported. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--skip_report",
+        action="store_true",
+        help="Don't measure (or report) the load time and memory savings.",
+    )
+    # These are only for use by measure().
+    parser.add_argument("--probe", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--probe_output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe is not None:
+        _probe(args.probe, repeat=args.repeat, output=args.probe_output)
+        return
+    if args.blend_file is None or args.output is None:
+        parser.error("--blend_file and --output are required")
+    if args.blend_file.absolute() == args.output.absolute():
+        parser.error("--output must differ from --blend_file")
+
+    changes = optimize(
+        blend_file=args.blend_file,
+        output=args.output,
+        bpy_settings_file=args.bpy_settings_file,
+        max_texture_size=args.max_texture_size,
+    )
+    if args.skip_report:
+        return
+    before = measure(args.blend_file, repeat=args.repeat)
+    after = measure(args.output, repeat=args.repeat)
+    _print_report(changes, before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Runs the render server in worker subprocesses (see Supervisor), for recycling
+them and for rendering in several of them at once.
+"""
+
+import dataclasses as dc
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import typing
+
+import werkzeug.serving
+
+_logger = logging.getLogger("render_supervisor")
+
+
+class Supervisor:
+    """Runs the server in worker subprocesses that all share one listening
+    socket. This serves two purposes:
+
+    - A worker can be recycled (once it reaches --max_requests or
+      --max_rss_mb) without any client noticing. Besides the active workers,
+      a pre-warmed spare is kept waiting, so that the successor of a recycled
+      worker is ready to accept requests immediately.
+    - Several workers (--workers) can render at the same time. Each active
+      worker is pinned to its own slice of the CPUs and renders with a
+      matching, fixed number of threads, so that the workers don't fight over
+      the cores.
+
+    The workers run the given program (i.e., the server itself), with the
+    hidden --worker_fd and --control_fd arguments. A worker announces "ready"
+    on its control pipe once it is initialized, and then waits for "serve" on
+    its stdin (followed by a JSON object with its "cpus" and "render_threads")
+    before it starts to accept connections. Once it needs recycling, it
+    announces "retiring", stops accepting connections, and exits.
+    """
+
+    @dc.dataclass
+    class _Worker:
+        process: subprocess.Popen
+        control_fd: int
+        start_time: float = dc.field(default_factory=time.monotonic)
+        ready: bool = False
+        buffer: bytes = b""
+
+    def __init__(
+        self,
+        *,
+        program: typing.List[str],
+        host: str,
+        port: int,
+        worker_args: typing.List[str],
+        num_workers: typing.Union[int, typing.Literal["auto"]] = 1,
+        render_threads: int = None,
+    ):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self._program = program
+        self._host = host
+        self._socket = socket.create_server((host, port), family=family)
+        self._worker_args = worker_args
+        self._num_workers = num_workers
+        self._render_threads = render_threads
+        self._selector = selectors.DefaultSelector()
+        self._slots = []
+        self._spare = None
+        self._announced = False
+
+    def run(self):
+        """Runs the workers until this process is terminated."""
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+        try:
+            if self._num_workers == "auto":
+                self._num_workers = self._calibrate()
+            self._slots = [self._spawn() for _ in range(self._num_workers)]
+            self._spare = self._spawn()
+            while True:
+                for key, _ in self._selector.select():
+                    self._on_control(key.data)
+        finally:
+            self._stop_all()
+
+    def _subprocess_args(self) -> dict:
+        """Returns the Popen arguments (other than argv) to run a copy of this
+        program.
+        """
+        # Make sure the copy finds the same modules as we do, except for the
+        # ones that bpy adds to our path by itself.
+        blender_dirs = ()
+        bpy = sys.modules.get("bpy")
+        if bpy is not None:
+            blender_dirs = tuple(
+                x
+                for x in map(
+                    bpy.utils.resource_path, ("LOCAL", "USER", "SYSTEM")
+                )
+                if x
+            )
+        python_path = [x for x in sys.path if not x.startswith(blender_dirs)]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+        return dict(env=env)
+
+    def _spawn(self) -> "Supervisor._Worker":
+        control_read, control_write = os.pipe()
+        listen_fd = self._socket.fileno()
+        process = subprocess.Popen(
+            [
+                *self._program,
+                *self._worker_args,
+                f"--worker_fd={listen_fd}",
+                f"--control_fd={control_write}",
+            ],
+            stdin=subprocess.PIPE,
+            pass_fds=(listen_fd, control_write),
+            **self._subprocess_args(),
+        )
+        os.close(control_write)
+        worker = Supervisor._Worker(process=process, control_fd=control_read)
+        self._selector.register(control_read, selectors.EVENT_READ, worker)
+        return worker
+
+    def _partition(self, num_workers: int) -> typing.List[dict]:
+        """Returns the "cpus" and "render_threads" for each of the given
+        number of workers. A lone worker is left unpinned.
+        """
+        if num_workers == 1:
+            return [dict(cpus=None, render_threads=self._render_threads)]
+        if not hasattr(os, "sched_getaffinity"):
+            # We can't pin the workers (e.g., on macOS), so they only split
+            # the CPUs' worth of render threads.
+            render_threads = self._render_threads or max(
+                1, num_cpus() // num_workers
+            )
+            return [
+                dict(cpus=None, render_threads=render_threads)
+                for _ in range(num_workers)
+            ]
+        cpus = sorted(os.sched_getaffinity(0))
+        result = []
+        for i in range(num_workers):
+            start = i * len(cpus) // num_workers
+            end = (i + 1) * len(cpus) // num_workers
+            # With more workers than CPUs, some workers must share.
+            chunk = cpus[start:end] or [cpus[i % len(cpus)]]
+            render_threads = self._render_threads or len(chunk)
+            result.append(dict(cpus=chunk, render_threads=render_threads))
+        return result
+
+    def _calibrate(self) -> int:
+        """Renders a short benchmark with several candidate numbers of
+        workers, and returns the number that gets the most frames per second.
+        """
+        num_cpus = num_cpus()
+        candidates = [1]
+        while candidates[-1] * 2 <= num_cpus:
+            candidates.append(candidates[-1] * 2)
+        if len(candidates) == 1:
+            return 1
+        best = None
+        for num_workers in candidates:
+            processes = [
+                subprocess.Popen(
+                    [
+                        *self._program,
+                        *self._worker_args,
+                        f"--calibrate={json.dumps(partition)}",
+                    ],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    **self._subprocess_args(),
+                )
+                for partition in self._partition(num_workers)
+            ]
+            frames_per_second = 0.0
+            for process in processes:
+                stdout, _ = process.communicate()
+                if process.returncode != 0:
+                    raise RuntimeError(
+                        f"A calibration failed (exit code "
+                        f"{process.returncode})"
+                    )
+                last_line = stdout.decode("utf-8").strip().splitlines()[-1]
+                frames_per_second += json.loads(last_line)["frames_per_second"]
+            _logger.warning(
+                f"Calibration: {num_workers} worker(s) render "
+                f"{frames_per_second:.2f} frames per second"
+            )
+            if best is None or frames_per_second > best[1]:
+                best = (num_workers, frames_per_second)
+        return best[0]
+
+    def _on_control(self, worker: "Supervisor._Worker"):
+        """Processes the messages (or exit) of the given worker."""
+        data = os.read(worker.control_fd, 4096)
+        worker.buffer += data
+        *messages, worker.buffer = worker.buffer.split(b"\n")
+        for message in messages:
+            if message == b"ready":
+                worker.ready = True
+                _logger.info(
+                    f"Worker {worker.process.pid} started in "
+                    f"{time.monotonic() - worker.start_time:.2f} s"
+                )
+            elif message == b"retiring":
+                self._retire(worker)
+        if not data:
+            # The worker has exited.
+            self._selector.unregister(worker.control_fd)
+            os.close(worker.control_fd)
+            returncode = worker.process.wait()
+            if not worker.ready:
+                raise RuntimeError(
+                    f"A worker failed to start (exit code {returncode})"
+                )
+            if worker in self._slots or worker is self._spare:
+                _logger.error(f"A worker died with exit code {returncode}")
+                self._retire(worker)
+        self._activate()
+
+    def _retire(self, worker: "Supervisor._Worker"):
+        """Replaces the given worker, which is no longer usable."""
+        if worker in self._slots:
+            self._slots[self._slots.index(worker)] = self._spare
+        elif worker is not self._spare:
+            return
+        self._spare = self._spawn()
+
+    def _activate(self):
+        """Tells the active workers to start serving, once they're ready."""
+        partitions = self._partition(len(self._slots))
+        for worker, partition in zip(self._slots, partitions):
+            if not worker.ready or worker.process.stdin.closed:
+                continue
+            message = f"serve {json.dumps(partition)}\n"
+            worker.process.stdin.write(message.encode("utf-8"))
+            worker.process.stdin.close()
+            if not self._announced:
+                # Use the same phrasing as flask, for the benefit of scripts
+                # that wait for the server to start.
+                host, port = self._socket.getsockname()[:2]
+                print(f" * Running on http://{host}:{port}", flush=True)
+                self._announced = True
+
+    def _stop_all(self):
+        workers = [x for x in self._slots + [self._spare] if x is not None]
+        for worker in workers:
+            if worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in workers:
+            worker.process.wait()
+
+    def _on_sigterm(self, signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        self._stop_all()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+def num_cpus() -> int:
+    """Returns how many CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def set_cpu_affinity(cpus: typing.List[int]):
+    """Pins all of this process's threads to the given CPUs."""
+    for thread_id in os.listdir("/proc/self/task"):
+        os.sched_setaffinity(int(thread_id), cpus)
+
+
+def calibrate(app: "server.ServerApp", partition: dict):
+    """Measures how fast this process renders the warm-up scene at a typical
+    resolution when confined to the given partition (see Supervisor), and
+    prints the result as the last line of output.
+    """
+    if partition["cpus"] is not None:
+        set_cpu_affinity(partition["cpus"])
+    app.set_render_threads(partition["render_threads"])
+    # The first frame only warms up; the rest are timed.
+    num_frames = 3
+    start_time = None
+    for i in range(num_frames + 1):
+        if i == 1:
+            start_time = time.monotonic()
+        app.render_warmup_scene(image_types=["color"], width=640, height=480)
+    frames_per_second = num_frames / (time.monotonic() - start_time)
+    print(json.dumps(dict(frames_per_second=frames_per_second)), flush=True)
+
+
+class WorkerWSGIServer(werkzeug.serving.ThreadedWSGIServer):
+    """The HTTP server of a Supervisor worker. It counts each connection from
+    the moment it's accepted (rather than once its request reaches the app)
+    until it's closed, so that a retiring worker can tell when it has
+    answered every request that it accepted. (Werkzeug closes each connection
+    after one request.)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections_lock = threading.Lock()
+        self._num_connections = 0
+
+    def process_request(self, request, client_address):
+        # This runs on the accepting thread, before the connection gets a
+        # request-handling thread of its own.
+        with self._connections_lock:
+            self._num_connections += 1
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        try:
+            super().shutdown_request(request)
+        finally:
+            with self._connections_lock:
+                self._num_connections -= 1
+
+    def has_connections(self) -> bool:
+        """Returns true iff any accepted connection is still open."""
+        with self._connections_lock:
+            return self._num_connections > 0
+
+
+def serve_as_worker(
+    app: "server.ServerApp", *, host: str, worker_fd, control_fd
+):
+    """Serves requests on the given listening socket as a Supervisor worker
+    until the app needs recycling.
+    """
+    app.warm_up()
+    with open(control_fd, "w", buffering=1, encoding="utf-8") as control:
+        control.write("ready\n")
+        command, _, partition = sys.stdin.readline().partition(" ")
+        if command.strip() != "serve":
+            # The supervisor has gone away.
+            return
+        partition = json.loads(partition)
+        if partition["cpus"] is not None:
+            set_cpu_affinity(partition["cpus"])
+        app.set_render_threads(partition["render_threads"])
+        server = WorkerWSGIServer(host, 0, app, fd=worker_fd)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        app.run_render_loop(until=app.needs_recycling)
+        control.write("retiring\n")
+        # Stop accepting requests, and finish the ones we already have,
+        # including those that haven't reached the app yet.
+        server.shutdown()
+        server.server_close()
+        app.run_render_loop(
+            until=lambda: app.is_idle() and not server.has_connections()
+        )
@@ -0,0 +1,404 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+A router that spreads glTF render requests across several render servers,
+while keeping repeated scenes on the same (warm) server.
+"""
+
+import argparse
+import bisect
+import dataclasses as dc
+import hashlib
+import http.client
+import json
+import logging
+import math
+import threading
+import time
+import typing
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import flask
+
+_logger = logging.getLogger("router")
+
+# How long (in seconds) to wait for a backend to answer a health check before
+# we consider it dead.
+_POLL_TIMEOUT = 5.0
+
+# The glTF properties that describe a scene's assets (i.e., what a render
+# server has to import), as opposed to their poses. Drake sends the same
+# assets again and again with only the nodes' transforms (and the cameras)
+# changing, so the fingerprint only looks at these.
+_GLTF_ASSET_KEYS = (
+    "accessors",
+    "bufferViews",
+    "buffers",
+    "images",
+    "materials",
+    "meshes",
+    "samplers",
+    "textures",
+)
+
+
+def scene_fingerprint(scene: bytes) -> str:
+    """Returns a digest of the assets (but not the poses) in the given glTF
+    scene, or of the raw bytes if it isn't valid JSON.
+    """
+    try:
+        gltf = json.loads(scene)
+    except ValueError:
+        return hashlib.sha256(scene).hexdigest()
+    if not isinstance(gltf, dict):
+        return hashlib.sha256(scene).hexdigest()
+    assets = {key: gltf.get(key) for key in _GLTF_ASSET_KEYS}
+    data = json.dumps(assets, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+@dc.dataclass
+class Backend:
+    """The router's view of one render server."""
+
+    url: str
+    """The server's base URL, e.g., "http://127.0.0.1:8001"."""
+
+    alive: bool = False
+    """Whether the server answered its most recent health check (or
+    request)."""
+
+    warm: bool = False
+    """Whether the server has finished its warm-up (per its /readyz)."""
+
+    busy: bool = False
+    """Whether the server reported that it was busy rendering (per its
+    /readyz), e.g., for some other client."""
+
+    in_flight: int = 0
+    """The number of our requests that the server is working on."""
+
+    def queue_depth(self) -> int:
+        """Our best estimate of how many requests are ahead of a new one."""
+        return max(self.in_flight, int(self.busy))
+
+
+class HashRing:
+    """A consistent hash ring, so that adding or removing a backend only
+    moves the scenes that hashed to it.
+    """
+
+    def __init__(self, names: typing.List[str], *, replicas: int = 128):
+        self._names = list(names)
+        points = []
+        for i, name in enumerate(self._names):
+            for replica in range(replicas):
+                points.append((self._hash(f"{name}#{replica}"), i))
+        points.sort()
+        self._hashes = [x for x, _ in points]
+        self._indices = [x for _, x in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def walk(self, key: str) -> typing.List[int]:
+        """Returns the indices of all backends, in order of preference for the
+        given key.
+        """
+        start = bisect.bisect(self._hashes, self._hash(key))
+        result = []
+        for i in range(len(self._indices)):
+            index = self._indices[(start + i) % len(self._indices)]
+            if index not in result:
+                result.append(index)
+                if len(result) == len(self._names):
+                    break
+        return result
+
+
+class RouterApp(flask.Flask):
+    """A Flask application that forwards /render requests to backends."""
+
+    def __init__(
+        self,
+        *,
+        backends: typing.List[str],
+        load_factor: float = 1.25,
+        poll_interval: float = 1.0,
+        timeout: float = 600.0,
+    ):
+        """The load_factor bounds how much busier than average a scene's
+        preferred backend may be before the scene spills over to the next
+        backend on the ring. The poll_interval is how often (in seconds) we
+        check each backend's /readyz. The timeout (in seconds) applies to
+        each request forwarded to a backend.
+        """
+        super().__init__("drake_render_gltf_blender_router")
+
+        self._backends = [Backend(url=x.rstrip("/")) for x in backends]
+        self._ring = HashRing([x.url for x in self._backends])
+        self._load_factor = load_factor
+        self._poll_interval = poll_interval
+        self._timeout = timeout
+        self._lock = threading.Lock()
+
+        self.add_url_rule("/", view_func=self._root_endpoint)
+        self.add_url_rule("/healthz", view_func=self._healthz_endpoint)
+        self.add_url_rule("/readyz", view_func=self._readyz_endpoint)
+        self.add_url_rule("/metrics", view_func=self._metrics_endpoint)
+
+        endpoint = "/render"
+        self.add_url_rule(
+            rule=endpoint,
+            endpoint=endpoint,
+            methods=["POST"],
+            view_func=self._render_endpoint,
+        )
+
+        # Each session only exists in the backend that created it, and we
+        # don't track which one that was.
+        for rule in ("/session", "/session/<path:rest>"):
+            self.add_url_rule(
+                rule=rule,
+                endpoint=rule,
+                methods=["POST", "DELETE"],
+                view_func=self._session_endpoint,
+            )
+
+    def start_polling(self):
+        """Starts checking on the backends in the background."""
+        self.poll_backends()
+        thread = threading.Thread(target=self._poll_forever, daemon=True)
+        thread.start()
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(self._poll_interval)
+            self.poll_backends()
+
+    def poll_backends(self):
+        """Updates our view of each backend from its /readyz endpoint."""
+        for backend in self._backends:
+            try:
+                with urllib.request.urlopen(
+                    f"{backend.url}/readyz", timeout=_POLL_TIMEOUT
+                ):
+                    status = "ready"
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    # An older server without a /readyz endpoint; all we know
+                    # is that it's reachable.
+                    status = "ready"
+                else:
+                    try:
+                        status = json.loads(e.read())["status"]
+                    except (ValueError, KeyError, TypeError):
+                        status = None
+            except OSError:
+                status = None
+            with self._lock:
+                if status is None and backend.alive:
+                    _logger.warning(f"Lost backend {backend.url}")
+                elif status is not None and not backend.alive:
+                    _logger.info(f"Found backend {backend.url}")
+                backend.alive = status is not None
+                backend.warm = status in ("ready", "busy")
+                backend.busy = status == "busy"
+
+    def _root_endpoint(self):
+        """Displays a banner page at the router root."""
+        return """\
+        <!doctype html>
+        <html><body><h1>Drake Render glTF Blender Router</h1></body></html>
+        """
+
+    def _healthz_endpoint(self):
+        """Reports that this router is alive."""
+        return {"status": "alive"}
+
+    def _readyz_endpoint(self):
+        """Reports whether any backend could start a request right away."""
+        with self._lock:
+            usable = [x for x in self._backends if x.alive and x.warm]
+            if usable:
+                if any(x.queue_depth() == 0 for x in usable):
+                    return {"status": "ready"}
+                return {"status": "busy"}, 503
+        return {"status": "warming_up"}, 503
+
+    def _metrics_endpoint(self):
+        """Reports our view of each backend, as JSON."""
+        with self._lock:
+            return {"backends": [dc.asdict(x) for x in self._backends]}
+
+    def choose_backends(self, fingerprint: str) -> typing.List[Backend]:
+        """Returns the backends to try for a scene with the given fingerprint,
+        in order of preference.
+
+        We prefer the scene's home on the hash ring, so that its assets stay
+        warm there, unless that backend's queue is deeper than load_factor
+        times the average (i.e., consistent hashing with bounded loads).
+        Backends that are down or still warming up come last.
+        """
+        with self._lock:
+            candidates = [
+                self._backends[i] for i in self._ring.walk(fingerprint)
+            ]
+            total = sum(x.queue_depth() for x in self._backends) + 1
+            num_usable = sum(x.alive and x.warm for x in self._backends)
+            bound = math.ceil(self._load_factor * total / max(num_usable, 1))
+
+            def rank(backend):
+                if not backend.alive:
+                    return 3
+                if not backend.warm:
+                    return 2
+                if backend.queue_depth() + 1 > bound:
+                    return 1
+                return 0
+
+            return sorted(candidates, key=rank)
+
+    def _render_endpoint(self):
+        """Forwards the render request to the best backend for its scene,
+        failing over to the next one when a backend is unreachable or
+        answers that it's unavailable (503).
+        """
+        # Grab the raw body before flask parses the form out of it.
+        body = flask.request.get_data()
+        scene = flask.request.files.get("scene")
+        if scene is None:
+            return self._error(400, "The request has no scene file")
+        fingerprint = scene_fingerprint(scene.read())
+        headers = {"Content-Type": flask.request.content_type}
+
+        for backend in self.choose_backends(fingerprint):
+            with self._lock:
+                backend.in_flight += 1
+            try:
+                status, content_type, content = self._forward(
+                    backend, body, headers
+                )
+            except OSError as e:
+                _logger.warning(f"Backend {backend.url} failed: {e!r}")
+                with self._lock:
+                    backend.alive = False
+                continue
+            finally:
+                with self._lock:
+                    backend.in_flight -= 1
+            if status == 503:
+                # E.g., the backend is overloaded, or restarting. It stays
+                # busy in our view until its next health check says otherwise.
+                _logger.info(f"Backend {backend.url} is unavailable")
+                with self._lock:
+                    backend.busy = True
+                continue
+            response = flask.Response(
+                content, status=status, content_type=content_type
+            )
+            response.headers["X-Render-Backend"] = backend.url
+            return response
+
+        response = self._error(503, "No render server is available")
+        response.headers["Retry-After"] = str(max(1, int(self._poll_interval)))
+        return response
+
+    def _session_endpoint(self, rest=None):
+        """Refuses the /session endpoints, which we don't forward."""
+        return self._error(
+            501,
+            "The router doesn't forward sessions; send them to a render "
+            "server directly",
+        )
+
+    def _forward(self, backend: Backend, body: bytes, headers: dict):
+        """Posts a render request to the given backend, returning its status
+        code, content type, and content. Raises OSError when the backend is
+        unreachable.
+        """
+        url = urllib.parse.urlsplit(backend.url)
+        connection = http.client.HTTPConnection(
+            url.hostname, url.port, timeout=self._timeout
+        )
+        try:
+            connection.request("POST", "/render", body=body, headers=headers)
+            response = connection.getresponse()
+            return (
+                response.status,
+                response.getheader("Content-Type"),
+                response.read(),
+            )
+        except http.client.HTTPException as e:
+            raise OSError(e) from e
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _error(code, message):
+        response = flask.jsonify(
+            {
+                "error": True,
+                "message": message,
+                "code": code,
+            }
+        )
+        response.status_code = code
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="URL to host on, default: %(default)s.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port to host on, default: %(default)s.",
+    )
+    parser.add_argument(
+        "--backend",
+        dest="backends",
+        action="append",
+        required=True,
+        metavar="URL",
+        help="The base URL of a render server, e.g., http://127.0.0.1:8001. "
+        "Repeat this flag once per server.",
+    )
+    parser.add_argument(
+        "--load_factor",
+        type=float,
+        default=1.25,
+        help="How much deeper than average a backend's queue may grow before "
+        "its scenes spill over to other backends, default: %(default)s.",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="How often to check each backend's /readyz endpoint, default: "
+        "%(default)s.",
+    )
+    args = parser.parse_args()
+
+    app = RouterApp(
+        backends=args.backends,
+        load_factor=args.load_factor,
+        poll_interval=args.poll_interval,
+    )
+    app.start_polling()
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
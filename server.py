@@ -5,22 +5,207 @@ A glTF render server that services HTTP requests using Blender.
 """
 
 import argparse
+import base64
+import collections
+import concurrent.futures
+import contextlib
 import dataclasses as dc
 import datetime
+import functools
+import hashlib
 import io
+import itertools
+import json
 import logging
 import math
+import mimetypes
+import os
 from pathlib import Path
+import queue
+import resource
+import secrets
+import struct
+import sys
 import tempfile
+import threading
+import time
 from types import NoneType
 import typing
+import urllib.parse
 
-import bpy
 import flask
+import numpy as np
+import werkzeug.serving
+
+from cost_model import CostModel
+from image_codecs import (
+    UINT16_MAX,
+    cryptomatte_id,
+    depth_to_uint16,
+    encode_png,
+)
+from mesh_geometry import (
+    MeshBounds,
+    MeshProxy,
+    decimate,
+    proxy_error,
+    to_camera_frame,
+)
+from render_supervisor import Supervisor, calibrate, serve_as_worker
+
+# These modules come with Blender, and take a while to import, so we wait until
+# we need them (see _import_bpy()). That way, e.g., --help and the Supervisor
+# (which never renders) start right away.
+bpy = None
+mathutils = None
 
 _logger = logging.getLogger("server")
 
-_UINT16_MAX = 2**16 - 1
+# When this module was imported, i.e., (roughly) when this process started.
+_IMPORT_TIME = time.monotonic()
+
+# How long (in seconds) each stage of this process's startup took, in order of
+# completion (see _startup_stage()), plus the total time until the server was
+# "ready" to serve. Reported by /metrics.
+_startup_timeline = dict()
+
+# The per-request quality knobs implied by each RenderParams.quality tier.
+# Explicitly requested knobs take precedence over the tier's. The "final" tier
+# leaves the server's own settings (e.g., from --bpy_settings_file) alone.
+_QUALITY_TIERS = {
+    "draft": dict(
+        samples=8,
+        denoise=True,
+        max_bounces=2,
+        resolution_percentage=50,
+    ),
+    "final": dict(),
+}
+
+# The custom property (set from the glTF node extras) that tells which glTF
+# node each Blender object of a session's scene came from.
+_SESSION_NODE_PROPERTY = "drake_blender_node"
+
+# Converts glTF's Y-up coordinates to Blender's Z-up coordinates.
+_Y_UP_TO_Z_UP = np.array(
+    [[1, 0, 0, 0], [0, 0, -1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=float
+)
+
+# The rotation that Blender._import_scene() applies to the imported root
+# objects, i.e., a quarter turn around the X-axis. (Blender's rotate operator
+# turns clockwise when looking down the axis.)
+_IMPORT_ROTATION = np.array(
+    [[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]], dtype=float
+)
+
+# The glTF material properties that survive a geometry-only import (see
+# _strip_gltf_textures()). Everything else describes texturing or shading
+# that depth and label images never look at.
+_GEOMETRY_ONLY_MATERIAL_KEYS = (
+    "name",
+    "alphaMode",
+    "alphaCutoff",
+    "doubleSided",
+)
+
+# The keyword arguments passed to bpy.ops.import_scene.gltf() for each choice
+# of --gltf_import_profile. The "full" profile uses the importer's defaults,
+# for full fidelity. The "fast" profile skips the most expensive step of the
+# import (about a third of it, for the benchmark's scene): setting the glTF's
+# normals as Blender's custom split normals, and guessing which faces are flat
+# from them. Blender's own (smooth) normals stand in instead, which only differ
+# where the glTF's normals don't follow the surface (e.g., for faked
+# smoothness). It also skips what Drake never emits: glTF extras (as custom
+# properties) and the rest poses and bone shapes of skins. (Whatever the
+# profile, depth and label images skip the glTF's normals, too; see
+# Blender.gltf_import_options().) Run the benchmark in test/benchmark.py to see
+# how much each option matters.
+_GLTF_IMPORT_PROFILES = {
+    "fast": dict(
+        import_shading="SMOOTH",
+        import_scene_extras=False,
+        guess_original_bind_pose=False,
+        disable_bone_shape=True,
+    ),
+    "full": dict(),
+}
+
+# The add-ons that the "lean" --bpy_runtime_profile keeps: Cycles (a render
+# engine that a settings file may choose) and the glTF importer. Blender's
+# factory settings enable several more (other importers, the extensions
+# manager, etc.) that the server never uses.
+_LEAN_ADDONS = ("cycles", "io_scene_gltf2")
+
+# How many pixels a dirty region (see Blender._dirty_region()) reaches past the
+# projected bounding boxes of the objects that moved, so that it also covers
+# their anti-aliased edges.
+_DIRTY_REGION_MARGIN = 3
+
+# Level-of-detail proxies (see Blender._level_of_detail()): only meshes with at
+# least this many faces get proxies, which keep each of these fractions of the
+# faces in turn (each decimated from the one before it).
+_LOD_MIN_FACES = 10000
+_LOD_RATIOS = (0.5, 0.2, 0.05, 0.01)
+
+# How far (in pixels, as a multiple of --lod_max_error) a proxy's geometric
+# error may reach in each type of image. Labels need exact boundaries, so they
+# never use proxies.
+_LOD_ERROR_BUDGETS = {"color": 1.0, "depth": 0.25, "label": 0.0}
+
+# How many meshes (by content) to keep level-of-detail proxies for.
+_MAX_LOD_MESHES = 64
+
+# The formats of the embedded texture images that --max_texture_size shrinks
+# (i.e., the ones that the core glTF spec allows), by MIME type.
+_TEXTURE_FORMATS = {"image/png": "PNG", "image/jpeg": "JPEG"}
+
+# How many texture images (by content and size limit) to keep the downscaled
+# copies of (see Blender._downscaled_texture()).
+_MAX_DOWNSCALED_TEXTURES = 256
+
+# How many of a session's previous images (each for its own camera and
+# RenderParams) to keep for dirty region rendering.
+_MAX_PREVIOUS_IMAGES = 16
+
+# The features of a render job that the CostModel predicts its duration from
+# (see _cost_features()).
+_COST_FEATURES = (
+    "jobs",
+    "sessions",
+    "kilo_primitives",
+    "mega_vertices",
+    "texture_mb",
+    "color_images",
+    "color_megapixels",
+    "depth_images",
+    "depth_megapixels",
+    "label_images",
+    "label_megapixels",
+)
+
+
+@contextlib.contextmanager
+def _startup_stage(name: str):
+    """Times the enclosed code as the given stage of the startup timeline. Only
+    the first time counts; later ones (e.g., the second render) aren't part of
+    the startup.
+    """
+    if name in _startup_timeline:
+        yield
+        return
+    start = time.monotonic()
+    yield
+    _startup_timeline[name] = time.monotonic() - start
+    _logger.info(f"Startup: {name} took {_startup_timeline[name]:.3f} s")
+
+
+def _import_bpy():
+    """Imports bpy and mathutils (see above), unless that's been done."""
+    global bpy, mathutils
+    if bpy is None:
+        with _startup_stage("import_bpy"):
+            import bpy
+            import mathutils
 
 
 @dc.dataclass
@@ -86,6 +271,588 @@ class RenderParams:
     """The maximum depth range as specified by a depth sensor's
     DepthRange::max_depth(). Only provided when image_type="depth"."""
 
+    camera: str = "Camera Node"
+    """The name of the glTF node to render from. (This is an extension to the
+    Drake API, for use with multi-camera requests.)"""
+
+    # The remaining fields are extensions to the Drake API, for trading image
+    # quality for speed on a per-request basis. When unset, the server's own
+    # settings apply. They only affect color images; depth and label images
+    # must keep their exact pixels.
+
+    quality: typing.Optional[typing.Literal["draft", "final"]] = None
+    """A named set of defaults for the other quality knobs below. A "draft"
+    image is rendered quickly with few samples at half resolution; a "final"
+    image uses the server's own settings."""
+
+    samples: typing.Optional[int] = None
+    """The number of render samples per pixel (1 to 4096)."""
+
+    denoise: typing.Optional[bool] = None
+    """Whether to denoise the render (Cycles) or its ray tracing (EEVEE)."""
+
+    max_bounces: typing.Optional[int] = None
+    """The maximum number of light bounces (0 to 1024); only Cycles traces
+    light bounces."""
+
+    resolution_percentage: typing.Optional[int] = None
+    """Renders at this percentage (1 to 100) of the image size, and then
+    upsamples to the full size. Only allowed for color images."""
+
+    def __post_init__(self):
+        if self.samples is not None and not 1 <= self.samples <= 4096:
+            raise ValueError("The samples must be from 1 to 4096")
+        if self.max_bounces is not None and not 0 <= self.max_bounces <= 1024:
+            raise ValueError("The max_bounces must be from 0 to 1024")
+        if self.resolution_percentage is not None:
+            if not 1 <= self.resolution_percentage <= 100:
+                raise ValueError(
+                    "The resolution_percentage must be from 1 to 100"
+                )
+            if self.image_type != "color":
+                raise ValueError(
+                    "The resolution_percentage only applies to color images"
+                )
+
+    def quality_knobs(self) -> typing.Dict[str, typing.Any]:
+        """Returns the quality knobs to apply, i.e., the quality tier's values
+        overridden by the explicitly set knobs. (There are none for depth and
+        label images.)
+        """
+        if self.image_type != "color":
+            return dict()
+        result = dict(_QUALITY_TIERS.get(self.quality, dict()))
+        for name in ("samples", "denoise", "max_bounces"):
+            value = getattr(self, name)
+            if value is not None:
+                result[name] = value
+        if self.resolution_percentage is not None:
+            result["resolution_percentage"] = self.resolution_percentage
+        return result
+
+
+def _strip_gltf_textures(gltf: dict):
+    """Removes all textures (and the images and samplers backing them) from
+    the given glTF data, in place. Each material is reduced to its constant
+    base color factor so that label images can still tell objects apart.
+    """
+    for key in ("images", "samplers", "textures"):
+        gltf.pop(key, None)
+    for material in gltf.get("materials", []):
+        pbr = material.get("pbrMetallicRoughness", {})
+        base_color = pbr.get("baseColorFactor")
+        for key in list(material.keys()):
+            if key not in _GEOMETRY_ONLY_MATERIAL_KEYS:
+                del material[key]
+        if base_color is not None:
+            material["pbrMetallicRoughness"] = dict(baseColorFactor=base_color)
+
+
+def _read_gltf_uri(uri: str, *, base_dir: Path) -> bytes:
+    """Returns the data behind the given glTF buffer or image uri, either
+    embedded in it (a data uri) or in a file relative to `base_dir`.
+    """
+    if uri.startswith("data:"):
+        return base64.b64decode(uri.split(",", 1)[1])
+    return (base_dir / urllib.parse.unquote(uri)).read_bytes()
+
+
+def _downscale_gltf_textures(
+    gltf: dict,
+    *,
+    base_dir: Path,
+    downscale: typing.Callable[[bytes, str], typing.Optional[bytes]],
+) -> int:
+    """Swaps each texture image in the given glTF data for its downscaled
+    copy, in place. The `downscale` function takes an image's data and MIME
+    type, and returns the downscaled image's data (in the same format), or
+    None when the image is small enough already. The downscaled images are
+    embedded as data uris.
+
+    Images in binary (glb) buffers, or in formats other than png and jpeg,
+    are left unchanged. Relative uris are resolved against `base_dir`.
+    Returns the number of images changed.
+    """
+    buffers = gltf.get("buffers", [])
+    buffer_data = dict()
+    count = 0
+    for image in gltf.get("images", []):
+        if "bufferView" in image:
+            view = gltf["bufferViews"][image["bufferView"]]
+            buffer_index = view["buffer"]
+            if "uri" not in buffers[buffer_index]:
+                continue
+            if buffer_index not in buffer_data:
+                buffer_data[buffer_index] = _read_gltf_uri(
+                    buffers[buffer_index]["uri"], base_dir=base_dir
+                )
+            start = view.get("byteOffset", 0)
+            end = start + view["byteLength"]
+            data = buffer_data[buffer_index][start:end]
+            mime_type = image.get("mimeType")
+        elif "uri" in image:
+            uri = image["uri"]
+            if uri.startswith("data:"):
+                mime_type = uri.partition(":")[2].split(";")[0].split(",")[0]
+            else:
+                mime_type = mimetypes.guess_type(urllib.parse.unquote(uri))[0]
+            if mime_type not in _TEXTURE_FORMATS:
+                continue
+            data = _read_gltf_uri(uri, base_dir=base_dir)
+        else:
+            continue
+        if mime_type not in _TEXTURE_FORMATS:
+            continue
+        downscaled = downscale(data, mime_type)
+        if downscaled is None:
+            continue
+        encoded = base64.b64encode(downscaled).decode("ascii")
+        image.pop("bufferView", None)
+        image["mimeType"] = mime_type
+        image["uri"] = f"data:{mime_type};base64,{encoded}"
+        count += 1
+    return count
+
+
+def _share_duplicate_gltf_meshes(
+    gltf: dict, *, base_dir: Path
+) -> typing.Optional[int]:
+    """Points all nodes whose meshes have identical content (i.e., the same
+    buffer data and equivalent materials) at a single one of those meshes, in
+    place. The importer then creates only one Blender mesh for all of them
+    (i.e., linked duplicates), so the cost of meshes and their BVHs scales
+    with the unique geometry instead of with the number of objects.
+
+    Relative buffer uris are resolved against `base_dir`. Returns the number
+    of nodes changed, or None for files with binary (glb) buffers, which are
+    left unchanged.
+    """
+    buffers = gltf.get("buffers", [])
+    if any("uri" not in buffer for buffer in buffers):
+        return None
+    buffer_data = dict()
+
+    def view_key(index):
+        view = gltf["bufferViews"][index]
+        buffer_index = view["buffer"]
+        if buffer_index not in buffer_data:
+            buffer_data[buffer_index] = _read_gltf_uri(
+                buffers[buffer_index]["uri"], base_dir=base_dir
+            )
+        start = view.get("byteOffset", 0)
+        end = start + view["byteLength"]
+        data = buffer_data[buffer_index][start:end]
+        return [hashlib.sha256(data).hexdigest(), view.get("byteStride")]
+
+    def accessor_key(index):
+        accessor = dict(gltf["accessors"][index])
+        view = accessor.pop("bufferView", None)
+        if view is not None:
+            accessor["bufferView"] = view_key(view)
+        return accessor
+
+    def texture_key(index):
+        texture = dict(gltf["textures"][index])
+        sampler = texture.pop("sampler", None)
+        if sampler is not None:
+            texture["sampler"] = gltf["samplers"][sampler]
+        source = texture.pop("source", None)
+        if source is not None:
+            image = dict(gltf["images"][source])
+            view = image.pop("bufferView", None)
+            if view is not None:
+                image["bufferView"] = view_key(view)
+            image.pop("name", None)
+            texture["source"] = image
+        return texture
+
+    def material_key(value, name=""):
+        # Swaps each texture index for the texture's content.
+        if isinstance(value, list):
+            return [material_key(x) for x in value]
+        if not isinstance(value, dict):
+            return value
+        result = {k: material_key(v, k) for k, v in value.items()}
+        if name.endswith("Texture") and "index" in value:
+            result["index"] = texture_key(value["index"])
+        result.pop("name", None)
+        return result
+
+    def primitive_key(primitive):
+        result = dict(primitive)
+        result["attributes"] = {
+            name: accessor_key(index)
+            for name, index in primitive["attributes"].items()
+        }
+        if "indices" in primitive:
+            result["indices"] = accessor_key(primitive["indices"])
+        if "material" in primitive:
+            material = gltf["materials"][primitive["material"]]
+            result["material"] = material_key(material)
+        if "targets" in primitive:
+            result["targets"] = [
+                {name: accessor_key(index) for name, index in target.items()}
+                for target in primitive["targets"]
+            ]
+        return result
+
+    mesh_keys = dict()
+    canonical_meshes = dict()
+    count = 0
+    for node in gltf.get("nodes", []):
+        # We leave skinned or morphed nodes alone; Drake never sends those.
+        if "mesh" not in node or "skin" in node or "weights" in node:
+            continue
+        index = node["mesh"]
+        if index not in mesh_keys:
+            mesh = gltf["meshes"][index]
+            mesh_keys[index] = json.dumps(
+                dict(
+                    primitives=[primitive_key(x) for x in mesh["primitives"]],
+                    weights=mesh.get("weights"),
+                ),
+                sort_keys=True,
+            )
+        canonical = canonical_meshes.setdefault(mesh_keys[index], index)
+        if canonical != index:
+            node["mesh"] = canonical
+            count += 1
+    return count
+
+
+@dc.dataclass
+class _SceneScan:
+    """What _scan_gltf() found in a glTF scene, without importing it."""
+
+    node_names: typing.Set[str]
+
+    num_nodes: int
+
+    num_primitives: int
+    """The mesh primitives of all nodes (a mesh counts once per node that
+    uses it)."""
+
+    num_vertices: int
+    """The vertices of those primitives."""
+
+    num_textures: int
+
+    texture_bytes: int
+    """The encoded size of the texture images embedded in the scene (as data
+    uris or in buffers)."""
+
+
+def _scan_gltf(gltf: dict) -> _SceneScan:
+    """Checks the structure of the given glTF data (the JSON only, without
+    decoding any buffers) and sums up its size, so that a malformed scene can
+    be rejected before it's imported. Raises ValueError for anything that
+    isn't well-formed, or that refers to an item that doesn't exist.
+    """
+    if not isinstance(gltf, dict):
+        raise ValueError("The scene must be a JSON object")
+    asset = gltf.get("asset")
+    if not isinstance(asset, dict) or "version" not in asset:
+        raise ValueError("The scene has no asset version")
+
+    arrays = dict()
+    for key in (
+        "accessors",
+        "bufferViews",
+        "buffers",
+        "cameras",
+        "images",
+        "materials",
+        "meshes",
+        "nodes",
+        "scenes",
+        "textures",
+    ):
+        value = gltf.get(key, [])
+        if not isinstance(value, list):
+            raise ValueError(f"The {key} must be a JSON list")
+        if not all(isinstance(x, dict) for x in value):
+            raise ValueError(f"The {key} must be JSON objects")
+        arrays[key] = value
+
+    def check_index(where: str, value, key: str):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{where} must be an index into the {key}")
+        if not 0 <= value < len(arrays[key]):
+            raise ValueError(f"{where} refers to a missing item of the {key}")
+
+    def check_indices(where: str, values, key: str):
+        if not isinstance(values, list):
+            raise ValueError(f"{where} must be a JSON list")
+        for i, value in enumerate(values):
+            check_index(f"{where}[{i}]", value, key)
+
+    if "scene" in gltf:
+        check_index("scene", gltf["scene"], "scenes")
+    for i, scene in enumerate(arrays["scenes"]):
+        check_indices(f"scenes[{i}].nodes", scene.get("nodes", []), "nodes")
+    for i, node in enumerate(arrays["nodes"]):
+        where = f"nodes[{i}]"
+        check_indices(f"{where}.children", node.get("children", []), "nodes")
+        for key, array_key in (("mesh", "meshes"), ("camera", "cameras")):
+            if key in node:
+                check_index(f"{where}.{key}", node[key], array_key)
+    for i, mesh in enumerate(arrays["meshes"]):
+        primitives = mesh.get("primitives")
+        if not isinstance(primitives, list) or not all(
+            isinstance(x, dict) for x in primitives
+        ):
+            raise ValueError(f"meshes[{i}].primitives must be JSON objects")
+        for j, primitive in enumerate(primitives):
+            where = f"meshes[{i}].primitives[{j}]"
+            attributes = primitive.get("attributes")
+            if not isinstance(attributes, dict):
+                raise ValueError(f"{where}.attributes must be a JSON object")
+            for name, value in attributes.items():
+                check_index(f"{where}.attributes.{name}", value, "accessors")
+            if "indices" in primitive:
+                check_index(
+                    f"{where}.indices", primitive["indices"], "accessors"
+                )
+            if "material" in primitive:
+                check_index(
+                    f"{where}.material", primitive["material"], "materials"
+                )
+    for i, accessor in enumerate(arrays["accessors"]):
+        if "bufferView" in accessor:
+            check_index(
+                f"accessors[{i}].bufferView",
+                accessor["bufferView"],
+                "bufferViews",
+            )
+    for i, view in enumerate(arrays["bufferViews"]):
+        check_index(f"bufferViews[{i}].buffer", view.get("buffer"), "buffers")
+    for i, image in enumerate(arrays["images"]):
+        if "bufferView" in image:
+            check_index(
+                f"images[{i}].bufferView", image["bufferView"], "bufferViews"
+            )
+        elif not isinstance(image.get("uri"), str):
+            raise ValueError(f"images[{i}] has neither a uri nor a bufferView")
+    for i, texture in enumerate(arrays["textures"]):
+        if "source" in texture:
+            check_index(f"textures[{i}].source", texture["source"], "images")
+
+    num_primitives = 0
+    num_vertices = 0
+    for node in arrays["nodes"]:
+        if "mesh" not in node:
+            continue
+        for primitive in arrays["meshes"][node["mesh"]]["primitives"]:
+            num_primitives += 1
+            position = primitive["attributes"].get("POSITION")
+            if position is not None:
+                count = arrays["accessors"][position].get("count", 0)
+                num_vertices += count if isinstance(count, int) else 0
+    texture_bytes = 0
+    for image in arrays["images"]:
+        if "bufferView" in image:
+            length = arrays["bufferViews"][image["bufferView"]].get(
+                "byteLength", 0
+            )
+            texture_bytes += length if isinstance(length, int) else 0
+        elif image["uri"].startswith("data:"):
+            # Base64 takes 4 characters for every 3 bytes.
+            texture_bytes += len(image["uri"].split(",", 1)[-1]) * 3 // 4
+    return _SceneScan(
+        node_names={
+            x["name"]
+            for x in arrays["nodes"]
+            if isinstance(x.get("name"), str)
+        },
+        num_nodes=len(arrays["nodes"]),
+        num_primitives=num_primitives,
+        num_vertices=num_vertices,
+        num_textures=len(arrays["images"]),
+        texture_bytes=texture_bytes,
+    )
+
+
+def _make_warmup_gltf() -> dict:
+    """Returns a tiny glTF scene for warm-up renders (see ServerApp.warm_up):
+    a single gray triangle in front of a camera node named like Drake's.
+    """
+    positions = struct.pack("<9f", -1, -1, -3, 1, -1, -3, 0, 1, -3)
+    data = base64.b64encode(positions).decode("ascii")
+    return {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0, 1]}],
+        "nodes": [
+            {"name": "Warm-up Triangle", "mesh": 0},
+            {"name": "Camera Node", "camera": 0},
+        ],
+        "cameras": [
+            {
+                "type": "perspective",
+                "perspective": {"yfov": 0.785398, "znear": 0.01},
+            }
+        ],
+        "meshes": [
+            {"primitives": [{"attributes": {"POSITION": 0}, "material": 0}]}
+        ],
+        "materials": [
+            {"pbrMetallicRoughness": {"baseColorFactor": [0.5, 0.5, 0.5, 1]}}
+        ],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5126,
+                "count": 3,
+                "type": "VEC3",
+                "min": [-1, -1, -3],
+                "max": [1, 1, -3],
+            }
+        ],
+        "bufferViews": [{"buffer": 0, "byteLength": len(positions)}],
+        "buffers": [
+            {
+                "byteLength": len(positions),
+                "uri": f"data:application/octet-stream;base64,{data}",
+            }
+        ],
+    }
+
+
+def _gltf_node_matrix(node: dict) -> np.ndarray:
+    """Returns the 4x4 local transform of the given glTF node, from either its
+    "matrix" or its "translation", "rotation", and "scale".
+    """
+    if "matrix" in node:
+        # The glTF matrix is stored in column-major order.
+        return np.array(node["matrix"], dtype=float).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", (0, 0, 0, 1))
+    rotation = np.array(
+        [
+            [
+                1 - 2 * (y * y + z * z),
+                2 * (x * y - z * w),
+                2 * (x * z + y * w),
+            ],
+            [
+                2 * (x * y + z * w),
+                1 - 2 * (x * x + z * z),
+                2 * (y * z - x * w),
+            ],
+            [
+                2 * (x * z - y * w),
+                2 * (y * z + x * w),
+                1 - 2 * (x * x + y * y),
+            ],
+        ]
+    )
+    result = np.eye(4)
+    result[:3, :3] = rotation * np.array(node.get("scale", (1, 1, 1)))
+    result[:3, 3] = node.get("translation", (0, 0, 0))
+    return result
+
+
+def _parse_pose(value) -> np.ndarray:
+    """Converts a session pose (a list of 16 numbers in glTF's column-major
+    order) to a 4x4 matrix.
+    """
+    if not isinstance(value, list) or len(value) != 16:
+        raise ValueError("Each pose must be a list of 16 numbers")
+    if not all(type(x) in (int, float) for x in value):
+        raise ValueError("Each pose must be a list of 16 numbers")
+    result = np.array(value, dtype=float).reshape(4, 4).T
+    if not np.isfinite(result).all():
+        raise ValueError("Each pose must be finite")
+    return result
+
+
+@dc.dataclass
+class _PreviousImage:
+    """An image that Blender rendered from a session's scene, for patching up
+    into the next image from the same camera (see Blender._dirty_region()).
+    """
+
+    camera_matrix: np.ndarray
+    """The camera's world transform."""
+
+    bounds: typing.Dict[str, tuple]
+    """The client objects as they were (see Blender._client_bounds())."""
+
+    pixels: np.ndarray
+    """The image, as encoded by encode_png()."""
+
+
+@dc.dataclass
+class _Session:
+    """A scene uploaded to the /session endpoint, which stays resident in
+    Blender between renders (see ServerApp._session_render_endpoint).
+    """
+
+    session_id: str
+    scene: Path
+    """The glTF file, with its nodes tagged by index (see
+    _SESSION_NODE_PROPERTY)."""
+
+    node_indices: typing.Dict[str, int]
+    """The glTF node index for each node name."""
+
+    num_nodes: int
+
+    size: int
+    """The size of the glTF file, in bytes."""
+
+    scan: _SceneScan
+
+    poses: typing.Dict[int, np.ndarray] = dc.field(default_factory=dict)
+    """The most recent pose of each node that has been moved, by node index.
+    Nodes that were never moved keep their pose from the glTF file."""
+
+    def node_index(self, node: str) -> int:
+        """Returns the index of the glTF node with the given name (or the
+        given index, as a string).
+        """
+        if node in self.node_indices:
+            return self.node_indices[node]
+        if node.isdigit() and int(node) < self.num_nodes:
+            return int(node)
+        raise ValueError(f"Unknown node {node!r}")
+
+
+def _cost_features(
+    scan: _SceneScan,
+    params: typing.List[RenderParams],
+    *,
+    session: bool = False,
+) -> np.ndarray:
+    """Returns the features (per _COST_FEATURES) of a job that renders the
+    given images of the scanned scene, either as a /render request or as a
+    render of a (resident) session's scene.
+    """
+    values = dict.fromkeys(_COST_FEATURES, 0.0)
+    values["jobs"] = 1.0
+    values["sessions"] = float(session)
+    values["kilo_primitives"] = scan.num_primitives / 1e3
+    values["mega_vertices"] = scan.num_vertices / 1e6
+    for x in params:
+        values[f"{x.image_type}_images"] += 1
+        values[f"{x.image_type}_megapixels"] += x.width * x.height / 1e6
+    if values["color_images"]:
+        # Only color images import the textures.
+        values["texture_mb"] = scan.texture_bytes / 2**20
+    return np.array([values[x] for x in _COST_FEATURES])
+
+
+def _rss_bytes() -> int:
+    """Returns the current resident set size of this process, in bytes. On
+    platforms without /proc, falls back to the peak resident set size.
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kibibytes, but macOS reports bytes.
+        return usage if sys.platform == "darwin" else usage * 1024
+
 
 class Blender:
     """Encapsulates our access to blender.
@@ -95,22 +862,166 @@ class Blender:
     """
 
     def __init__(
-        self, *, blend_file: Path = None, bpy_settings_file: Path = None
+        self,
+        *,
+        blend_file: Path = None,
+        bpy_settings_file: Path = None,
+        gltf_import_profile: str = "full",
+        runtime_profile: str = "full",
+        render_threads: int = None,
+        depth_pipeline: str = "compositor",
+        label_pipeline: str = "material",
+        background_cache_size: int = 0,
+        dirty_region_max_area: float = None,
+        frustum_culling_margin: float = None,
+        lod_max_error: float = None,
+        max_texture_size: typing.Union[int, typing.Literal["auto"]] = None,
+        share_duplicate_meshes: bool = True,
     ):
+        """When background_cache_size is positive, images are rendered in two
+        layers (see _render_layered()), with up to that many renders of the
+        background (i.e., the blend file) cached.
+
+        When dirty_region_max_area is given, images of a session's scene only
+        re-render the part of the previous image that changed, as long as that
+        part is at most this fraction of the image (see _dirty_region()).
+
+        When frustum_culling_margin is given, meshes that the camera can't see
+        are hidden from each render (see _frustum_culling()).
+
+        When lod_max_error is given, heavy meshes that look small enough are
+        swapped for decimated proxies (see _level_of_detail()).
+
+        When max_texture_size is given, the client's texture images are
+        downscaled to at most that many pixels on their longer side before
+        the import, or with "auto", to the larger side of the biggest color
+        image to be rendered from them (see _texture_size_limit()).
+
+        When share_duplicate_meshes is true, the client's objects with
+        identical meshes share a single Blender mesh (see
+        _share_duplicate_gltf_meshes()).
+        """
+        _import_bpy()
         self._blend_file = blend_file
         self._bpy_settings_file = bpy_settings_file
+        self._depth_pipeline = depth_pipeline
+        self._label_pipeline = label_pipeline
+        self.render_threads = render_threads
+        self._gltf_import_options = _GLTF_IMPORT_PROFILES[gltf_import_profile]
         self._client_objects = None
+        # The session scene (if any) that is currently imported, with its
+        # objects by glTF node index and the texture size limit it was
+        # imported with (see render_session_images()).
+        self._session_scene = None
+        self._session_nodes = dict()
+        self._session_texture_size = None
+        self._saved_settings = []
+        # The label materials that label_render_settings() swapped in (by
+        # color), and the material slots they were swapped into.
+        self._label_materials = dict()
+        self._label_swaps = []
+        # The scene's own compositor state, while our own compositor nodes
+        # (for a depth image, or a cryptomatte label image) are in place (see
+        # _own_compositor()).
+        self._saved_compositor = None
+        # Whether the scene is a freshly loaded base scene (see clean_up()).
+        self._base_scene_ready = False
+        # The cached background layers (see _render_layered()).
+        self._background_cache_size = (
+            background_cache_size if blend_file else 0
+        )
+        self._backgrounds = collections.OrderedDict()
+        # The frustum culling margin, and the bounds of the base scene's
+        # meshes (see _frustum_culling()).
+        self._frustum_culling_margin = frustum_culling_margin
+        self._base_bounds = None
+        # The level-of-detail error budget (in pixels), and the proxies (by
+        # mesh content) generated so far (see _level_of_detail()).
+        self._lod_max_error = lod_max_error
+        self._lod_proxies = collections.OrderedDict()
+        # The texture size limit, and the downscaled texture images (by
+        # content and size limit) made so far (see _downscaled_texture()).
+        self._max_texture_size = max_texture_size
+        self._downscaled_textures = collections.OrderedDict()
+        self._share_duplicate_meshes = share_duplicate_meshes
+        # What the base scene was loaded from (see _use_base_scene()).
+        self._base_scene_source = None
+        # The previous images of the session scene, by camera name and
+        # RenderParams (see _render_dirty_region()).
+        self._dirty_region_max_area = dirty_region_max_area
+        self._previous_images = collections.OrderedDict()
+        self._lean = runtime_profile == "lean"
+        if self._lean:
+            with _startup_stage("addons"):
+                self._apply_lean_profile()
+                disabled = []
+                for module in list(bpy.context.preferences.addons.keys()):
+                    if module not in _LEAN_ADDONS:
+                        bpy.ops.preferences.addon_disable(module=module)
+                        disabled.append(module)
+            if disabled:
+                message = (
+                    "The lean --bpy_runtime_profile disabled these add-ons: "
+                    + ", ".join(disabled)
+                )
+                if bpy_settings_file or blend_file:
+                    # A settings file or blend file may well rely on them.
+                    _logger.warning(
+                        f"{message}. If the --blend_file or the "
+                        "--bpy_settings_file needs any of them, use "
+                        "--bpy_runtime_profile=full instead."
+                    )
+                else:
+                    _logger.info(message)
+
+    def _apply_lean_profile(self):
+        """Turns off the parts of Blender that only matter to an interactive
+        user. Most importantly, that means undo: otherwise, every operator we
+        call (e.g., the glTF import) pushes a copy of the scene onto the undo
+        stack.
+        """
+        preferences = bpy.context.preferences
+        preferences.edit.use_global_undo = False
+        preferences.edit.undo_steps = 0
+        preferences.view.show_splash = False
+        preferences.filepaths.use_auto_save_temporary_files = False
+        preferences.filepaths.recent_files = 0
+        preferences.filepaths.save_version = 0
+        preferences.use_preferences_save = False
 
     def reset_scene(self):
         """
         Resets the scene in Blender by loading the default startup file, and
         then removes the default cube object.
         """
-        bpy.ops.wm.read_factory_settings()
+        if self._lean:
+            # Unlike read_factory_settings(), this leaves our preferences and
+            # add-ons alone (and skips loading the user interface).
+            bpy.ops.wm.read_homefile(use_factory_startup=True, load_ui=False)
+            self._apply_lean_profile()
+        else:
+            bpy.ops.wm.read_factory_settings()
         for item in bpy.data.objects:
             item.select_set(True)
         bpy.ops.object.delete()
 
+    def purge_orphans(self):
+        """Removes all datablocks that are no longer used by anything."""
+        bpy.data.orphans_purge(
+            do_local_ids=True, do_linked_ids=True, do_recursive=True
+        )
+
+    def datablock_counts(self) -> typing.Dict[str, int]:
+        """Returns the number of datablocks of each kind in bpy.data, e.g.,
+        for monitoring memory growth."""
+        result = dict()
+        for prop in bpy.data.bl_rna.properties:
+            if prop.type == "COLLECTION":
+                result[prop.identifier] = len(
+                    getattr(bpy.data, prop.identifier)
+                )
+        return result
+
     def add_default_light_source(self):
         light = bpy.data.lights.new(name="POINT", type="POINT")
         light.energy = 100
@@ -123,26 +1034,253 @@ class Blender:
         """
         Renders the current scene with the given parameters.
         """
-        # Load the blend file to set up the basic scene if provided; otherwise,
-        # the scene gets reset with default lighting.
-        if self._blend_file is not None:
-            bpy.ops.wm.open_mainfile(filepath=str(self._blend_file))
-        else:
-            self.reset_scene()
-            self.add_default_light_source()
+        self.render_images(params=[params], output_paths=[output_path])
+
+    def render_images(
+        self,
+        *,
+        params: typing.Sequence[RenderParams],
+        output_paths: typing.Sequence[Path],
+    ):
+        """
+        Renders one image for each of the given parameters, all of which must
+        refer to the same glTF scene, which is only imported once.
+        """
+        (scene,) = set(x.scene for x in params)
+        assert len(params) == len(output_paths)
+        self._use_base_scene()
+
+        # Depth and label rendering modify the scene in ways that would spoil
+        # any subsequent color image (and label in turn spoils depth), so we
+        # render all of the color images first and all of the labels last.
+        order = ("color", "depth", "label")
+        jobs = sorted(
+            zip(params, output_paths),
+            key=lambda job: order.index(job[0].image_type),
+        )
+        self._import_scene(
+            scene,
+            image_types=[x.image_type for x, _ in jobs],
+            texture_size=self._texture_size_limit(params),
+        )
+        for job_params, output_path in jobs:
+            self._render_camera(params=job_params, output_path=output_path)
 
-        # Apply the user's custom settings.
+    def render_session_images(
+        self,
+        *,
+        session: "_Session",
+        params: typing.Sequence[RenderParams],
+        output_paths: typing.Sequence[Path],
+    ):
+        """
+        Renders one image for each of the given parameters from the given
+        session's scene, with the session's current poses. The scene stays
+        imported for the next call with the same session, so that only the
+        poses need updating.
+        """
+        assert len(params) == len(output_paths)
+        # The scene is imported anew when its textures were downscaled for
+        # smaller images than these.
+        texture_size = self._texture_size_limit(params)
+        textures_too_small = (
+            texture_size is not None
+            and self._session_texture_size is not None
+            and texture_size > self._session_texture_size
+        )
+        if self._session_scene != session.scene or textures_too_small:
+            self._use_base_scene()
+            self._import_scene(
+                session.scene,
+                image_types=["color"],
+                import_extras=True,
+                texture_size=texture_size,
+            )
+            self._session_texture_size = texture_size
+            # Our collection of client objects isn't part of the scene, so it
+            # needs protection from purge_orphans() between renders.
+            self._client_objects.use_fake_user = True
+            self._session_nodes = self._find_session_nodes(session.scene)
+            self._saved_settings = self._save_scene_settings()
+            self._session_scene = session.scene
+        self._apply_poses(session.poses)
+
+        # Unlike render_images(), we undo each image's changes to the scene
+        # before the next one, so the images may come in any order.
+        for job_params, output_path in zip(params, output_paths):
+            self._restore_scene_settings()
+            index = session.node_index(job_params.camera)
+            if index not in self._session_nodes:
+                raise ValueError(f"Node {job_params.camera!r} has no object")
+            camera, _, _ = self._session_nodes[index]
+            try:
+                if self._dirty_region_max_area is None:
+                    self._render_camera(
+                        params=job_params,
+                        output_path=output_path,
+                        camera=camera,
+                    )
+                else:
+                    self._render_dirty_region(
+                        params=job_params,
+                        output_path=output_path,
+                        camera=camera,
+                    )
+            finally:
+                self._restore_label_materials()
+
+    def clean_up(self):
+        """Undoes the most recent render's changes, so that the next render
+        can start right away. This is meant to be called once a response has
+        been sent, while the server would otherwise be idle.
+
+        When a session's scene is loaded, it stays loaded (with its label and
+        depth changes undone); otherwise, the client objects are thrown away
+        and the base scene is loaded afresh. Either way, the leftover
+        datablocks are purged.
+        """
+        if self._session_scene is not None:
+            self._restore_label_materials()
+            self._restore_scene_settings()
+        elif not self._base_scene_ready:
+            self._load_base_scene()
+        self.purge_orphans()
+
+    def _use_base_scene(self):
+        """Readies the basic scene (i.e., everything but the client objects)
+        for a render, reusing the one that clean_up() loaded if possible.
+        """
+        if not self._base_scene_ready:
+            self._load_base_scene()
+        self._base_scene_ready = False
+
+        # Pin the number of render threads, if requested. (This comes before
+        # the user's settings, which should have the last word.)
+        if self.render_threads is not None:
+            bpy.context.scene.render.threads_mode = "FIXED"
+            bpy.context.scene.render.threads = self.render_threads
+
+        # Apply the user's custom settings. We read the file anew for every
+        # render, so that it may change while the server runs.
+        settings = None
         if self._bpy_settings_file:
-            with open(self._bpy_settings_file) as f:
-                code = compile(f.read(), self._bpy_settings_file, "exec")
+            with _startup_stage("settings"):
+                with open(self._bpy_settings_file) as f:
+                    settings = f.read()
+                code = compile(settings, self._bpy_settings_file, "exec")
                 exec(code, {"bpy": bpy}, dict())
 
+        # What we know about the base scene (its cached backgrounds and the
+        # bounds of its meshes) is only good for as long as the blend file and
+        # the settings stay the same.
+        source = (settings,)
+        if self._blend_file is not None:
+            stat = self._blend_file.stat()
+            source += (stat.st_mtime_ns, stat.st_size)
+        if source != self._base_scene_source:
+            self._backgrounds.clear()
+            self._base_bounds = None
+            self._base_scene_source = source
+
+    def _load_base_scene(self):
+        """Loads the basic scene, i.e., everything but the client objects and
+        the per-render settings.
+        """
+        self._session_scene = None
+        self._session_nodes = dict()
+        self._session_texture_size = None
+        self._previous_images.clear()
+        self._saved_settings = []
+        self._label_materials = dict()
+        self._label_swaps = []
+        self._saved_compositor = None
+
+        # Load the blend file to set up the basic scene if provided; otherwise,
+        # the scene gets reset with default lighting.
+        with _startup_stage("load_base_scene"):
+            if self._blend_file is not None:
+                bpy.ops.wm.open_mainfile(
+                    filepath=str(self._blend_file), load_ui=not self._lean
+                )
+            else:
+                self.reset_scene()
+                self.add_default_light_source()
+        self._base_scene_ready = True
+
+    def _import_scene(
+        self,
+        scene: Path,
+        *,
+        image_types: typing.List[str],
+        import_extras: bool = False,
+        texture_size: int = None,
+    ):
+        """Imports the given glTF file as our client objects. The image_types
+        are the (sorted) types of all images to be rendered from it. When
+        import_extras is true, the glTF extras become custom properties (even
+        if our --gltf_import_profile would skip them). When texture_size is
+        given, texture images larger than that are downscaled first.
+        """
+        # Rewrite the glTF file to make the import cheaper. Depth and label
+        # images never sample textures, so for those we trim the glTF down to
+        # its meshes, transforms, and base colors. This spares the importer
+        # from decoding and packing every embedded image only for
+        # label_render_settings() to swap the materials out. For color
+        # images, textures can be downscaled to what the image can resolve.
+        # For all image types, copies of the same mesh become linked
+        # duplicates (unless share_duplicate_meshes is off).
+        import_type = "color" if "color" in image_types else image_types[0]
+        with open(scene, encoding="utf-8") as f:
+            gltf = json.load(f)
+        changed = import_type != "color"
+        if changed:
+            _strip_gltf_textures(gltf)
+        elif texture_size is not None:
+            downscaled = _downscale_gltf_textures(
+                gltf,
+                base_dir=scene.parent,
+                downscale=functools.partial(
+                    self._downscaled_texture, size=texture_size
+                ),
+            )
+            if downscaled > 0:
+                _logger.debug(f"Downscaled {downscaled} texture image(s)")
+                changed = True
+        if self._share_duplicate_meshes:
+            shared = _share_duplicate_gltf_meshes(gltf, base_dir=scene.parent)
+            if shared is None:
+                _logger.info(
+                    "Not sharing duplicate meshes: the scene has binary (glb) "
+                    "buffers"
+                )
+            elif shared > 0:
+                _logger.debug(
+                    f"Sharing the meshes of {shared} duplicate node(s)"
+                )
+                changed = True
+        # The rewritten glTF goes into a file of its own, next to the
+        # original (so that relative uris still resolve). The original stays
+        # as it was, e.g., for a session's scene to be imported again with
+        # bigger textures.
+        import_path = scene
+        if changed:
+            import_path = scene.with_suffix(".import.gltf")
+            with open(import_path, "w", encoding="utf-8") as f:
+                json.dump(gltf, f)
+
         self._client_objects = bpy.data.collections.new("ClientObjects")
         old_count = len(bpy.data.objects)
         # Import a glTF file. Note that the Blender glTF importer imposes a
         # +90 degree rotation around the X-axis when loading meshes. Thus, we
         # counterbalance the rotation right after the glTF-loading.
-        bpy.ops.import_scene.gltf(filepath=str(params.scene))
+        options = self.gltf_import_options(import_type)
+        if import_extras:
+            options["import_scene_extras"] = True
+        try:
+            bpy.ops.import_scene.gltf(filepath=str(import_path), **options)
+        finally:
+            if import_path != scene:
+                import_path.unlink(missing_ok=True)
         new_count = len(bpy.data.objects)
         # Reality check that all of the imported objects are selected by
         # default.
@@ -163,6 +1301,184 @@ class Blender:
         for obj in bpy.context.selected_objects:
             self._client_objects.objects.link(obj)
 
+    def _texture_size_limit(
+        self, params: typing.Sequence[RenderParams]
+    ) -> typing.Optional[int]:
+        """Returns how many pixels the longer side of a texture image may have
+        when rendering the given images, or None for no limit. With an "auto"
+        max_texture_size, that's the longer side of the biggest color image:
+        a texture that spans the whole image can't show more detail than
+        that, so only close-ups of a part of a texture lose any. When there
+        are no color images, textures don't matter (so there's no limit).
+        """
+        if self._max_texture_size != "auto":
+            return self._max_texture_size
+        return max(
+            (
+                max(x.width, x.height)
+                for x in params
+                if x.image_type == "color"
+            ),
+            default=None,
+        )
+
+    def _downscaled_texture(
+        self, data: bytes, mime_type: str, *, size: int
+    ) -> typing.Optional[bytes]:
+        """Returns the given texture image (a png or jpeg file's data)
+        downscaled to at most `size` pixels on its longer side, in the same
+        format, or None when it's small enough already. Each image is only
+        downscaled once; the results are cached by the image's content.
+        """
+        key = (hashlib.sha256(data).hexdigest(), size)
+        if key in self._downscaled_textures:
+            self._downscaled_textures.move_to_end(key)
+            return self._downscaled_textures[key]
+        file_format = _TEXTURE_FORMATS[mime_type]
+        with tempfile.TemporaryDirectory(prefix="drake_blender_") as temp_dir:
+            path = Path(temp_dir) / f"texture.{file_format.lower()}"
+            path.write_bytes(data)
+            image = bpy.data.images.load(str(path))
+            try:
+                width, height = image.size
+                scale = size / max(width, height, 1)
+                if scale >= 1:
+                    result = None
+                else:
+                    image.scale(
+                        max(round(width * scale), 1),
+                        max(round(height * scale), 1),
+                    )
+                    image.filepath_raw = str(path)
+                    image.file_format = file_format
+                    image.save()
+                    result = path.read_bytes()
+            finally:
+                bpy.data.images.remove(image)
+        self._downscaled_textures[key] = result
+        while len(self._downscaled_textures) > _MAX_DOWNSCALED_TEXTURES:
+            self._downscaled_textures.popitem(last=False)
+        return result
+
+    def _find_session_nodes(self, scene: Path):
+        """Returns the imported objects of the given session scene by glTF
+        node index (see _SESSION_NODE_PROPERTY), each with the fixed
+        transforms that _apply_poses() wraps around its node's pose.
+        """
+        with open(scene, encoding="utf-8") as f:
+            gltf = json.load(f)
+        result = dict()
+        for bpy_object in self._client_objects.objects:
+            index = bpy_object.get(_SESSION_NODE_PROPERTY)
+            if index is None:
+                continue
+            # The importer converts a node's local transform to Blender's axes
+            # (and tacks on a correction for, e.g., cameras), and then we
+            # rotate the root objects. Rather than second-guessing the
+            # importer, we work out its correction from what it imported.
+            is_root = bpy_object.parent is None
+            before = _IMPORT_ROTATION if is_root else np.eye(4)
+            pose = _gltf_node_matrix(gltf["nodes"][index])
+            matrix = self._session_matrix(before, pose, np.eye(4))
+            after = np.linalg.pinv(matrix) @ np.array(bpy_object.matrix_basis)
+            result[index] = (bpy_object, before, after)
+        return result
+
+    @staticmethod
+    def _session_matrix(before, pose, after):
+        """Returns the Blender local matrix for the given glTF node pose,
+        between the given fixed transforms.
+        """
+        return before @ _Y_UP_TO_Z_UP @ pose @ _Y_UP_TO_Z_UP.T @ after
+
+    def _apply_poses(self, poses: typing.Dict[int, np.ndarray]):
+        """Moves the session scene's nodes to the given poses (see
+        _Session.poses).
+        """
+        for index, pose in poses.items():
+            if index not in self._session_nodes:
+                # E.g., a node with nothing that Blender imports.
+                continue
+            bpy_object, before, after = self._session_nodes[index]
+            matrix = self._session_matrix(before, pose, after)
+            bpy_object.matrix_basis = mathutils.Matrix(matrix.tolist())
+
+    def _save_scene_settings(self):
+        """Returns the current values of the scene settings that depth and
+        label images change, for _restore_scene_settings().
+        """
+        scene = bpy.context.scene
+        view_layer = bpy.context.view_layer
+        settings = [
+            (scene.render, "filter_size"),
+            (scene.render, "dither_intensity"),
+            (scene.display_settings, "display_device"),
+            (scene.view_settings, "view_transform"),
+            (scene, "use_nodes"),
+            (scene.cycles, "samples"),
+            (scene.eevee, "taa_render_samples"),
+            (view_layer, "use_pass_z"),
+            (view_layer, "use_pass_cryptomatte_object"),
+        ]
+        world = bpy.data.worlds.get("World")
+        if world is not None and world.node_tree is not None:
+            background = world.node_tree.nodes.get("Background")
+            if background is not None:
+                settings.append((background.inputs[0], "default_value"))
+        result = []
+        for owner, attribute in settings:
+            value = getattr(owner, attribute)
+            if isinstance(value, bpy.types.bpy_prop_array):
+                value = tuple(value)
+            result.append((owner, attribute, value))
+        return result
+
+    def _restore_scene_settings(self):
+        """Undoes any changes to the settings that were saved by
+        _save_scene_settings(), and to the scene's compositor.
+        """
+        self._restore_compositor()
+        for owner, attribute, value in self._saved_settings:
+            if getattr(owner, attribute) != value:
+                setattr(owner, attribute, value)
+
+    def _render_camera(
+        self,
+        *,
+        params: RenderParams,
+        output_path: Path,
+        camera: "bpy.types.Object" = None,
+    ):
+        """Renders one image of the already-imported scene, from the given
+        camera object (or else, from the object named by params.camera).
+        """
+        if camera is None:
+            camera = bpy.data.objects.get(params.camera)
+        if camera is None:
+            _logger.error(
+                f"Camera node '{params.camera}' not found. Check the input "
+                f"glTF file '{params.scene}'."
+            )
+            return
+        with self._frustum_culling(params, camera), self._level_of_detail(
+            params, camera
+        ):
+            self._render_camera_image(
+                params=params, output_path=output_path, camera=camera
+            )
+
+    def _render_camera_image(
+        self,
+        *,
+        params: RenderParams,
+        output_path: Path,
+        camera: "bpy.types.Object",
+    ):
+        """The implementation of _render_camera()."""
+        # Each image starts out with the scene's own compositor, even after a
+        # depth image from the same scene.
+        self._restore_compositor()
+
         # Set rendering parameters.
         scene = bpy.context.scene
         scene.render.image_settings.file_format = "PNG"
@@ -177,14 +1493,6 @@ class Blender:
             scene.render.pixel_aspect_y = 1.0
 
         # Set camera parameters.
-        camera = bpy.data.objects.get("Camera Node")
-        if camera is None:
-            _logger.error(
-                "Camera node not found. Check the input glTF file "
-                f"'{params.scene}'."
-            )
-            return
-
         scene.camera = camera
         # By default, the clipping planes are configured to near and far; for
         # depth we may tweak them (see below).
@@ -222,7 +1530,6 @@ class Blender:
                 # and max_depth (this maximizes the precision in the depth
                 # map).
                 depth_far = min(params.far, params.max_depth)
-
                 # Blender has an additional gotcha. We can't explicitly set the
                 # depth map's background color (which we typically set to the
                 # "too far" value). Blender automatically initializes it to the
@@ -231,33 +1538,680 @@ class Blender:
                 # between "valid" depth returns and too value. So, we set the
                 # clipping far value epsilon beyond what we consider to be the
                 # most distant value we will accept. We then will add
-                # compositor machinery to saturate depth returns greater than
-                # the target value to "too far" (see depth_render_settings()).
+                # compositor machinery (or NumPy code) to saturate depth
+                # returns greater than the target value to "too far" (see
+                # depth_render_settings() and depth_to_uint16()).
                 camera.data.clip_end = depth_far * 1.001
+                if self._background_cache_size > 0:
+                    scene.render.filepath = str(
+                        output_path.with_suffix(".exr")
+                    )
+                    self.raw_depth_render_settings()
+                    depth = self._render_layered(
+                        params, camera=camera, kind="depth"
+                    )[:, :, 0]
+                    depth16 = depth_to_uint16(
+                        depth, min_depth=params.min_depth, max_depth=depth_far
+                    )
+                    with open(output_path, "wb") as f:
+                        f.write(encode_png(depth16))
+                    return
+                if self._depth_pipeline == "numpy":
+                    raw_path = output_path.with_suffix(".exr")
+                    scene.render.filepath = str(raw_path)
+                    self.raw_depth_render_settings()
+                    self._render(params)
+                    self._convert_raw_depth(
+                        raw_path,
+                        output_path,
+                        min_depth=params.min_depth,
+                        max_depth=depth_far,
+                    )
+                    return
                 scene.render.image_settings.color_mode = "BW"
                 scene.render.image_settings.color_depth = "16"
                 self.depth_render_settings(params.min_depth, depth_far)
             else:  # image_type == "label".
                 scene.render.image_settings.color_mode = "RGBA"
                 scene.render.image_settings.color_depth = "8"
+                if self._label_pipeline == "cryptomatte":
+                    raw_path = output_path.with_suffix(".exr")
+                    scene.render.filepath = str(raw_path)
+                    self.cryptomatte_render_settings()
+                    if self._background_cache_size > 0:
+                        ids = self._render_layered(
+                            params, camera=camera, kind="ids"
+                        )
+                        with open(output_path, "wb") as f:
+                            f.write(encode_png(self._cryptomatte_label(ids)))
+                        return
+                    self._render(params)
+                    self._convert_cryptomatte(raw_path, output_path)
+                    return
                 self.label_render_settings()
 
         # Render the image.
-        bpy.ops.render.render(write_still=True, animation=False)
+        if self._background_cache_size > 0:
+            rgba = self._render_layered(params, camera=camera, kind="rgba")
+            with open(output_path, "wb") as f:
+                f.write(encode_png(np.rint(rgba * 255).astype(np.uint8)))
+        else:
+            self._render(params)
+        if params.quality_knobs().get("resolution_percentage", 100) != 100:
+            self._upsample(output_path, params.width, params.height)
 
-    def depth_render_settings(self, min_depth, max_depth):
-        scene = bpy.context.scene
+    def _render_dirty_region(
+        self,
+        *,
+        params: RenderParams,
+        output_path: Path,
+        camera: "bpy.types.Object",
+    ):
+        """Renders like _render_camera(), but starting from the previous image
+        (if any) from the same camera and params: only the dirty region (see
+        _dirty_region()) is rendered anew, using Blender's border rendering,
+        and patched into a copy of the previous image.
+        """
+        key = (
+            camera.name,
+            dc.astuple(dc.replace(params, scene=None, scene_sha256="")),
+        )
+        camera_matrix = np.array(camera.matrix_world)
+        bounds = self._client_bounds()
+        previous = self._previous_images.pop(key, None)
+        region = None
+        if previous is not None and np.array_equal(
+            previous.camera_matrix, camera_matrix
+        ):
+            region = self._dirty_region(
+                params, camera, previous.bounds, bounds
+            )
+
+        if region is None:
+            self._render_camera(
+                params=params, output_path=output_path, camera=camera
+            )
+            pixels = self._read_png(
+                output_path, params.image_type, remove=False
+            )
+        else:
+            pixels = previous.pixels.copy()
+            x0, y0, x1, y1 = region
+            if x0 < x1 and y0 < y1:
+                region_path = output_path.with_suffix(".region.png")
+                with self._border(params, region):
+                    self._render_camera(
+                        params=params, output_path=region_path, camera=camera
+                    )
+                pixels[y0:y1, x0:x1] = self._read_png(
+                    region_path, params.image_type
+                )
+            with open(output_path, "wb") as f:
+                f.write(encode_png(pixels))
+
+        if params.quality_knobs().get("resolution_percentage", 100) == 100:
+            self._previous_images[key] = _PreviousImage(
+                camera_matrix=camera_matrix, bounds=bounds, pixels=pixels
+            )
+            while len(self._previous_images) > _MAX_PREVIOUS_IMAGES:
+                self._previous_images.popitem(last=False)
+
+    @contextlib.contextmanager
+    def _frustum_culling(
+        self, params: RenderParams, camera: "bpy.types.Object"
+    ):
+        """Hides the meshes (from both the base scene and the client objects)
+        that lie entirely outside of the camera's view frustum from the
+        renders in this context. This spares Blender from syncing them, and
+        label_render_settings() from swapping their materials.
+
+        For depth and label images, the culling is exact: a mesh that can't
+        be seen can't change the image. A color image can still show a hidden
+        mesh's shadows, reflections, and bounced light, so for color images
+        the frustum first grows by the frustum_culling_margin (in meters) in
+        every direction. Lights are never hidden.
+        """
+        if self._frustum_culling_margin is None:
+            yield
+            return
+        if self._base_bounds is None:
+            self._base_bounds = MeshBounds(
+                x
+                for x in bpy.context.scene.objects
+                if x.name not in self._client_objects.objects
+            )
+        # Bring the world transforms up to date with, e.g., _apply_poses().
+        bpy.context.view_layer.update()
+        client_bounds = MeshBounds(self._client_objects.objects)
+        margin = 0.0
+        if params.image_type == "color":
+            margin = self._frustum_culling_margin
+        culled = self._base_bounds.outside(params, camera, margin=margin)
+        culled += client_bounds.outside(params, camera, margin=margin)
+        # Setting hide_render one object at a time costs as much as Blender
+        # would save on many small meshes, so we set them all in one go. (The
+        # render builds its own depsgraph, which sees the change.)
+        objects = bpy.data.objects
+        hide_render = np.empty(len(objects), dtype=bool)
+        objects.foreach_get("hide_render", hide_render)
+        culled_mask = np.isin(objects.keys(), culled)
+        objects.foreach_set("hide_render", hide_render | culled_mask)
+        _logger.debug(f"Culled {np.count_nonzero(culled_mask)} object(s)")
+        try:
+            yield
+        finally:
+            objects.foreach_set("hide_render", hide_render)
+
+    @contextlib.contextmanager
+    def _level_of_detail(
+        self, params: RenderParams, camera: "bpy.types.Object"
+    ):
+        """Swaps each heavy client mesh (see _LOD_MIN_FACES) for the coarsest
+        of its proxies (see _lod_proxies()) whose error, as seen from the
+        camera at the mesh's nearest point, stays within the budget for the
+        image type (see _LOD_ERROR_BUDGETS) in the renders in this context.
+        """
+        budget = _LOD_ERROR_BUDGETS[params.image_type]
+        if self._lod_max_error is None or budget == 0:
+            yield
+            return
+        budget *= self._lod_max_error
+        focal = max(params.focal_x, params.focal_y)
+        # Bring the world transforms up to date with, e.g., _apply_poses().
+        bpy.context.view_layer.update()
+        swaps = []
+        proxy_meshes = dict()
+        for bpy_object in self._client_objects.objects:
+            if bpy_object.type != "MESH" or bpy_object.hide_render:
+                continue
+            mesh = bpy_object.data
+            if len(mesh.polygons) < _LOD_MIN_FACES:
+                continue
+            matrix = np.array(bpy_object.matrix_world)
+            corners = np.array([tuple(x) for x in bpy_object.bound_box])
+            corners = corners @ matrix[:3, :3].T + matrix[:3, 3]
+            depth = -to_camera_frame(camera, corners)[:, 2].min()
+            if depth < params.near:
+                continue
+            scale = np.linalg.norm(matrix[:3, :3], axis=0).max()
+            # The error of a proxy, in pixels.
+            pixels_per_unit = focal * scale / depth
+            chosen = None
+            for level, proxy in enumerate(self._lod_proxies_for(mesh)):
+                if proxy.error * pixels_per_unit > budget:
+                    break
+                chosen = level, proxy
+            if chosen is None:
+                continue
+            level, proxy = chosen
+            key = (mesh.name, level)
+            if key not in proxy_meshes:
+                proxy_mesh = proxy.to_mesh(f"{mesh.name}.lod{level}")
+                for material in mesh.materials:
+                    proxy_mesh.materials.append(material)
+                proxy_meshes[key] = proxy_mesh
+            swaps.append((bpy_object, mesh))
+            bpy_object.data = proxy_meshes[key]
+        if swaps:
+            _logger.debug(f"Swapped in {len(swaps)} level-of-detail proxies")
+        try:
+            yield
+        finally:
+            for bpy_object, mesh in swaps:
+                bpy_object.data = mesh
+            for proxy_mesh in proxy_meshes.values():
+                bpy.data.meshes.remove(proxy_mesh)
+
+    def _lod_proxies_for(
+        self, mesh: "bpy.types.Mesh"
+    ) -> typing.Iterator[MeshProxy]:
+        """Yields the level-of-detail proxies of the given mesh, from finest to
+        coarsest (see _LOD_RATIOS). Each proxy is only generated once it's
+        needed (by decimating the one before it), and kept for any mesh with
+        the same content.
+        """
+        original = MeshProxy.from_mesh(mesh, error=0.0)
+        digest = hashlib.sha256()
+        for array in (
+            original.positions,
+            original.loop_vertices,
+            original.loop_starts,
+            original.material_indices,
+            *original.uv_layers.values(),
+        ):
+            digest.update(array.tobytes())
+        proxies = self._lod_proxies.setdefault(digest.hexdigest(), [])
+        self._lod_proxies.move_to_end(digest.hexdigest())
+        while len(self._lod_proxies) > _MAX_LOD_MESHES:
+            self._lod_proxies.popitem(last=False)
+
+        # A sample of the original mesh's vertices, for the error metric.
+        points = original.positions.reshape(-1, 3)
+        if len(points) > 2000:
+            rng = np.random.default_rng(seed=0)
+            points = points[rng.choice(len(points), 2000, replace=False)]
+
+        # The mesh (and its fraction of the original's faces) to decimate the
+        # next proxy from, if we have it on hand.
+        previous, previous_ratio = mesh, 1.0
+        try:
+            for level, ratio in enumerate(_LOD_RATIOS):
+                if level == len(proxies):
+                    if previous is None:
+                        previous = proxies[level - 1].to_mesh("lod_previous")
+                    proxy_mesh = decimate(previous, ratio / previous_ratio)
+                    proxies.append(
+                        MeshProxy.from_mesh(
+                            proxy_mesh,
+                            error=proxy_error(proxy_mesh, points),
+                        )
+                    )
+                    if previous is not mesh:
+                        bpy.data.meshes.remove(previous)
+                    previous = proxy_mesh
+                elif previous is not None:
+                    if previous is not mesh:
+                        bpy.data.meshes.remove(previous)
+                    previous = None
+                previous_ratio = ratio
+                yield proxies[level]
+        finally:
+            if previous is not None and previous is not mesh:
+                bpy.data.meshes.remove(previous)
+
+    def _client_bounds(self) -> typing.Dict[str, tuple]:
+        """Returns each of our client objects' type, world transform, and
+        bounding box (as its eight corners, in world coordinates), by name.
+        """
+        # Bring the world transforms up to date with _apply_poses().
+        bpy.context.view_layer.update()
+        result = dict()
+        for bpy_object in self._client_objects.objects:
+            matrix = np.array(bpy_object.matrix_world)
+            corners = np.array([tuple(x) for x in bpy_object.bound_box])
+            corners = corners @ matrix[:3, :3].T + matrix[:3, 3]
+            result[bpy_object.name] = (bpy_object.type, matrix, corners)
+        return result
+
+    def _dirty_region(
+        self,
+        params: RenderParams,
+        camera: "bpy.types.Object",
+        before: typing.Dict[str, tuple],
+        after: typing.Dict[str, tuple],
+    ) -> typing.Optional[typing.Tuple[int, int, int, int]]:
+        """Returns the pixels that may differ between two images from the
+        given camera, with the client objects as they were before and after
+        (see _client_bounds()), as the (x0, y0, x1, y1) bounds of a rectangle
+        (with y from the top). The rectangle covers the bounding boxes of the
+        meshes that moved, both where they were and where they are. When the
+        rectangle would exceed the dirty_region_max_area (or anything but a
+        mesh moved, or a mesh came too close to the camera), returns None,
+        i.e., the whole image needs rendering.
+
+        Note that the pixels outside of the rectangle stay as they were, so
+        this misses any changes to the shadows and reflections of the moving
+        meshes there.
+        """
+        corners = []
+        for name, (object_type, matrix, bounds) in after.items():
+            if name not in before:
+                return None
+            _, old_matrix, old_bounds = before[name]
+            if np.array_equal(matrix, old_matrix):
+                continue
+            if object_type in ("EMPTY", "CAMERA"):
+                # These never show up in an image, except via their children,
+                # which would have moved too.
+                continue
+            if object_type != "MESH":
+                return None
+            corners.extend([old_bounds, bounds])
+        if not corners:
+            return (0, 0, 0, 0)
+
+        # Project the corners into the image, per the camera intrinsics.
+        points = to_camera_frame(camera, np.concatenate(corners))
+        depth = -points[:, 2]
+        if np.any(depth < params.near):
+            return None
+        u = params.focal_x * points[:, 0] / depth + params.center_x
+        v = -params.focal_y * points[:, 1] / depth + params.center_y
+        margin = _DIRTY_REGION_MARGIN
+        x0 = max(0, math.floor(u.min()) - margin)
+        y0 = max(0, math.floor(v.min()) - margin)
+        x1 = min(params.width, math.ceil(u.max()) + 1 + margin)
+        y1 = min(params.height, math.ceil(v.max()) + 1 + margin)
+        if x0 >= x1 or y0 >= y1:
+            return (0, 0, 0, 0)
+        max_area = self._dirty_region_max_area * params.width * params.height
+        if (x1 - x0) * (y1 - y0) > max_area:
+            return None
+        return (x0, y0, x1, y1)
+
+    @contextlib.contextmanager
+    def _border(
+        self, params: RenderParams, region: typing.Tuple[int, int, int, int]
+    ):
+        """Renders only the given region (see _dirty_region()) of the image
+        in this context, cropping the output file down to it.
+        """
+        render = bpy.context.scene.render
+        x0, y0, x1, y1 = region
+        # Blender's border is in fractions of the image (with y from the
+        # bottom), which it rounds down to whole pixels; we aim for the middle
+        # of each pixel, to be safe from roundoff.
+        render.border_min_x = (x0 + 0.5) / params.width
+        render.border_max_x = (x1 + 0.5) / params.width
+        render.border_min_y = (params.height - y1 + 0.5) / params.height
+        render.border_max_y = (params.height - y0 + 0.5) / params.height
+        render.use_border = True
+        render.use_crop_to_border = True
+        try:
+            yield
+        finally:
+            render.use_border = False
+            render.use_crop_to_border = False
+
+    def _read_png(
+        self, path: Path, image_type: str, *, remove: bool = True
+    ) -> np.ndarray:
+        """Returns the pixels of the given PNG image (as rendered for the
+        given image type) as encode_png() takes them.
+        """
+        pixels = self._read_pixels(path, remove=remove)
+        if image_type == "depth":
+            return np.rint(pixels[:, :, 0] * 65535).astype(np.uint16)
+        return np.rint(pixels * 255).astype(np.uint8)
 
+    def _render(self, params: RenderParams):
+        """Renders the scene as currently configured to its output file, with
+        the quality knobs of the given params.
+        """
+        with self._quality_settings(params.quality_knobs()):
+            with _startup_stage("first_render"):
+                bpy.ops.render.render(write_still=True, animation=False)
+
+    def _render_layered(
+        self,
+        params: RenderParams,
+        *,
+        camera: "bpy.types.Object",
+        kind: typing.Literal["rgba", "ids", "depth"],
+    ) -> np.ndarray:
+        """Renders the scene as currently configured in two layers, and
+        returns their composite as an array of shape (height, width,
+        channels). (Unlike _render(), this removes the output file.)
+
+        The background layer is everything but our client objects, i.e., the
+        blend file, and is cached for each camera pose and RenderParams. The
+        foreground layer has only the client objects, in front of a
+        transparent background (though everything else still casts shadows
+        onto them, and shows in their reflections). Each layer also renders
+        its depth pass, and at each pixel the closer layer wins. The kind
+        tells what the output file holds: an RGBA image ("rgba"), whose
+        foreground is blended over the background by its alpha; cryptomatte
+        object ids ("ids", see cryptomatte_render_settings()); or the depth
+        itself ("depth", see raw_depth_render_settings()).
+
+        Depth and label images come out the same as from a full render. For
+        color images, this trades away the client objects' effects on the
+        background: they cast no shadows onto it and don't show in its
+        reflections. Also, the blend file's own compositing (if any) applies
+        to each layer separately, and the layers are blended in display (not
+        linear) color space.
+        """
+        key = (
+            tuple(tuple(row) for row in camera.matrix_world),
+            dc.astuple(
+                dc.replace(params, scene=None, scene_sha256="", camera="")
+            ),
+        )
+        background = self._backgrounds.get(key)
+        if background is None:
+            with self._hidden_client_objects():
+                background = self._render_layer(params, kind=kind)
+            self._backgrounds[key] = background
+            while len(self._backgrounds) > self._background_cache_size:
+                self._backgrounds.popitem(last=False)
+        else:
+            self._backgrounds.move_to_end(key)
+        with self._foreground_only():
+            image, depth = self._render_layer(params, kind=kind)
+        background_image, background_depth = background
+
+        if kind == "depth":
+            return np.minimum(image, background_image)
+        front = (depth < background_depth)[:, :, np.newaxis]
+        if kind == "ids":
+            return np.where(front, image, background_image)
+        # Blend the (straight alpha) foreground over the background.
+        alpha = image[:, :, 3:]
+        background_alpha = background_image[:, :, 3:]
+        blended_alpha = alpha + background_alpha * (1 - alpha)
+        blended_rgb = (
+            image[:, :, :3] * alpha
+            + background_image[:, :, :3] * background_alpha * (1 - alpha)
+        ) / np.maximum(blended_alpha, 1e-6)
+        blended = np.concatenate([blended_rgb, blended_alpha], axis=2)
+        return np.where(front, blended, background_image)
+
+    def _render_layer(
+        self, params: RenderParams, *, kind: str
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Renders one layer for _render_layered(), and returns its output
+        file's pixels and its depth (in meters), as arrays.
+        """
+        output_path = Path(bpy.context.scene.render.filepath)
+        if kind == "depth":
+            self._render(params)
+            pixels = self._read_pixels(output_path)
+            return pixels, pixels[:, :, 0]
+        with self._depth_output(output_path.with_suffix(".z.exr")) as path:
+            self._render(params)
+        return self._read_pixels(output_path), self._read_pixels(path)[:, :, 0]
+
+    @contextlib.contextmanager
+    def _depth_output(self, path: Path):
+        """Additionally writes the depth pass of the renders in this context
+        to the given EXR file (or rather, to the path that the context
+        returns), via a compositor File Output node.
+        """
+        scene = bpy.context.scene
+        use_nodes = scene.use_nodes
         scene.use_nodes = True
         nodes = scene.node_tree.nodes
         links = scene.node_tree.links
-        # Clear all nodes before starting anew.
-        nodes.clear()
+        added = []
+        if not use_nodes:
+            # Pass the render straight through.
+            nodes.clear()
+            added.append(nodes.new("CompositorNodeRLayers"))
+            added.append(nodes.new("CompositorNodeComposite"))
+            links.new(added[0].outputs.get("Image"), added[1].inputs[0])
+        render_layers = next(
+            (x for x in nodes if x.bl_idname == "CompositorNodeRLayers"), None
+        )
+        if render_layers is None:
+            render_layers = nodes.new("CompositorNodeRLayers")
+            added.append(render_layers)
+        bpy.context.view_layer.use_pass_z = True
+        output = nodes.new("CompositorNodeOutputFile")
+        added.append(output)
+        output.base_path = str(path.parent)
+        output.file_slots[0].path = path.stem
+        output.format.file_format = "OPEN_EXR"
+        output.format.color_mode = "BW"
+        output.format.color_depth = "32"
+        output.format.exr_codec = "NONE"
+        links.new(render_layers.outputs.get("Depth"), output.inputs[0])
+        try:
+            # Blender appends the frame number to the file name.
+            yield path.parent / f"{path.stem}{scene.frame_current:04d}.exr"
+        finally:
+            for node in added:
+                nodes.remove(node)
+            scene.use_nodes = use_nodes
+
+    @contextlib.contextmanager
+    def _hidden_client_objects(self):
+        """Hides our client objects from the renders in this context."""
+        hidden = [x for x in self._client_objects.objects if not x.hide_render]
+        for bpy_object in hidden:
+            bpy_object.hide_render = True
+        try:
+            yield
+        finally:
+            for bpy_object in hidden:
+                bpy_object.hide_render = False
+
+    @contextlib.contextmanager
+    def _foreground_only(self):
+        """Hides everything but our client objects from the camera (though not
+        from shadow or reflection rays) in the renders in this context, in
+        front of a transparent background.
+        """
+        scene = bpy.context.scene
+        hidden = [
+            x
+            for x in scene.objects
+            if x.name not in self._client_objects.objects and x.visible_camera
+        ]
+        film_transparent = scene.render.film_transparent
+        for bpy_object in hidden:
+            bpy_object.visible_camera = False
+        scene.render.film_transparent = True
+        try:
+            yield
+        finally:
+            scene.render.film_transparent = film_transparent
+            for bpy_object in hidden:
+                bpy_object.visible_camera = True
+
+    @contextlib.contextmanager
+    def _quality_settings(self, knobs: typing.Dict[str, typing.Any]):
+        """Applies the given quality knobs (see RenderParams.quality_knobs) to
+        the scene for the duration of the context, and then restores the prior
+        settings, so that they never leak into another image.
+        """
+        scene = bpy.context.scene
+        # Each knob maps to the settings of every render engine it applies to.
+        settings = {
+            "samples": [
+                (scene.cycles, "samples"),
+                (scene.eevee, "taa_render_samples"),
+            ],
+            "denoise": [
+                (scene.cycles, "use_denoising"),
+                (scene.eevee.ray_tracing_options, "use_denoise"),
+            ],
+            "max_bounces": [
+                (scene.cycles, "max_bounces"),
+            ],
+            "resolution_percentage": [
+                (scene.render, "resolution_percentage"),
+            ],
+        }
+        saved = []
+        try:
+            for name, value in knobs.items():
+                for owner, attribute in settings[name]:
+                    saved.append((owner, attribute, getattr(owner, attribute)))
+                    setattr(owner, attribute, value)
+            yield
+        finally:
+            for owner, attribute, value in reversed(saved):
+                setattr(owner, attribute, value)
+
+    def _upsample(self, path: Path, width: int, height: int):
+        """Scales the image file at the given path up to the given size."""
+        image = bpy.data.images.load(str(path))
+        try:
+            image.scale(width, height)
+            image.filepath_raw = str(path)
+            image.file_format = "PNG"
+            image.save()
+        finally:
+            bpy.data.images.remove(image)
+
+    def gltf_import_options(self, image_type: str = "color"):
+        """Returns the glTF importer options to use for the given type of
+        image, per our --gltf_import_profile. Depth and label images are never
+        shaded, so they skip the glTF's normals under every profile.
+        """
+        options = dict(self._gltf_import_options)
+        if image_type != "color":
+            options["import_shading"] = "SMOOTH"
+        return options
+
+    def _own_compositor(self):
+        """Sets the scene's compositor aside for our own nodes (for a depth
+        image, or a cryptomatte label image), and returns its node tree. The
+        scene's own nodes stay in the tree, muted and cut off from the output,
+        until _restore_compositor() puts them back. Our nodes reach the output
+        via _composite().
+        """
+        self._restore_compositor()
+        scene = bpy.context.scene
+        use_nodes = scene.use_nodes
+        scene.use_nodes = True
+        tree = scene.node_tree
+        nodes = list(tree.nodes)
+        links = []
+        for link in list(tree.links):
+            if link.to_node.bl_idname == "CompositorNodeComposite":
+                links.append((link.from_socket, link.to_socket))
+                tree.links.remove(link)
+        # Muted nodes don't write any files (e.g., via File Output nodes).
+        muted = []
+        for node in nodes:
+            if node.bl_idname != "CompositorNodeComposite" and not node.mute:
+                node.mute = True
+                muted.append(node)
+        self._saved_compositor = (use_nodes, nodes, links, muted)
+        return tree
+
+    @staticmethod
+    def _composite(socket):
+        """Connects the given socket of our own compositor nodes (see
+        _own_compositor()) to the scene's output.
+        """
+        tree = bpy.context.scene.node_tree
+        composites = [
+            x for x in tree.nodes if x.bl_idname == "CompositorNodeComposite"
+        ]
+        if not composites:
+            composites.append(tree.nodes.new("CompositorNodeComposite"))
+        for composite in composites:
+            tree.links.new(socket, composite.inputs.get("Image"))
+
+    def _restore_compositor(self):
+        """Removes our own compositor nodes (if any), and brings back the
+        scene's own (see _own_compositor()).
+        """
+        if self._saved_compositor is None:
+            return
+        use_nodes, nodes, links, muted = self._saved_compositor
+        self._saved_compositor = None
+        scene = bpy.context.scene
+        tree = scene.node_tree
+        keep = {x.as_pointer() for x in nodes}
+        for node in list(tree.nodes):
+            if node.as_pointer() not in keep:
+                tree.nodes.remove(node)
+        for from_socket, to_socket in links:
+            tree.links.new(from_socket, to_socket)
+        for node in muted:
+            node.mute = False
+        scene.use_nodes = use_nodes
+
+    def depth_render_settings(self, min_depth, max_depth):
+        tree = self._own_compositor()
+        nodes = tree.nodes
+        links = tree.links
         # The rendering source (with the Depth output enabled).
         render_layers = nodes.new("CompositorNodeRLayers")
         bpy.context.view_layer.use_pass_z = True
-        # The rendering endpoint; this gets saved to disk.
-        composite = nodes.new("CompositorNodeComposite")
 
         # This does several things:
         #   1. Maps meters to millimeters.
@@ -267,7 +2221,7 @@ class Blender:
         map_value.name = "SequeezeToDepth16U"
         map_value.use_min = True
         map_value.use_max = True
-        map_value.size = [1000 / _UINT16_MAX]
+        map_value.size = [1000 / UINT16_MAX]
         map_value.min = [0]
         map_value.max = [1.0]
 
@@ -281,7 +2235,7 @@ class Blender:
         far_saturator = nodes.new("ShaderNodeMath")
         far_saturator.name = "SaturateTooFar"
         far_saturator.operation = "MULTIPLY_ADD"
-        far_saturator.inputs[1].default_value = (_UINT16_MAX + 1) / 1000
+        far_saturator.inputs[1].default_value = (UINT16_MAX + 1) / 1000
 
         # Mask out all values that are too close and saturate them below zero
         # (they'll clamp up to zero).
@@ -317,13 +2271,132 @@ class Blender:
             far_saturator.outputs.get("Value"), close_saturator.inputs[2]
         )
 
-        # Squeeze down to 16-bit and output.
+        # Squeeze down to 16-bit and output; this gets saved to disk.
         links.new(
             close_saturator.outputs.get("Value"), map_value.inputs.get("Value")
         )
-        links.new(
-            map_value.outputs.get("Value"), composite.inputs.get("Image")
+        self._composite(map_value.outputs.get("Value"))
+
+    def raw_depth_render_settings(self):
+        """Configures the render to write the raw depth pass (in meters) to an
+        uncompressed single-channel float EXR file.
+        """
+        scene = bpy.context.scene
+        # Blender only writes render passes via the compositor, so we connect
+        # the depth pass straight to the output, with no other processing.
+        # (In background mode, neither the Render Result nor a Viewer node
+        # has any pixels to read back, so the depth has to go through a file.)
+        tree = self._own_compositor()
+        render_layers = tree.nodes.new("CompositorNodeRLayers")
+        bpy.context.view_layer.use_pass_z = True
+        self._composite(render_layers.outputs.get("Depth"))
+        image_settings = scene.render.image_settings
+        image_settings.file_format = "OPEN_EXR"
+        image_settings.color_mode = "BW"
+        image_settings.color_depth = "32"
+        image_settings.exr_codec = "NONE"
+
+    def _convert_raw_depth(
+        self,
+        raw_path: Path,
+        output_path: Path,
+        *,
+        min_depth: float,
+        max_depth: float,
+    ):
+        """Converts the raw depth file (see raw_depth_render_settings()) at
+        raw_path to Drake's 16-bit depth PNG at output_path, and removes the
+        raw file.
+        """
+        # Gray is stored as RGBA.
+        depth = self._read_pixels(raw_path)[:, :, 0]
+        depth16 = depth_to_uint16(
+            depth, min_depth=min_depth, max_depth=max_depth
         )
+        with open(output_path, "wb") as f:
+            f.write(encode_png(depth16))
+
+    def cryptomatte_render_settings(self):
+        """Configures the render to write the ID of the frontmost object at
+        each pixel (per the object cryptomatte pass) to an uncompressed float
+        EXR file. Unlike label_render_settings(), this leaves the materials
+        untouched.
+        """
+        scene = bpy.context.scene
+        # One sample (at the pixel's center) suffices for the frontmost object.
+        # Because we never blend samples, labels have no anti-aliasing.
+        scene.cycles.samples = 1
+        scene.eevee.taa_render_samples = 1
+        # The first of the cryptomatte pass's (id, coverage) pairs is the one
+        # with the most coverage. We pass its id straight to the output.
+        tree = self._own_compositor()
+        render_layers = tree.nodes.new("CompositorNodeRLayers")
+        bpy.context.view_layer.use_pass_cryptomatte_object = True
+        separate = tree.nodes.new("CompositorNodeSeparateColor")
+        tree.links.new(
+            render_layers.outputs.get("CryptoObject00"), separate.inputs[0]
+        )
+        self._composite(separate.outputs.get("Red"))
+        image_settings = scene.render.image_settings
+        image_settings.file_format = "OPEN_EXR"
+        image_settings.color_mode = "RGB"
+        image_settings.color_depth = "32"
+        image_settings.exr_codec = "NONE"
+
+    def _convert_cryptomatte(self, raw_path: Path, output_path: Path):
+        """Converts the object IDs (see cryptomatte_render_settings()) at
+        raw_path to a label image PNG at output_path, and removes the raw file.
+        Each of our client objects is painted in its diffuse color, and
+        everything else (e.g., the background and the meshes of the blend file)
+        is painted white.
+        """
+        label = self._cryptomatte_label(self._read_pixels(raw_path))
+        with open(output_path, "wb") as f:
+            f.write(encode_png(label))
+
+    def _cryptomatte_label(self, pixels: np.ndarray) -> np.ndarray:
+        """Returns the label image (as RGBA) for the given pixels of a
+        cryptomatte render (see _convert_cryptomatte()).
+        """
+        height, width, _ = pixels.shape
+        ids = np.ascontiguousarray(pixels[:, :, 0]).view(np.uint32)
+
+        # Make a lookup table from object ID to label color.
+        lut = {}
+        for bpy_object in self._client_objects.objects:
+            if bpy_object.type != "MESH":
+                continue
+            color = bpy_object.data.materials[0].diffuse_color
+            rgb = np.rint(np.clip(color[:3], 0, 1) * 255)
+            lut[cryptomatte_id(bpy_object.name)] = (*rgb, 255)
+        keys = np.array(sorted(lut), dtype=np.uint32)
+        colors = np.array([lut[x] for x in keys], dtype=np.uint8)
+
+        label = np.full((height, width, 4), 255, dtype=np.uint8)
+        if len(keys) > 0:
+            index = np.searchsorted(keys, ids).clip(0, len(keys) - 1)
+            found = keys[index] == ids
+            label[found] = colors[index[found]]
+        return label
+
+    @staticmethod
+    def _read_pixels(path: Path, *, remove: bool = True) -> np.ndarray:
+        """Returns the pixels of the given image file as a float32 array of
+        shape (height, width, channels), with its rows from top to bottom, and
+        (unless told otherwise) removes the file.
+        """
+        image = bpy.data.images.load(str(path))
+        try:
+            image.colorspace_settings.is_data = True
+            width, height = image.size
+            pixels = np.empty(width * height * image.channels, np.float32)
+            image.pixels.foreach_get(pixels)
+        finally:
+            bpy.data.images.remove(image)
+            if remove:
+                path.unlink()
+        # Blender's rows go from bottom to top.
+        return pixels.reshape(height, width, -1)[::-1]
 
     def label_render_settings(self):
         scene = bpy.context.scene
@@ -352,7 +2425,7 @@ class Blender:
             # TODO(zachfang): Revisit if we ever add more types of objects
             # other than `MESH`, e.g., primitives. We need to handle their
             # label values too.
-            if bpy_object.type != "MESH":
+            if bpy_object.type != "MESH" or bpy_object.hide_render:
                 continue
 
             # If a mesh is imported from a glTF, we will set its label value to
@@ -362,21 +2435,52 @@ class Blender:
                 mesh_color = bpy_object.data.materials[0].diffuse_color
             else:
                 mesh_color = background_color
-            bpy_object.data.materials[0].use_nodes = True
-            links = bpy_object.data.materials[0].node_tree.links
-            nodes = bpy_object.data.materials[0].node_tree.nodes
+            label_material = self._label_material(tuple(mesh_color))
+
+            # Swap the label material into all of the object's material slots
+            # (remembering the originals for _restore_label_materials()). The
+            # slots of a mesh shared by several objects may already have been
+            # swapped.
+            for slot in bpy_object.material_slots:
+                if slot.material in self._label_materials.values():
+                    continue
+                self._label_swaps.append((slot, slot.material))
+                slot.material = label_material
+
+    def _label_material(self, color):
+        """Returns a material that renders as the given flat color."""
+        if color in self._label_materials:
+            return self._label_materials[color]
+        material = bpy.data.materials.new("Label")
+        # The diffuse color is what label_render_settings() reads back for
+        # meshes shared by several objects.
+        material.diffuse_color = color
+        material.use_nodes = True
+        links = material.node_tree.links
+        nodes = material.node_tree.nodes
+
+        # Clear all material nodes before adding necessary nodes.
+        nodes.clear()
+        rendered_surface = nodes.new("ShaderNodeOutputMaterial")
+        # Use 'ShaderNodeBackground' node as it produces a flat color.
+        unlit_flat_mesh_color = nodes.new("ShaderNodeBackground")
 
-            # Clear all material nodes before adding necessary nodes.
-            nodes.clear()
-            rendered_surface = nodes.new("ShaderNodeOutputMaterial")
-            # Use 'ShaderNodeBackground' node as it produces a flat color.
-            unlit_flat_mesh_color = nodes.new("ShaderNodeBackground")
+        links.new(
+            unlit_flat_mesh_color.outputs[0],
+            rendered_surface.inputs["Surface"],
+        )
+        unlit_flat_mesh_color.inputs["Color"].default_value = color
+        self._label_materials[color] = material
+        return material
 
-            links.new(
-                unlit_flat_mesh_color.outputs[0],
-                rendered_surface.inputs["Surface"],
-            )
-            unlit_flat_mesh_color.inputs["Color"].default_value = mesh_color
+    def _restore_label_materials(self):
+        """Undoes the material swaps of label_render_settings()."""
+        for slot, material in reversed(self._label_swaps):
+            slot.material = material
+        for material in self._label_materials.values():
+            bpy.data.materials.remove(material)
+        self._label_materials = dict()
+        self._label_swaps = []
 
 
 class ServerApp(flask.Flask):
@@ -388,15 +2492,88 @@ class ServerApp(flask.Flask):
         temp_dir,
         blend_file: Path = None,
         bpy_settings_file: Path = None,
+        gltf_import_profile: str = "full",
+        runtime_profile: str = "full",
+        render_threads: int = None,
+        depth_pipeline: str = "compositor",
+        label_pipeline: str = "material",
+        background_cache_size: int = 0,
+        dirty_region_max_area: float = None,
+        frustum_culling_margin: float = None,
+        lod_max_error: float = None,
+        max_texture_size: typing.Union[int, typing.Literal["auto"]] = None,
+        share_duplicate_meshes: bool = True,
+        max_requests: int = None,
+        max_rss_mb: float = None,
+        max_sessions: int = 16,
+        max_session_mb: float = 1024,
+        enable_sessions: bool = True,
+        warmup_image_types: typing.Sequence[str] = (),
+        scheduler: typing.Literal["fifo", "shortest_expected_first"] = "fifo",
+        scheduler_aging: float = 1.0,
+        use_render_loop: bool = False,
     ):
+        """When use_render_loop is true, the request-handling threads hand
+        all of their work with bpy over to run_render_loop(), which must then
+        be running on the main thread. This lets a threaded server answer
+        health checks while it renders. Otherwise, requests use bpy directly.
+
+        The max_sessions and max_session_mb bound the number and total size
+        of the scenes kept for the /session endpoints; beyond those, the least
+        recently used sessions expire. When enable_sessions is false, the
+        /session endpoints answer 501 instead (e.g., when this is one of
+        several worker processes, which would each have sessions of their
+        own).
+
+        The scheduler picks which of the waiting jobs the render loop runs
+        next: either the oldest one ("fifo"), or the one that the CostModel
+        expects to finish soonest ("shortest_expected_first"), where each
+        second of waiting counts the same as scheduler_aging fewer seconds of
+        expected work, so that expensive jobs don't wait forever.
+        """
         super().__init__("drake_render_gltf_blender")
 
         self._temp_dir = temp_dir
+        self._has_blend_file = blend_file is not None
         self._blender = Blender(
-            blend_file=blend_file, bpy_settings_file=bpy_settings_file
+            blend_file=blend_file,
+            bpy_settings_file=bpy_settings_file,
+            gltf_import_profile=gltf_import_profile,
+            runtime_profile=runtime_profile,
+            render_threads=render_threads,
+            depth_pipeline=depth_pipeline,
+            label_pipeline=label_pipeline,
+            background_cache_size=background_cache_size,
+            dirty_region_max_area=dirty_region_max_area,
+            frustum_culling_margin=frustum_culling_margin,
+            lod_max_error=lod_max_error,
+            max_texture_size=max_texture_size,
+            share_duplicate_meshes=share_duplicate_meshes,
         )
+        self._max_requests = max_requests
+        self._max_rss_mb = max_rss_mb
+        self._render_count = 0
+        self._warmup_image_types = warmup_image_types
+        self._warm = False
+        self._jobs = queue.PriorityQueue() if use_render_loop else None
+        self._job_sequence = itertools.count()
+        self._scheduler = scheduler
+        self._scheduler_aging = scheduler_aging
+        self._cost_model = CostModel(_COST_FEATURES)
+        # Whether the most recent render still needs its clean-up (see
+        # _clean_up_later()).
+        self._cleanup_pending = False
+        self._lock = threading.Lock()
+        self._num_active_requests = 0
+        self._sessions = collections.OrderedDict()
+        self._max_sessions = max_sessions
+        self._max_session_mb = max_session_mb
+        self._enable_sessions = enable_sessions
 
         self.add_url_rule("/", view_func=self._root_endpoint)
+        self.add_url_rule("/healthz", view_func=self._healthz_endpoint)
+        self.add_url_rule("/readyz", view_func=self._readyz_endpoint)
+        self.add_url_rule("/metrics", view_func=self._metrics_endpoint)
 
         endpoint = "/render"
         self.add_url_rule(
@@ -406,6 +2583,22 @@ class ServerApp(flask.Flask):
             view_func=self._render_endpoint,
         )
 
+        self.add_url_rule(
+            rule="/session",
+            methods=["POST"],
+            view_func=self._session_create_endpoint,
+        )
+        self.add_url_rule(
+            rule="/session/<session_id>/render",
+            methods=["POST"],
+            view_func=self._session_render_endpoint,
+        )
+        self.add_url_rule(
+            rule="/session/<session_id>",
+            methods=["DELETE"],
+            view_func=self._session_delete_endpoint,
+        )
+
     def _root_endpoint(self):
         """Displays a banner page at the server root."""
         return """\
@@ -413,80 +2606,631 @@ class ServerApp(flask.Flask):
         <html><body><h1>Drake Render glTF Blender Server</h1></body></html>
         """
 
-    def _render_endpoint(self):
-        """Accepts a request to render and returns the generated image."""
+    def _healthz_endpoint(self):
+        """Reports that this server is alive (though perhaps not yet ready)."""
+        return {"status": "alive"}
+
+    def _readyz_endpoint(self):
+        """Reports whether this server is warmed up (see warm_up()) and idle,
+        i.e., whether a render request sent now would start right away.
+        """
+        if not self._warm:
+            return {"status": "warming_up"}, 503
+        if self._num_active_requests > 0:
+            return {"status": "busy"}, 503
+        return {"status": "ready"}
+
+    def _metrics_endpoint(self):
+        """Reports this process's resource usage and startup timeline, as
+        JSON.
+        """
+        # Wait for our turn on the render thread first (e.g., until the
+        # warm-up is done), so that the rest is up to date.
+        bpy_data = self._run_on_render_thread(self._datablock_counts)
+        return {
+            "pid": os.getpid(),
+            "render_count": self._render_count,
+            "rss_bytes": _rss_bytes(),
+            "num_sessions": len(self._sessions),
+            "startup": dict(_startup_timeline),
+            "bpy_data": bpy_data,
+            "cost_model": self._cost_model.report(),
+        }
+
+    def _datablock_counts(self):
+        """The bpy work of _metrics_endpoint(). The counts are taken after
+        any pending clean-up, so that they don't depend on its timing.
+        """
+        self._run_pending_cleanup()
+        return self._blender.datablock_counts()
+
+    def warm_up(self):
+        """Renders a tiny built-in scene once for each of the warm-up image
+        types, so that Blender's one-time costs (compiling shaders, loading
+        render kernels, building the first depsgraph, etc.) are not paid by
+        the first real request. Must be called on the main thread. Afterwards,
+        /readyz reports ready.
+        """
+        if self._warmup_image_types:
+            _logger.info(f"Warming up {', '.join(self._warmup_image_types)}")
+            self.render_warmup_scene(image_types=self._warmup_image_types)
+        # Start the first request from a clean base scene, too.
+        self._blender.clean_up()
+        self._warm = True
+        _startup_timeline["ready"] = time.monotonic() - _IMPORT_TIME
+
+    def render_warmup_scene(
+        self,
+        *,
+        image_types: typing.Sequence[str],
+        width: int = 64,
+        height: int = 48,
+    ):
+        """Renders the built-in warm-up scene once for each of the given image
+        types, and throws away the images.
+        """
+        scene = Path(self._temp_dir) / "warmup.gltf"
+        with open(scene, "w", encoding="utf-8") as f:
+            json.dump(_make_warmup_gltf(), f)
+        fov_x = math.pi / 4
+        focal = width / 2 / math.tan(fov_x / 2)
+        params = [
+            RenderParams(
+                scene=scene,
+                scene_sha256="",
+                image_type=image_type,
+                width=width,
+                height=height,
+                near=0.01,
+                far=10.0,
+                focal_x=focal,
+                focal_y=focal,
+                fov_x=fov_x,
+                fov_y=2 * math.atan(height / 2 / focal),
+                center_x=(width - 1) / 2,
+                center_y=(height - 1) / 2,
+                min_depth=0.01 if image_type == "depth" else None,
+                max_depth=10.0 if image_type == "depth" else None,
+            )
+            for image_type in image_types
+        ]
+        output_paths = [
+            scene.with_suffix(f".{i}.png") for i in range(len(params))
+        ]
         try:
-            params = self._parse_params(flask.request)
-            buffer = self._render(params)
-            return flask.send_file(buffer, mimetype="image/png")
-        except Exception as e:
-            code = 500
-            message = f"Internal server error: {repr(e)}"
-            return (
-                {
-                    "error": True,
-                    "message": message,
-                    "code": code,
-                },
-                code,
+            self._blender.render_images(
+                params=params, output_paths=output_paths
             )
+        finally:
+            for path in [scene] + output_paths:
+                path.unlink(missing_ok=True)
+            self._blender.clean_up()
 
-    def _parse_params(self, request: flask.Request) -> RenderParams:
-        """Converts an http request to a RenderParams."""
-        result = dict()
-
-        # Compute a lookup table for known form field names.
-        param_fields = {x.name: x for x in dc.fields(RenderParams)}
-        del param_fields["scene"]
+    def set_render_threads(self, render_threads: typing.Optional[int]):
+        """Sets how many threads Blender renders with (or None for Blender's
+        default of one per CPU).
+        """
+        self._blender.render_threads = render_threads
 
-        # Copy all of the form data into the result.
-        for name, value in request.form.items():
-            if name == "submit":
-                # Ignore the html boilerplate.
+    def run_render_loop(self, *, until=None):
+        """Runs the bpy work handed over by the request-handling threads (see
+        use_render_loop) on the calling thread, which must be the main thread.
+        Checks the `until` predicate between jobs, and returns once it's true.
+        """
+        assert self._jobs is not None
+        while until is None or not until():
+            try:
+                # When a clean-up is pending, it runs as soon as there is no
+                # other work to do.
+                *_, future, function, args, features = self._jobs.get(
+                    block=not self._cleanup_pending, timeout=0.1
+                )
+            except queue.Empty:
+                self._run_pending_cleanup()
                 continue
-            field = param_fields[name]
-            type_origin = typing.get_origin(field.type)
-            type_args = typing.get_args(field.type)
-            if field.type in (int, float, str):
-                result[name] = field.type(value)
-            elif type_origin == typing.Literal:
-                if value not in type_args:
-                    raise ValueError(f"Invalid literal for {name}")
-                result[name] = value
-            elif type_origin == typing.Union:
-                # In our dataclass we declare a typing.Optional but that's just
-                # sugar for typing.Union[T, typing.NoneType]. Here, we need to
-                # parse the typing.Union spelling; we can assume the only use
-                # of Union is for an Optional.
-                assert len(type_args) == 2
-                assert type_args[1] == NoneType
-                result[name] = type_args[0](value)
-            else:
-                raise NotImplementedError(name)
+            if not future.set_running_or_notify_cancel():
+                continue
+            start_time = time.monotonic()
+            try:
+                result = function(*args)
+            except BaseException as e:
+                future.set_exception(e)
+                continue
+            if features is not None:
+                self._cost_model.update(
+                    features, time.monotonic() - start_time
+                )
+            future.set_result(result)
+
+    def _clean_up_later(self, paths: typing.List[Path]):
+        """Arranges for the given temporary files to be deleted and for the
+        scene to be cleaned up (see Blender.clean_up()), once the response to
+        the current request has been sent.
+        """
 
+        @flask.after_this_request
+        def add_callback(response):
+            # Werkzeug skips the callbacks of a "direct passthrough" response
+            # (e.g., from flask.send_file()), so we opt out of that.
+            response.direct_passthrough = False
+            response.call_on_close(functools.partial(self._on_close, paths))
+            return response
+
+    def _on_close(self, paths: typing.List[Path]):
+        """The callback (from _clean_up_later()) for a response that has been
+        sent.
+        """
+        for path in paths:
+            path.unlink(missing_ok=True)
+        self._cleanup_pending = True
+        if self._jobs is None:
+            self._run_pending_cleanup()
+
+    def _run_pending_cleanup(self):
+        """Cleans up after the most recent render, unless that's been done
+        already. Must be called with bpy access (see use_render_loop).
+        """
+        if self._cleanup_pending:
+            self._cleanup_pending = False
+            self._blender.clean_up()
+
+    def is_idle(self) -> bool:
+        """Returns true iff no requests are in progress."""
+        return self._num_active_requests == 0 and self._jobs.empty()
+
+    def _run_on_render_thread(self, function, *args, features=None):
+        """Calls the given function with bpy access (see use_render_loop),
+        returning its result. For a render job, the features (per
+        _cost_features()) tell the scheduler how long it will take, and
+        the job's actual duration then refines the CostModel.
+        """
+        if self._jobs is None:
+            return function(*args)
+        sequence = next(self._job_sequence)
+        if self._scheduler == "fifo":
+            priority = sequence
+        else:
+            # Waiting lowers the priority (i.e., brings the job forward) at
+            # the same rate for every job, so their order never changes
+            # while they wait, and the queue can be a plain heap.
+            expected = 0.0
+            if features is not None:
+                expected = self._cost_model.predict(features)
+            priority = expected + self._scheduler_aging * time.monotonic()
+        future = concurrent.futures.Future()
+        self._jobs.put((priority, sequence, future, function, args, features))
+        return future.result()
+
+    def needs_recycling(self) -> bool:
+        """Returns true iff this server has exceeded its --max_requests or
+        --max_rss_mb limits, in which case its process should be replaced by
+        a fresh one (see Supervisor).
+        """
+        if self._max_requests is not None:
+            if self._render_count >= self._max_requests:
+                return True
+        if self._max_rss_mb is not None:
+            if _rss_bytes() > self._max_rss_mb * 2**20:
+                return True
+        return False
+
+    def _render_endpoint(self):
+        """Accepts a request to render and returns the generated image.
+
+        As an extension to the Drake API, the form data may also contain a
+        "cameras" field with a JSON list of objects, each of which overrides
+        some of the other form fields (e.g., "camera", "image_type", "width",
+        etc.) to describe one image to be rendered from the same scene. The
+        response is then a multipart/mixed message with one image/png part
+        per list item, in the same order.
+        """
+        with self._lock:
+            self._num_active_requests += 1
+        try:
+            try:
+                params = self._parse_params(flask.request)
+            except ValueError as e:
+                return self._error(400, f"Invalid request: {repr(e)}")
+            images = [params] if isinstance(params, RenderParams) else params
+            try:
+                scan = self._scan_scene(images)
+            except ValueError as e:
+                images[0].scene.unlink()
+                return self._error(400, f"Invalid glTF scene: {repr(e)}")
+            if isinstance(params, RenderParams):
+                buffer = self._render(params, scan)
+                return flask.send_file(buffer, mimetype="image/png")
+            buffers = self._render_multiple(params, scan)
+            return self._multipart_response(params, buffers)
+        except Exception as e:
+            return self._error(500, f"Internal server error: {repr(e)}")
+        finally:
+            with self._lock:
+                self._num_active_requests -= 1
+
+    def _session_create_endpoint(self):
+        """Accepts a glTF scene to render repeatedly, and returns the id of
+        the new session as JSON ({"session_id": ...}). The scene's nodes can
+        then be moved and rendered via /session/<session_id>/render, without
+        uploading the scene again.
+        """
+        if not self._enable_sessions:
+            return self._sessions_unavailable()
+        scene = flask.request.files.get("scene")
+        if scene is None:
+            return self._error(400, "The request has no scene file")
+        try:
+            gltf = json.load(scene.stream)
+            scan = _scan_gltf(gltf)
+            nodes = gltf["nodes"]
+        except (ValueError, KeyError) as e:
+            return self._error(400, f"Invalid glTF scene: {repr(e)}")
+
+        # Tag each node with its index, so that we can find its object again
+        # once Blender has imported (and perhaps renamed) it.
+        node_indices = dict()
+        for i, node in enumerate(nodes):
+            extras = node.get("extras")
+            extras = extras if isinstance(extras, dict) else dict()
+            node["extras"] = extras | {_SESSION_NODE_PROPERTY: i}
+            if isinstance(node.get("name"), str):
+                node_indices.setdefault(node["name"], i)
+
+        session_id = secrets.token_hex(16)
+        path = Path(self._temp_dir) / f"session_{session_id}.gltf"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(gltf, f)
+        session = _Session(
+            session_id=session_id,
+            scene=path,
+            node_indices=node_indices,
+            num_nodes=len(nodes),
+            size=path.stat().st_size,
+            scan=scan,
+        )
+        with self._lock:
+            self._sessions[session_id] = session
+            expired = self._expire_sessions()
+        for x in expired:
+            _logger.info(f"Expiring session {x.session_id}")
+            x.scene.unlink(missing_ok=True)
+        return {"session_id": session_id}, 201
+
+    def _expire_sessions(self) -> typing.List[_Session]:
+        """Removes (and returns) the least recently used sessions, until the
+        rest fit within our max_sessions and max_session_mb. The most recent
+        session is always kept. The caller must hold our lock.
+        """
+        result = []
+        while len(self._sessions) > 1:
+            total_mb = sum(x.size for x in self._sessions.values()) / 2**20
+            if len(self._sessions) <= self._max_sessions:
+                if total_mb <= self._max_session_mb:
+                    break
+            _, session = self._sessions.popitem(last=False)
+            result.append(session)
+        return result
+
+    def _session_render_endpoint(self, session_id):
+        """Renders the session's scene, and returns the generated image.
+
+        The form data is the same as for /render, except that there is no
+        scene file (and the scene_sha256 is optional). Instead, the "poses"
+        field may contain a JSON object that maps glTF node names (or
+        indices) to their new local transforms, each as a list of 16 numbers
+        in the same column-major order as a glTF node's "matrix". Nodes keep
+        their pose until it's changed again; the "camera" field names a node,
+        too. The "cameras" field works as for /render.
+        """
+        if not self._enable_sessions:
+            return self._sessions_unavailable()
+        with self._lock:
+            self._num_active_requests += 1
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+        try:
+            if session is None:
+                return self._error(404, f"Unknown session {session_id}")
+            form = dict(flask.request.form.items())
+            form.setdefault("scene_sha256", "")
+            try:
+                poses = {
+                    session.node_index(k): _parse_pose(v)
+                    for k, v in json.loads(form.pop("poses", "{}")).items()
+                }
+                params = self._parse_form(form, scene=session.scene)
+                for x in (
+                    [params] if isinstance(params, RenderParams) else params
+                ):
+                    session.node_index(x.camera)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                return self._error(400, f"Invalid request: {repr(e)}")
+            if isinstance(params, RenderParams):
+                (buffer,) = self._render_session(session, poses, [params])
+                return flask.send_file(buffer, mimetype="image/png")
+            buffers = self._render_session(session, poses, params)
+            return self._multipart_response(params, buffers)
+        except Exception as e:
+            return self._error(500, f"Internal server error: {repr(e)}")
+        finally:
+            with self._lock:
+                self._num_active_requests -= 1
+
+    def _session_delete_endpoint(self, session_id):
+        """Ends the session, freeing its scene."""
+        if not self._enable_sessions:
+            return self._sessions_unavailable()
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return self._error(404, f"Unknown session {session_id}")
+        session.scene.unlink(missing_ok=True)
+        return "", 204
+
+    @staticmethod
+    def _sessions_unavailable():
+        """Returns the response of the /session endpoints when sessions are
+        disabled (see enable_sessions).
+        """
+        return ServerApp._error(
+            501,
+            "Sessions are unavailable when the server runs several render "
+            "processes (--workers) or recycles them (--max_requests, "
+            "--max_rss_mb), because each session only exists in one process",
+        )
+
+    @staticmethod
+    def _error(code, message):
+        """Returns an error response with the given status code."""
+        return (
+            {
+                "error": True,
+                "message": message,
+                "code": code,
+            },
+            code,
+        )
+
+    def _parse_params(
+        self, request: flask.Request
+    ) -> typing.Union[RenderParams, typing.List[RenderParams]]:
+        """Converts an http request to a RenderParams, or to a list of them
+        for a multi-camera request.
+        """
         # Save the glTF scene data. Note that we don't check the scene_sha256
         # checksum; it seems unlikely that it could ever fail without flask
-        # detecting the error. In any case, the blender glTF loader should
-        # reject malformed files; we don't need to fail-fast.
+        # detecting the error. Malformed files are rejected by _scan_scene(),
+        # before they reach the blender glTF loader.
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
         scene = Path(f"{self._temp_dir}/{timestamp}.gltf")
         assert len(request.files) == 1
         request.files["scene"].save(scene)
+
+        try:
+            return self._parse_form(request.form, scene=scene)
+        except Exception:
+            # Don't leave the scene behind when the request is invalid.
+            scene.unlink()
+            raise
+
+    def _parse_form(
+        self, form: typing.Mapping[str, str], *, scene: Path
+    ) -> typing.Union[RenderParams, typing.List[RenderParams]]:
+        """Converts the form data of a render request for the given scene to
+        a RenderParams, or to a list of them for a multi-camera request.
+        """
+        result = dict()
+
+        # Copy all of the form data into the result.
+        for name, value in form.items():
+            if name in ("submit", "cameras"):
+                # Ignore the html boilerplate. The cameras are handled below.
+                continue
+            result[name] = self._parse_field(name, value)
         result["scene"] = scene
 
-        return RenderParams(**result)
+        cameras = form.get("cameras")
+        if cameras is None:
+            return RenderParams(**result)
+        cameras = json.loads(cameras)
+        if not isinstance(cameras, list) or len(cameras) == 0:
+            raise ValueError("The cameras must be a non-empty JSON list")
+        return [
+            RenderParams(
+                **(
+                    result
+                    | {k: self._parse_field(k, v) for k, v in camera.items()}
+                )
+            )
+            for camera in cameras
+        ]
+
+    @staticmethod
+    def _parse_field(name, value):
+        """Converts the value of the form field (or multi-camera JSON item)
+        with the given name to the type of the RenderParams field of the same
+        name.
+        """
+        # Compute a lookup table for known form field names.
+        param_fields = {x.name: x for x in dc.fields(RenderParams)}
+        del param_fields["scene"]
+
+        field = param_fields[name]
+        return ServerApp._parse_value(name, field.type, value)
+
+    @staticmethod
+    def _parse_value(name, value_type, value):
+        """Converts a value to the given type, for _parse_field()."""
+        type_origin = typing.get_origin(value_type)
+        type_args = typing.get_args(value_type)
+        if value_type is bool:
+            if isinstance(value, bool):
+                return value
+            if str(value).lower() in ("1", "true"):
+                return True
+            if str(value).lower() in ("0", "false"):
+                return False
+            raise ValueError(f"Invalid boolean for {name}")
+        elif value_type in (int, float, str):
+            return value_type(value)
+        elif type_origin == typing.Literal:
+            if value not in type_args:
+                raise ValueError(f"Invalid literal for {name}")
+            return value
+        elif type_origin == typing.Union:
+            # In our dataclass we declare a typing.Optional but that's just
+            # sugar for typing.Union[T, typing.NoneType]. Here, we need to
+            # parse the typing.Union spelling; we can assume the only use
+            # of Union is for an Optional.
+            assert len(type_args) == 2
+            assert type_args[1] == NoneType
+            return ServerApp._parse_value(name, type_args[0], value)
+        else:
+            raise NotImplementedError(name)
 
-    def _render(self, params: RenderParams):
+    def _scan_scene(self, params: typing.List[RenderParams]) -> _SceneScan:
+        """Scans the glTF scene of a render request (see _scan_gltf()), and
+        checks that it has a node for each of the requested cameras. Raises
+        ValueError when it doesn't (or isn't a glTF scene at all).
+        """
+        with open(params[0].scene, encoding="utf-8") as f:
+            scan = _scan_gltf(json.load(f))
+        # With a --blend_file, the camera may come from the blend file.
+        if not self._has_blend_file:
+            for x in params:
+                if x.camera not in scan.node_names:
+                    raise ValueError(f"No camera node named {x.camera!r}")
+        return scan
+
+    def _render(self, params: RenderParams, scan: _SceneScan):
         """Renders the given scene, returning the png data buffer."""
-        output_path = params.scene.with_suffix(".png")
-        try:
-            self._blender.render_image(params=params, output_path=output_path)
+        (buffer,) = self._render_multiple([params], scan)
+        return buffer
+
+    def _render_multiple(
+        self, params: typing.List[RenderParams], scan: _SceneScan
+    ):
+        """Renders the given images of one (scanned) scene, returning a list
+        of png data buffers.
+        """
+        output_paths = [
+            x.scene.with_suffix(f".{i}.png") for i, x in enumerate(params)
+        ]
+        # The clean-up (including the removal of our files) waits until after
+        # the response has been sent, so that it isn't on the client's clock.
+        self._clean_up_later([params[0].scene] + output_paths)
+        self._run_on_render_thread(
+            self._render_job,
+            params,
+            output_paths,
+            features=_cost_features(scan, params),
+        )
+        buffers = []
+        for output_path in output_paths:
             with open(output_path, "rb") as f:
-                buffer = io.BytesIO(f.read())
-            return buffer
-        finally:
-            params.scene.unlink(missing_ok=True)
-            output_path.unlink(missing_ok=True)
+                buffers.append(io.BytesIO(f.read()))
+        return buffers
+
+    def _render_job(self, params: typing.List[RenderParams], output_paths):
+        """The bpy work of _render_multiple()."""
+        # In case a request has come in before the previous one's clean-up
+        # had a chance to run.
+        self._run_pending_cleanup()
+        self._render_count += 1
+        self._blender.render_images(params=params, output_paths=output_paths)
+
+    def _render_session(
+        self,
+        session: _Session,
+        poses: typing.Dict[int, np.ndarray],
+        params: typing.List[RenderParams],
+    ):
+        """Moves the session's nodes to the given poses, and then renders the
+        given images, returning a list of png data buffers.
+        """
+        token = secrets.token_hex(8)
+        output_paths = [
+            session.scene.with_suffix(f".{token}.{i}.png")
+            for i in range(len(params))
+        ]
+        self._clean_up_later(output_paths)
+        self._run_on_render_thread(
+            self._render_session_job,
+            session,
+            poses,
+            params,
+            output_paths,
+            features=_cost_features(session.scan, params, session=True),
+        )
+        buffers = []
+        for output_path in output_paths:
+            with open(output_path, "rb") as f:
+                buffers.append(io.BytesIO(f.read()))
+        return buffers
+
+    def _render_session_job(
+        self,
+        session: _Session,
+        poses: typing.Dict[int, np.ndarray],
+        params: typing.List[RenderParams],
+        output_paths,
+    ):
+        """The bpy work of _render_session()."""
+        self._run_pending_cleanup()
+        self._render_count += 1
+        session.poses.update(poses)
+        self._blender.render_session_images(
+            session=session, params=params, output_paths=output_paths
+        )
+
+    @staticmethod
+    def _multipart_response(params: typing.List[RenderParams], buffers):
+        """Returns a multipart/mixed response with one png part per image.
+        Each part's Content-Disposition gives its index into the request's
+        list of cameras as the name, and "{camera}.{image_type}.png" as the
+        filename.
+        """
+        boundary = secrets.token_hex(16)
+        body = io.BytesIO()
+        for i, (image_params, buffer) in enumerate(zip(params, buffers)):
+            filename = f"{image_params.camera}.{image_params.image_type}.png"
+            filename = filename.replace("\\", "_").replace('"', "_")
+            body.write(f"--{boundary}\r\n".encode())
+            body.write(b"Content-Type: image/png\r\n")
+            body.write(
+                f'Content-Disposition: attachment; name="{i}"; '
+                f'filename="{filename}"\r\n\r\n'.encode()
+            )
+            body.write(buffer.getvalue())
+            body.write(b"\r\n")
+        body.write(f"--{boundary}--\r\n".encode())
+        return flask.Response(
+            body.getvalue(),
+            content_type=f"multipart/mixed; boundary={boundary}",
+        )
+
+
+def _parse_workers(value: str) -> typing.Union[int, typing.Literal["auto"]]:
+    """Parses the --workers flag."""
+    if value == "auto":
+        return value
+    result = int(value)
+    if result < 1:
+        raise ValueError(value)
+    return result
+
+
+def _parse_max_texture_size(
+    value: str,
+) -> typing.Union[int, typing.Literal["auto"]]:
+    """Parses the --max_texture_size flag."""
+    if value == "auto":
+        return value
+    result = int(value)
+    if result < 1:
+        raise ValueError(value)
+    return result
 
 
 def main():
@@ -524,7 +3268,230 @@ def main():
         "The settings file will be applied after loading the --blend_file "
         "(if any) so that it has priority.",
     )
+    parser.add_argument(
+        "--gltf_import_profile",
+        choices=sorted(_GLTF_IMPORT_PROFILES.keys()),
+        default="full",
+        help="Which set of glTF importer options to use for color images. "
+        "The 'full' profile uses the importer's defaults. The 'fast' profile "
+        "shades meshes with Blender's own normals instead of the glTF's "
+        "(which only differ where the glTF's normals don't follow the "
+        "surface), which makes the import much faster. (Depth and label "
+        "images are never shaded, so they always skip the glTF's normals.) "
+        "Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--bpy_runtime_profile",
+        choices=["lean", "full"],
+        default="full",
+        help="How to set up Blender itself. The 'full' profile keeps "
+        "Blender's factory settings (as an interactive user would see them). "
+        "The 'lean' profile turns off undo, the user interface's odds and "
+        "ends, and every add-on except Cycles and the glTF importer, which "
+        "starts up faster, but breaks any --blend_file or "
+        "--bpy_settings_file that relies on another add-on. Run the "
+        "benchmark in test/benchmark.py to compare them. Default: "
+        "%(default)s.",
+    )
+    parser.add_argument(
+        "--depth_pipeline",
+        choices=["compositor", "numpy"],
+        default="compositor",
+        help="How to turn Blender's depth pass into a depth image. The "
+        "'compositor' pipeline uses Blender's compositor nodes; the 'numpy' "
+        "pipeline writes the raw depth pass to an uncompressed EXR file "
+        "(Blender can't hand over render passes any other way when it runs "
+        "in the background), reads it back, and converts it with NumPy. The "
+        "file's round trip and the conversion take milliseconds, next to "
+        "seconds for the render itself; run the depth_pipeline benchmark in "
+        "test/benchmark.py to compare the pipelines. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--label_pipeline",
+        choices=["material", "cryptomatte"],
+        default="material",
+        help="How to render label images. The 'material' pipeline replaces "
+        "every material with a flat, unlit color; the 'cryptomatte' pipeline "
+        "leaves the materials alone, renders which object is frontmost at "
+        "each pixel, and looks up its color with NumPy. Default: "
+        "%(default)s.",
+    )
+    parser.add_argument(
+        "--background_cache_size",
+        type=int,
+        default=0,
+        metavar="N",
+        help="For scenes with a --blend_file, render each image in two "
+        "layers: the blend file's objects, which are rendered once per camera "
+        "pose and kept for up to N camera poses, and the client's objects, "
+        "which are rendered anew and composited in front by their depth. "
+        "This is much faster for static cameras in a detailed blend file, "
+        "but the client's objects cast no shadows on (and show up in no "
+        "reflections of) the blend file's objects; see the README. Default: "
+        "%(default)s (off).",
+    )
+    parser.add_argument(
+        "--dirty_region_max_area",
+        type=float,
+        metavar="FRACTION",
+        help="For scenes uploaded to the /session endpoint, re-render only "
+        "the part of each image that the moving objects cover (before and "
+        "after they moved), and patch it into the previous image from the "
+        "same camera, unless that part is more than this fraction of the "
+        "image. The moving objects' shadows and reflections outside of that "
+        "part don't update; see the README. Default: off.",
+    )
+    parser.add_argument(
+        "--frustum_culling_margin",
+        type=float,
+        metavar="METERS",
+        help="Hide the meshes that each camera can't see from its render. For "
+        "depth and label images, this changes nothing but the speed. For "
+        "color images, the camera's view grows by this many meters in every "
+        "direction first, so that meshes just out of view still cast their "
+        "shadows and show up in reflections; the farther their effects "
+        "reach, the bigger the margin needs to be. Default: off.",
+    )
+    parser.add_argument(
+        "--lod_max_error",
+        type=float,
+        metavar="PIXELS",
+        help="Render each client mesh with more than 10000 faces from a "
+        "decimated proxy, whenever the proxy strays from the original mesh by "
+        "at most this many pixels in a color image (or a quarter of that in a "
+        "depth image). Label images always use the original meshes. Each "
+        "proxy is generated once, and reused for any mesh with the same "
+        "content. Default: off.",
+    )
+    parser.add_argument(
+        "--max_texture_size",
+        type=_parse_max_texture_size,
+        metavar="{PIXELS,auto}",
+        help="Downscale the client's texture images (png or jpeg) to at most "
+        "this many pixels on their longer side before importing them for a "
+        "color image. With 'auto', the limit is the longer side of the color "
+        "image being rendered, which only loses detail in close-ups of a "
+        "part of a texture. Each texture image is only downscaled once, and "
+        "reused for any image with the same content. Default: off.",
+    )
+    parser.add_argument(
+        "--keep_duplicate_meshes",
+        action="store_true",
+        help="Import each of the client's objects with a mesh of its own. By "
+        "default, objects whose meshes have identical content (in a glTF "
+        "file whose buffers aren't binary, i.e., not a glb) share a single "
+        "mesh, which saves import time and memory for scenes with many "
+        "copies of the same object.",
+    )
+    parser.add_argument(
+        "--max_requests",
+        type=int,
+        metavar="N",
+        help="Recycle the render process after it has handled this many "
+        "render requests. A pre-warmed spare process takes over, so no "
+        "request sees a cold start.",
+    )
+    parser.add_argument(
+        "--max_rss_mb",
+        type=float,
+        metavar="MB",
+        help="Recycle the render process once its resident memory grows past "
+        "this many mebibytes. A pre-warmed spare process takes over, so no "
+        "request sees a cold start.",
+    )
+    parser.add_argument(
+        "--max_sessions",
+        type=int,
+        default=16,
+        metavar="N",
+        help="How many scenes uploaded to the /session endpoint to keep; "
+        "beyond this, the least recently used sessions expire. (The /session "
+        "endpoints are unavailable with several --workers, or with "
+        "--max_requests or --max_rss_mb.) Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--max_session_mb",
+        type=float,
+        default=1024,
+        metavar="MB",
+        help="How many mebibytes of scenes uploaded to the /session endpoint "
+        "to keep; beyond this, the least recently used sessions expire. "
+        "Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--warmup_image_types",
+        nargs="*",
+        choices=["color", "depth", "label"],
+        default=[],
+        metavar="IMAGE_TYPE",
+        help="Before reporting ready (see the /readyz endpoint), render a "
+        "tiny built-in scene once for each of these image types, so that the "
+        "first real request is as fast as the ones after it (e.g., 'color' "
+        "compiles the color shaders ahead of time). By default, there is no "
+        "warm-up.",
+    )
+    parser.add_argument(
+        "--scheduler",
+        choices=["fifo", "shortest_expected_first"],
+        default="fifo",
+        help="Which of the waiting render requests to render next: the "
+        "oldest one ('fifo'), or the one expected to finish soonest "
+        "('shortest_expected_first'), per a cost model that the server "
+        "learns from the size of each scene and its images. Default: "
+        "%(default)s.",
+    )
+    parser.add_argument(
+        "--scheduler_aging",
+        type=float,
+        default=1.0,
+        metavar="RATIO",
+        help="For --scheduler=shortest_expected_first, how many seconds of "
+        "expected render time each second of waiting makes up for, so that "
+        "expensive requests still get their turn. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=_parse_workers,
+        default=1,
+        metavar="{N,auto}",
+        help="How many render processes to run side by side, each pinned to "
+        "its own share of the CPUs. With 'auto', a short benchmark at startup "
+        "picks the number that renders the most frames per second. Default: "
+        "%(default)s.",
+    )
+    parser.add_argument(
+        "--render_threads",
+        type=int,
+        metavar="N",
+        help="How many threads each render process renders with. Defaults to "
+        "the size of its share of the CPUs when there are several --workers, "
+        "or else to Blender's own default (one per CPU).",
+    )
+    # These are only for use by the Supervisor.
+    parser.add_argument("--worker_fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--control_fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--calibrate", type=json.loads, help=argparse.SUPPRESS)
     args = parser.parse_args()
+    if args.background_cache_size and args.blend_file is None:
+        parser.error("--background_cache_size requires a --blend_file")
+    if args.background_cache_size and args.dirty_region_max_area is not None:
+        parser.error(
+            "--background_cache_size and --dirty_region_max_area are "
+            "mutually exclusive"
+        )
+
+    recycling = args.max_requests is not None or args.max_rss_mb is not None
+    supervised = recycling or args.workers != 1
+    if supervised and args.worker_fd is None and args.calibrate is None:
+        Supervisor(
+            program=[sys.executable, str(Path(__file__).absolute())],
+            host=args.host,
+            port=args.port,
+            worker_args=sys.argv[1:],
+            num_workers=args.workers,
+            render_threads=args.render_threads,
+        ).run()
+        return
 
     prefix = "drake_blender_"
     with tempfile.TemporaryDirectory(prefix=prefix) as temp_dir:
@@ -532,10 +3499,56 @@ def main():
             temp_dir=temp_dir,
             blend_file=args.blend_file,
             bpy_settings_file=args.bpy_settings_file,
+            gltf_import_profile=args.gltf_import_profile,
+            runtime_profile=args.bpy_runtime_profile,
+            render_threads=args.render_threads,
+            depth_pipeline=args.depth_pipeline,
+            label_pipeline=args.label_pipeline,
+            background_cache_size=args.background_cache_size,
+            dirty_region_max_area=args.dirty_region_max_area,
+            frustum_culling_margin=args.frustum_culling_margin,
+            lod_max_error=args.lod_max_error,
+            max_texture_size=args.max_texture_size,
+            share_duplicate_meshes=not args.keep_duplicate_meshes,
+            max_requests=args.max_requests,
+            max_rss_mb=args.max_rss_mb,
+            max_sessions=args.max_sessions,
+            max_session_mb=args.max_session_mb,
+            enable_sessions=not supervised,
+            warmup_image_types=args.warmup_image_types,
+            scheduler=args.scheduler,
+            scheduler_aging=args.scheduler_aging,
+            use_render_loop=not args.debug,
         )
-        app.run(
-            host=args.host, port=args.port, debug=args.debug, threaded=False
+        if args.calibrate is not None:
+            calibrate(app, args.calibrate)
+            return
+        if args.worker_fd is not None:
+            serve_as_worker(
+                app,
+                host=args.host,
+                worker_fd=args.worker_fd,
+                control_fd=args.control_fd,
+            )
+            return
+        if args.debug:
+            # Flask's reloader needs the main thread, so we serve one request
+            # at a time (with direct bpy access) like a plain flask app.
+            app.warm_up()
+            app.run(host=args.host, port=args.port, debug=True, threaded=False)
+            return
+        # Answer requests on a background thread, so that we can tell clients
+        # whether we're alive (/healthz) and ready (/readyz) even while we're
+        # busy warming up or rendering on the main thread.
+        server = werkzeug.serving.make_server(
+            args.host, args.port, app, threaded=True
         )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Use the same phrasing as flask, for the benefit of scripts that wait
+        # for the server to start.
+        print(f" * Running on http://{args.host}:{server.port}", flush=True)
+        app.warm_up()
+        app.run_render_loop()
 
 
 if __name__ == "__main__":
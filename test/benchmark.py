@@ -0,0 +1,716 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Benchmarks the render server's scene processing, in-process, on synthetic
+Drake-like glTF scenes. Use this to judge whether an option is worth its cost:
+
+  ./bazel run //test:benchmark -- --help
+"""
+
+import argparse
+import base64
+import json
+import math
+from pathlib import Path
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import bpy
+import numpy as np
+
+from image_codecs import depth_to_uint16, encode_png
+import server
+
+# The pose of the "Camera Node" used by our test scenes, e.g., in
+# test/two_rgba_boxes.gltf.
+_CAMERA_MATRIX = [
+    0.0007963267107332482,
+    0.9999996829318346,
+    0.0,
+    0.0,
+    -0.5048459445292294,
+    0.00040202243790249793,
+    0.8632093666488737,
+    0.0,
+    0.8632090929526635,
+    -0.000687396675617628,
+    0.5048461045998576,
+    0.0,
+    0.29999999999999993,
+    4.553649124439119e-18,
+    0.20000000000000004,
+    1.0,
+]
+
+
+def _sphere(num_segments):
+    """Returns the (positions, normals, uvs, indices) of a unit UV sphere."""
+    num_rings = max(num_segments // 2, 2)
+    theta = np.linspace(0, math.pi, num_rings + 1)
+    phi = np.linspace(0, 2 * math.pi, num_segments + 1)
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+    normals = np.stack(
+        [
+            np.sin(theta) * np.cos(phi),
+            np.cos(theta),
+            np.sin(theta) * np.sin(phi),
+        ],
+        axis=-1,
+    ).reshape(-1, 3)
+    uvs = np.stack([phi / (2 * math.pi), theta / math.pi], axis=-1).reshape(
+        -1, 2
+    )
+    stride = num_segments + 1
+    ring, segment = np.meshgrid(
+        np.arange(num_rings), np.arange(num_segments), indexing="ij"
+    )
+    a = (ring * stride + segment).ravel()
+    b = a + stride
+    # Wound counterclockwise when seen from outside, to match the normals.
+    indices = np.stack([a, a + 1, b, a + 1, b + 1, b], axis=-1).ravel()
+    return (
+        normals.astype(np.float32),
+        normals.astype(np.float32),
+        uvs.astype(np.float32),
+        indices.astype(np.uint32),
+    )
+
+
+def make_scene(
+    path, *, num_objects, num_segments, texture_size, duplicates=False
+):
+    """Writes a glTF file to `path` shaped like the ones Drake sends to the
+    server: one node per object (each a sphere with `num_segments` segments
+    around its equator and its own embedded texture of `texture_size` pixels
+    square, or no texture when zero) plus a "Camera Node", all below a single
+    "Renderer Node". Like Drake, every object gets its own copy of its mesh
+    data; when `duplicates` is true, those copies are all identical.
+    """
+    gltf = dict(
+        asset=dict(generator="drake_blender benchmark", version="2.0"),
+        scene=0,
+        scenes=[dict(nodes=[0])],
+        nodes=[dict(name="Renderer Node", children=[1])],
+        cameras=[
+            dict(
+                type="perspective",
+                perspective=dict(aspectRatio=4 / 3, yfov=0.785, znear=0.01),
+            )
+        ],
+        meshes=[],
+        materials=[],
+        accessors=[],
+        bufferViews=[],
+        buffers=[],
+    )
+    gltf["nodes"].append(
+        dict(name="Camera Node", camera=0, matrix=_CAMERA_MATRIX)
+    )
+
+    def add_buffer(data):
+        gltf["buffers"].append(
+            dict(
+                byteLength=len(data),
+                uri="data:application/octet-stream;base64,"
+                + base64.b64encode(data).decode(),
+            )
+        )
+        index = len(gltf["buffers"]) - 1
+        gltf["bufferViews"].append(
+            dict(buffer=index, byteOffset=0, byteLength=len(data))
+        )
+        return index
+
+    def add_accessor(array, component_type, kind, **kwargs):
+        view = add_buffer(array.tobytes())
+        gltf["accessors"].append(
+            dict(
+                bufferView=view,
+                componentType=component_type,
+                count=len(array),
+                type=kind,
+                **kwargs,
+            )
+        )
+        return len(gltf["accessors"]) - 1
+
+    positions, normals, uvs, indices = _sphere(num_segments)
+    grid = math.ceil(math.sqrt(num_objects))
+    radius = 0.1 / grid
+    for i in range(num_objects):
+        rng = np.random.default_rng(seed=0 if duplicates else i)
+        material = dict(
+            pbrMetallicRoughness=dict(
+                baseColorFactor=[*rng.uniform(size=3).tolist(), 1.0],
+                metallicFactor=0.0,
+                roughnessFactor=1.0,
+            )
+        )
+        attributes = dict(
+            POSITION=add_accessor(
+                positions * radius,
+                5126,
+                "VEC3",
+                min=[-radius] * 3,
+                max=[radius] * 3,
+            ),
+            NORMAL=add_accessor(normals, 5126, "VEC3"),
+        )
+        if texture_size > 0:
+            attributes["TEXCOORD_0"] = add_accessor(uvs, 5126, "VEC2")
+            pixels = rng.integers(
+                0, 256, size=(texture_size, texture_size, 3), dtype=np.uint8
+            )
+            gltf.setdefault("images", []).append(
+                dict(
+                    bufferView=add_buffer(encode_png(pixels)),
+                    mimeType="image/png",
+                )
+            )
+            gltf.setdefault("samplers", [dict()])
+            gltf.setdefault("textures", []).append(
+                dict(sampler=0, source=len(gltf["images"]) - 1)
+            )
+            material["pbrMetallicRoughness"]["baseColorTexture"] = dict(
+                index=len(gltf["textures"]) - 1
+            )
+        gltf["materials"].append(material)
+        gltf["meshes"].append(
+            dict(
+                primitives=[
+                    dict(
+                        attributes=attributes,
+                        indices=add_accessor(indices, 5125, "SCALAR"),
+                        material=i,
+                    )
+                ]
+            )
+        )
+        row, column = divmod(i, grid)
+        gltf["nodes"].append(
+            dict(
+                name=f"object_{i}",
+                mesh=i,
+                translation=[
+                    (row - grid / 2) * 2.5 * radius,
+                    0.0,
+                    (column - grid / 2) * 2.5 * radius,
+                ],
+            )
+        )
+        gltf["nodes"][0]["children"].append(len(gltf["nodes"]) - 1)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(gltf, f)
+
+
+def make_params(scene, *, image_type, width=640, height=480):
+    """Returns the RenderParams for rendering `scene` with the same camera
+    intrinsics as our tests use."""
+    focal = width / 2 / math.tan(0.785398 / 2)
+    return server.RenderParams(
+        scene=scene,
+        scene_sha256="NOT_USED_IN_THE_BENCHMARK",
+        image_type=image_type,
+        width=width,
+        height=height,
+        near=0.01,
+        far=10.0,
+        focal_x=focal,
+        focal_y=focal,
+        fov_x=0.785398,
+        fov_y=2 * math.atan(height / 2 / focal),
+        center_x=width / 2 - 0.5,
+        center_y=height / 2 - 0.5,
+        min_depth=0.01 if image_type == "depth" else None,
+        max_depth=10.0 if image_type == "depth" else None,
+    )
+
+
+def _time(function, *, repeat):
+    """Returns the median wall time of calling `function` `repeat` times."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def _print_row(name, seconds, baseline=None):
+    line = f"  {name:<60} {seconds * 1000:9.1f} ms"
+    if baseline is not None:
+        line += f" {(seconds - baseline) * 1000:+9.1f} ms"
+    print(line)
+
+
+def benchmark_import_options(*, temp_dir, args):
+    """Times bpy.ops.import_scene.gltf() with the importer's defaults, under
+    each --gltf_import_profile, and with each single option of the "fast"
+    profile applied, so we can see which options matter. (For depth images,
+    both profiles skip the glTF's normals.)
+    """
+    blender = server.Blender()
+    scene = temp_dir / "import_options.gltf"
+    for image_type in ("color", "depth"):
+        make_scene(
+            scene,
+            num_objects=args.num_objects,
+            num_segments=args.num_segments,
+            texture_size=args.texture_size,
+        )
+        if image_type != "color":
+            with open(scene, encoding="utf-8") as f:
+                gltf = json.load(f)
+            server._strip_gltf_textures(gltf)
+            with open(scene, "w", encoding="utf-8") as f:
+                json.dump(gltf, f)
+
+        def import_with(options):
+            # Purge the previous import's datablocks, so that they don't slow
+            # down (and skew the timing of) the next one.
+            blender.reset_scene()
+            blender.purge_orphans()
+            bpy.ops.import_scene.gltf(filepath=str(scene), **options)
+
+        full = server.Blender(gltf_import_profile="full")
+        fast = server.Blender(gltf_import_profile="fast")
+        full_options = full.gltf_import_options(image_type)
+        fast_options = fast.gltf_import_options(image_type)
+        print(f"glTF import ({image_type}):")
+        baseline = _time(lambda: import_with(dict()), repeat=args.repeat)
+        _print_row("importer defaults", baseline)
+        for profile, profile_options in (
+            ("full", full_options),
+            ("fast", fast_options),
+        ):
+            _print_row(
+                f"profile={profile}",
+                _time(
+                    lambda: import_with(profile_options), repeat=args.repeat
+                ),
+                baseline,
+            )
+        for name, value in fast_options.items():
+            options = {name: value}
+            _print_row(
+                f"importer defaults, {name}={value!r}",
+                _time(lambda: import_with(options), repeat=args.repeat),
+                baseline,
+            )
+
+
+def benchmark_render(*, temp_dir, args):
+    """Times Blender.render_image() end-to-end for each image type under each
+    --gltf_import_profile."""
+    original = temp_dir / "render_original.gltf"
+    make_scene(
+        original,
+        num_objects=args.num_objects,
+        num_segments=args.num_segments,
+        texture_size=args.texture_size,
+    )
+    scene = temp_dir / "render.gltf"
+    output = temp_dir / "render.png"
+    for image_type in ("color", "depth", "label"):
+        print(f"render_image ({image_type}):")
+        baseline = None
+        for profile in ("full", "fast"):
+            blender = server.Blender(
+                bpy_settings_file=args.bpy_settings_file,
+                gltf_import_profile=profile,
+            )
+
+            def render():
+                # The server may rewrite its input in place, so we need a
+                # fresh copy for every render.
+                shutil.copy(original, scene)
+                blender.render_image(
+                    params=make_params(scene, image_type=image_type),
+                    output_path=output,
+                )
+
+            seconds = _time(render, repeat=args.repeat)
+            _print_row(f"profile={profile}", seconds, baseline)
+            baseline = baseline or seconds
+
+
+def benchmark_depth_pipeline(*, temp_dir, args):
+    """Times Blender.render_image() of depth images end-to-end under each
+    --depth_pipeline, and the steps of the "numpy" pipeline that replace the
+    compositor's: reading the raw depth pass back from its EXR file, and
+    converting it to a PNG.
+    """
+    original = temp_dir / "depth_original.gltf"
+    make_scene(
+        original,
+        num_objects=args.num_objects,
+        num_segments=args.num_segments,
+        texture_size=0,
+    )
+    scene = temp_dir / "depth.gltf"
+    output = temp_dir / "depth.png"
+    raw = temp_dir / "depth.exr"
+    for width, height in ((640, 480), (1280, 960)):
+        print(f"render_image (depth, {width}x{height}):")
+        baseline = None
+        for pipeline in ("compositor", "numpy"):
+            blender = server.Blender(
+                bpy_settings_file=args.bpy_settings_file,
+                depth_pipeline=pipeline,
+            )
+
+            def render():
+                shutil.copy(original, scene)
+                blender.render_image(
+                    params=make_params(
+                        scene, image_type="depth", width=width, height=height
+                    ),
+                    output_path=output,
+                )
+
+            seconds = _time(render, repeat=args.repeat)
+            _print_row(f"depth_pipeline={pipeline}", seconds, baseline)
+            baseline = baseline or seconds
+
+        # Write a raw depth file just like the "numpy" pipeline's renders do
+        # (see Blender.raw_depth_render_settings()).
+        image = bpy.data.images.new(
+            "RawDepth", width, height, float_buffer=True, is_data=True
+        )
+        depth = np.linspace(0, 12, width * height * 4, dtype=np.float32)
+        image.pixels.foreach_set(depth)
+        image_settings = bpy.context.scene.render.image_settings
+        image_settings.file_format = "OPEN_EXR"
+        image_settings.color_mode = "BW"
+        image_settings.color_depth = "32"
+        image_settings.exr_codec = "NONE"
+        image.save_render(str(raw))
+        bpy.data.images.remove(image)
+        depth = blender._read_pixels(raw, remove=False)[:, :, 0]
+        _print_row(
+            "  of which: EXR read-back",
+            _time(
+                lambda: blender._read_pixels(raw, remove=False),
+                repeat=args.repeat,
+            ),
+        )
+        _print_row(
+            "  of which: conversion to PNG",
+            _time(
+                lambda: encode_png(
+                    depth_to_uint16(depth, min_depth=0.01, max_depth=10.0)
+                ),
+                repeat=args.repeat,
+            ),
+        )
+        raw.unlink()
+
+
+def benchmark_instancing(*, temp_dir, args):
+    """Times Blender.render_image() for a scene of identical objects versus a
+    scene of distinct objects, with and without the server turning identical
+    objects into linked duplicates (i.e., --keep_duplicate_meshes), and times
+    that step on its own. With the sharing, identical objects should be much
+    cheaper.
+    """
+    original = temp_dir / "instancing_original.gltf"
+    scene = temp_dir / "instancing.gltf"
+    output = temp_dir / "instancing.png"
+    blender = server.Blender(bpy_settings_file=args.bpy_settings_file)
+    print("render_image (color) of identical vs distinct objects:")
+    baseline = None
+    for duplicates in (False, True):
+        make_scene(
+            original,
+            num_objects=args.num_objects,
+            num_segments=args.num_segments,
+            texture_size=args.texture_size,
+            duplicates=duplicates,
+        )
+
+        def render():
+            shutil.copy(original, scene)
+            blender.render_image(
+                params=make_params(scene, image_type="color"),
+                output_path=output,
+            )
+
+        for share in (False, True):
+            blender._share_duplicate_meshes = share
+            seconds = _time(render, repeat=args.repeat)
+            meshes = len(bpy.data.meshes)
+            _print_row(
+                f"duplicates={duplicates}, share={share} ({meshes} meshes)",
+                seconds,
+                baseline,
+            )
+            baseline = baseline or seconds
+
+        def share_meshes():
+            with open(original, encoding="utf-8") as f:
+                gltf = json.load(f)
+            server._share_duplicate_gltf_meshes(gltf, base_dir=temp_dir)
+
+        _print_row(
+            "  of which: reading the glTF and sharing its meshes",
+            _time(share_meshes, repeat=args.repeat),
+        )
+
+
+def benchmark_runtime_profile(*, temp_dir, args):
+    """Times the server's startup (importing bpy and setting up Blender) and
+    its per-request overhead (a render of a tiny scene, where the fixed costs
+    dominate), and measures its resident memory afterwards, under each
+    --bpy_runtime_profile. Each profile runs in a fresh process of its own,
+    because Blender's preferences and add-ons are global.
+    """
+    scene = temp_dir / "runtime_profile.gltf"
+    make_scene(scene, num_objects=1, num_segments=8, texture_size=0)
+    results = temp_dir / "runtime_profile.json"
+    print("runtime profile:")
+    baseline = None
+    for profile in ("full", "lean"):
+        command = [
+            sys.executable,
+            __file__,
+            f"--runtime_profile_probe={profile}",
+            f"--repeat={args.repeat}",
+            f"--scene={scene}",
+            f"--probe_start={time.time()}",
+            f"--probe_output={results}",
+        ]
+        if args.bpy_settings_file is not None:
+            command.append(f"--bpy_settings_file={args.bpy_settings_file}")
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(results, encoding="utf-8") as f:
+            result = json.load(f)
+        baseline = baseline or result
+        _print_row(
+            f"profile={profile}, startup",
+            result["startup"],
+            None if baseline is result else baseline["startup"],
+        )
+        _print_row(
+            f"profile={profile}, per request",
+            result["request"],
+            None if baseline is result else baseline["request"],
+        )
+        rss = f"{result['rss_mb']:9.1f} MiB"
+        if baseline is not result:
+            rss += f" {result['rss_mb'] - baseline['rss_mb']:+9.1f} MiB"
+        print(f"  {f'profile={profile}, RSS':<60} {rss}")
+
+
+def _probe_runtime_profile(args):
+    """The process that benchmark_runtime_profile() measures. (Its startup
+    time includes importing bpy, which happens before main() runs.)
+    """
+    blender = server.Blender(
+        bpy_settings_file=args.bpy_settings_file,
+        runtime_profile=args.runtime_profile_probe,
+    )
+    blender.reset_scene()
+    startup = time.time() - args.probe_start
+    scene = args.scene.with_name(f"{args.runtime_profile_probe}.gltf")
+    output = scene.with_suffix(".png")
+
+    def render():
+        shutil.copy(args.scene, scene)
+        blender.render_image(
+            params=make_params(scene, image_type="label", width=64, height=48),
+            output_path=output,
+        )
+
+    # The first render pays for Blender's one-time costs (e.g., compiling
+    # shaders), which the server's warm-up would have taken care of.
+    render()
+    request = _time(render, repeat=args.repeat)
+    rss_mb = server._rss_bytes() / 2**20
+    with open(args.probe_output, "w", encoding="utf-8") as f:
+        json.dump(dict(startup=startup, request=request, rss_mb=rss_mb), f)
+
+
+def benchmark_lod(*, temp_dir, args):
+    """Times Blender.render_image() of a few heavy meshes (spheres with
+    --lod_num_segments segments) under each --lod_max_error, and measures how
+    far each image strays from the exact one (the fraction of its pixels that
+    differ by more than one level, and the mean absolute difference). The
+    first render generates the proxies, so it's timed on its own.
+    """
+    original = temp_dir / "lod_original.gltf"
+    make_scene(
+        original,
+        num_objects=4,
+        num_segments=args.lod_num_segments,
+        texture_size=0,
+    )
+    scene = temp_dir / "lod.gltf"
+    output = temp_dir / "lod.png"
+    for image_type in ("color", "depth"):
+        print(f"render_image ({image_type}) of heavy meshes:")
+        baseline = None
+        exact = None
+        for lod_max_error in (None, 0.5, 1.0, 4.0):
+            blender = server.Blender(
+                bpy_settings_file=args.bpy_settings_file,
+                lod_max_error=lod_max_error,
+            )
+
+            def render():
+                shutil.copy(original, scene)
+                blender.render_image(
+                    params=make_params(scene, image_type=image_type),
+                    output_path=output,
+                )
+
+            first = _time(render, repeat=1)
+            seconds = _time(render, repeat=args.repeat)
+            image = blender._read_pixels(output, remove=False)
+            scale = 255 if image_type == "color" else 65535
+            if exact is None:
+                exact = image
+            diff = np.abs(image - exact) * scale
+            _print_row(f"lod_max_error={lod_max_error} (first render)", first)
+            _print_row(f"lod_max_error={lod_max_error}", seconds, baseline)
+            print(
+                f"    error: {np.mean(diff > 1):.2%} of pixels, "
+                f"{diff.mean():.3f} levels on average"
+            )
+            baseline = baseline or seconds
+
+
+def benchmark_textures(*, temp_dir, args):
+    """Times Blender.render_image() of a few objects with big textures (of
+    --large_texture_size pixels square) under each --max_texture_size, and
+    measures how much memory their decoded texture images take. The
+    first render downscales the textures, so it's timed on its own; later
+    ones reuse its results.
+    """
+    original = temp_dir / "textures_original.gltf"
+    make_scene(
+        original,
+        num_objects=4,
+        num_segments=args.num_segments,
+        texture_size=args.large_texture_size,
+    )
+    scene = temp_dir / "textures.gltf"
+    output = temp_dir / "textures.png"
+    print("render_image (color) of big textures:")
+    baseline = None
+    for max_texture_size in (None, "auto", 256):
+        blender = server.Blender(
+            bpy_settings_file=args.bpy_settings_file,
+            max_texture_size=max_texture_size,
+        )
+
+        def render():
+            shutil.copy(original, scene)
+            blender.render_image(
+                params=make_params(scene, image_type="color"),
+                output_path=output,
+            )
+
+        first = _time(render, repeat=1)
+        seconds = _time(render, repeat=args.repeat)
+        # The client objects (and so their images) stay until the next render.
+        # Blender holds each decoded image as 4 channels of bytes (or floats).
+        texture_bytes = sum(
+            x.size[0] * x.size[1] * 4 * (4 if x.is_float else 1)
+            for x in bpy.data.images
+            if x.source == "FILE"
+        )
+        name = f"max_texture_size={max_texture_size}"
+        _print_row(f"{name} (first render)", first)
+        _print_row(name, seconds, baseline)
+        print(f"    texture memory: {texture_bytes / 2**20:.1f} MiB")
+        baseline = baseline or seconds
+
+
+_BENCHMARKS = {
+    "depth_pipeline": benchmark_depth_pipeline,
+    "import_options": benchmark_import_options,
+    "instancing": benchmark_instancing,
+    "lod": benchmark_lod,
+    "render": benchmark_render,
+    "runtime_profile": benchmark_runtime_profile,
+    "textures": benchmark_textures,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=sorted(_BENCHMARKS.keys()),
+        help="Which benchmark to run; may be repeated. Default: all of them.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="How many times to time each case; the median is reported. "
+        "Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--num_objects",
+        type=int,
+        default=50,
+        help="How many objects the synthetic scene contains. "
+        "Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--num_segments",
+        type=int,
+        default=64,
+        help="The resolution of each object's mesh. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--texture_size",
+        type=int,
+        default=512,
+        help="The size of each object's texture image in pixels, or zero for "
+        "untextured objects. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--lod_num_segments",
+        type=int,
+        default=512,
+        help="The resolution of each heavy mesh in the level-of-detail "
+        "benchmark. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--large_texture_size",
+        type=int,
+        default=4096,
+        help="The size of each object's texture image in pixels in the "
+        "texture downscaling benchmark. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--bpy_settings_file",
+        type=Path,
+        metavar="FILE",
+        help="Forwarded to the server; refer to its documentation.",
+    )
+    # These are only for use by benchmark_runtime_profile().
+    parser.add_argument("--runtime_profile_probe", help=argparse.SUPPRESS)
+    parser.add_argument("--scene", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--probe_start", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--probe_output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.runtime_profile_probe is not None:
+        _probe_runtime_profile(args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="drake_blender_bench_") as temp:
+        for name in args.benchmark or sorted(_BENCHMARKS.keys()):
+            _BENCHMARKS[name](temp_dir=Path(temp), args=args)
+
+
+if __name__ == "__main__":
+    main()
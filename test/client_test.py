@@ -0,0 +1,121 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+import asyncio
+import http.server
+import io
+import os
+from pathlib import Path
+import threading
+import unittest
+
+from PIL import Image
+import numpy as np
+from server_test import (
+    DEFAULT_GLTF_FILE,
+    LABEL_PIXEL_THRESHOLD,
+    ServerFixture,
+)
+
+from client import RenderClient, RenderError, ThreadedAsyncRenderClient
+
+
+class ClientTest(ServerFixture):
+    """Tests the client against a real server."""
+
+    def _check_label(self, png, name):
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        rendered_image_path = save_dir / f"client_{name}.png"
+        rendered_image_path.write_bytes(png)
+        self._assert_images_equal(
+            rendered_image_path,
+            "test/label.png",
+            LABEL_PIXEL_THRESHOLD,
+            0.02,
+            f"Rendered image: {rendered_image_path.name} vs test/label.png",
+        )
+
+    def test_render(self):
+        fields = self._create_request_form(image_type="label")
+        with RenderClient(f"http://127.0.0.1:{self.server_port}") as client:
+            self._check_label(client.render(DEFAULT_GLTF_FILE, **fields), "1")
+
+    def test_async(self):
+        """Renders two scenes concurrently, and then a session's scene."""
+        fields = self._create_request_form(image_type="label")
+
+        async def run():
+            async with ThreadedAsyncRenderClient(
+                f"http://127.0.0.1:{self.server_port}", max_in_flight=2
+            ) as client:
+                images = await client.render_many(
+                    [dict(scene=DEFAULT_GLTF_FILE, **fields)] * 2
+                )
+                session_id = await client.create_session(DEFAULT_GLTF_FILE)
+                images.append(
+                    await client.render_session(session_id, **fields)
+                )
+                await client.delete_session(session_id)
+                return images
+
+        for i, png in enumerate(asyncio.run(run())):
+            self._check_label(png, f"async_{i}")
+
+
+class RetryTest(unittest.TestCase):
+    """Tests the client's retries against a stand-in for a busy server."""
+
+    def setUp(self):
+        self.num_requests = 0
+        self.num_unavailable = 2
+        test = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                test.num_requests += 1
+                if test.num_requests <= test.num_unavailable:
+                    self.send_response(503)
+                    self.send_header("Retry-After", "0")
+                    body = b'{"message": "busy"}'
+                    self.send_header("Content-Type", "application/json")
+                else:
+                    self.send_response(200)
+                    body = test.png
+                    self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        buffer = io.BytesIO()
+        Image.fromarray(np.zeros((2, 2), np.uint8)).save(buffer, "PNG")
+        self.png = buffer.getvalue()
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_retry(self):
+        with RenderClient(self.url) as client:
+            self.assertEqual(
+                client.render(b"{}", image_type="color"), self.png
+            )
+        self.assertEqual(self.num_requests, 3)
+
+    def test_give_up(self):
+        self.num_unavailable = 10
+        with RenderClient(self.url, max_retries=1) as client:
+            with self.assertRaises(RenderError) as cm:
+                client.render(b"{}", image_type="color")
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.message, "busy")
+        self.assertEqual(self.num_requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
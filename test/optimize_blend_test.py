@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+from pathlib import Path
+import subprocess
+import unittest
+
+from server_test import (
+    COLOR_PIXEL_THRESHOLD,
+    DEFAULT_BLEND_FILE,
+    DEPTH_PIXEL_THRESHOLD,
+    LABEL_PIXEL_THRESHOLD,
+    ServerFixture,
+)
+
+
+class OptimizedBlendFileServerTest(ServerFixture):
+    """Tests the server with an optimized copy of DEFAULT_BLEND_FILE (with its
+    texture downscaled to half of its size), against the same references as
+    BlendFileServerTest. (The texture's colors come in blocks much bigger than
+    the pixels that get averaged, so only the blocks' edges blur a little.)
+    """
+
+    @classmethod
+    def server_args(cls):
+        output = Path(os.environ["TEST_TMPDIR"]) / "optimized.blend"
+        result = subprocess.run(
+            [
+                Path("optimize_blend").absolute().resolve(),
+                f"--blend_file={DEFAULT_BLEND_FILE}",
+                f"--output={output}",
+                "--max_texture_size=16",
+                "--repeat=1",
+            ],
+            stdout=subprocess.PIPE,
+            check=True,
+            encoding="utf-8",
+        )
+        cls.report = result.stdout
+        return [f"--blend_file={output}"]
+
+    def test_report(self):
+        self.assertIn("Images downscaled: 1", self.report)
+        self.assertIn("Load time (s)", self.report)
+
+    def test_rpc_blend_color_render(self):
+        self._render_and_check(
+            gltf_path="test/one_rgba_box.gltf",
+            image_type="color",
+            reference_image_path="test/one_rgba_one_texture_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD + 2,
+        )
+
+    def test_rpc_blend_depth_render(self):
+        self._render_and_check(
+            gltf_path="test/one_rgba_box.gltf",
+            image_type="depth",
+            reference_image_path="test/depth.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+        )
+
+    def test_rpc_blend_label_render(self):
+        self._render_and_check(
+            gltf_path="test/one_rgba_box.gltf",
+            image_type="label",
+            reference_image_path="test/one_gltf_one_blend.label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
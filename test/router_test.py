@@ -0,0 +1,227 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+import http.server
+import json
+import os
+from pathlib import Path
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+import requests
+
+DEFAULT_GLTF_FILE = "test/two_rgba_boxes.gltf"
+
+
+class RouterTest(unittest.TestCase):
+    """Tests a router in front of two local render servers."""
+
+    def setUp(self):
+        # Render as quickly as possible, i.e., with Cycles at one sample per
+        # pixel.
+        tmpdir = Path(os.environ["TEST_TMPDIR"])
+        settings_path = tmpdir / "bpy_settings.py"
+        with open(settings_path, "w", encoding="utf-8") as f:
+            f.write('bpy.context.scene.render.engine = "CYCLES"\n')
+            f.write("bpy.context.scene.cycles.samples = 1\n")
+
+        self._procs = []
+        self.backend_urls = [
+            self._start("server", f"--bpy_settings_file={settings_path}")
+            for _ in range(2)
+        ]
+        self.router_url = self._start(
+            "router",
+            *[f"--backend={x}" for x in self.backend_urls],
+            "--poll_interval=0.1",
+        )
+
+    def _start(self, program, *args):
+        """Starts the given program on a free port, and returns its URL."""
+        proc = subprocess.Popen(
+            [Path(program).absolute().resolve(), "--port=0", *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        self._procs.append(proc)
+        start_time = time.time()
+        while time.time() < start_time + 30.0:
+            line = proc.stdout.readline().decode("utf-8")
+            print(f"[{program}] {line}", file=sys.stderr, end="")
+            match = re.search(r"Running on (http://127.0.0.1:[0-9]+)", line)
+            if match:
+                break
+        else:
+            self.fail(f"The {program} did not start within 30 seconds")
+        threading.Thread(
+            target=self._echo_output, args=(program, proc.stdout), daemon=True
+        ).start()
+        return match.group(1)
+
+    @staticmethod
+    def _echo_output(program, stdout):
+        for line in stdout:
+            print(
+                f"[{program}] {line.decode('utf-8')}", file=sys.stderr, end=""
+            )
+
+    def tearDown(self):
+        for proc in self._procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self._procs:
+            proc.wait(10.0)
+
+    def _stop_backend(self, url):
+        proc = self._procs[self.backend_urls.index(url)]
+        proc.terminate()
+        proc.wait(10.0)
+
+    def _render(self, gltf):
+        """Renders a small label image of the given glTF data via the router,
+        and returns the http response.
+        """
+        form_data = {
+            "scene_sha256": "NOT_USED_IN_THE_TEST",
+            "image_type": "label",
+            "width": "64",
+            "height": "48",
+            "near": "0.01",
+            "far": "10.0",
+            "focal_x": "57.9",
+            "focal_y": "57.9",
+            "fov_x": "0.785398",
+            "fov_y": "0.785398",
+            "center_x": "31.5",
+            "center_y": "23.5",
+        }
+        return requests.post(
+            url=f"{self.router_url}/render",
+            data=form_data,
+            files={"scene": json.dumps(gltf).encode("utf-8")},
+        )
+
+    def _wait_until_ready(self):
+        start_time = time.time()
+        while requests.get(f"{self.router_url}/readyz").status_code != 200:
+            self.assertLess(time.time(), start_time + 30.0)
+            time.sleep(0.1)
+
+    def _load_scene(self):
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_scene_affinity(self):
+        """Checks that the same assets keep going to the same backend, even
+        as their poses change.
+        """
+        self._wait_until_ready()
+        gltf = self._load_scene()
+        backends = set()
+        for i in range(4):
+            for node in gltf["nodes"]:
+                if "mesh" in node:
+                    node["translation"] = [0.01 * i, 0, 0]
+            response = self._render(gltf)
+            self.assertEqual(response.status_code, 200, response.text)
+            self.assertEqual(response.headers["Content-Type"], "image/png")
+            backends.add(response.headers["X-Render-Backend"])
+        self.assertEqual(len(backends), 1)
+
+    def test_failover(self):
+        """Checks that requests fail over to a live backend, and that the
+        router answers 503 once there are none left.
+        """
+        self._wait_until_ready()
+        gltf = self._load_scene()
+        response = self._render(gltf)
+        self.assertEqual(response.status_code, 200, response.text)
+        first = response.headers["X-Render-Backend"]
+
+        self._stop_backend(first)
+        response = self._render(gltf)
+        self.assertEqual(response.status_code, 200, response.text)
+        second = response.headers["X-Render-Backend"]
+        self.assertNotEqual(second, first)
+
+        self._stop_backend(second)
+        response = self._render(gltf)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_unavailable_backend(self):
+        """Checks that requests fail over from a backend that answers 503 to
+        its render requests (though not to its health checks).
+        """
+
+        class UnavailableHandler(http.server.BaseHTTPRequestHandler):
+            num_renders = 0
+
+            def do_GET(self):
+                self._respond(200, {"status": "ready"})
+
+            def do_POST(self):
+                UnavailableHandler.num_renders += 1
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self._respond(503, {"error": True, "code": 503})
+
+            def _respond(self, code, content):
+                body = json.dumps(content).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        unavailable = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), UnavailableHandler
+        )
+        self.addCleanup(unavailable.server_close)
+        self.addCleanup(unavailable.shutdown)
+        threading.Thread(target=unavailable.serve_forever, daemon=True).start()
+        unavailable_url = f"http://127.0.0.1:{unavailable.server_port}"
+        self.router_url = self._start(
+            "router",
+            f"--backend={unavailable_url}",
+            *[f"--backend={x}" for x in self.backend_urls],
+            "--poll_interval=0.1",
+        )
+        self._wait_until_ready()
+
+        # Each scene (i.e., each color) has its own home backend; keep going
+        # until one of them was the unavailable one.
+        gltf = self._load_scene()
+        for i in range(20):
+            material = gltf["materials"][0]
+            material["pbrMetallicRoughness"]["baseColorFactor"][0] = i / 20
+            response = self._render(gltf)
+            self.assertEqual(response.status_code, 200, response.text)
+            self.assertIn(
+                response.headers["X-Render-Backend"], self.backend_urls
+            )
+            if UnavailableHandler.num_renders > 0:
+                break
+        self.assertGreater(UnavailableHandler.num_renders, 0)
+
+    def test_sessions_unavailable(self):
+        """Checks that the router refuses the /session endpoints, which it
+        doesn't forward.
+        """
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(
+                f"{self.router_url}/session", files={"scene": scene}
+            )
+        self.assertEqual(response.status_code, 501)
+        response = requests.delete(f"{self.router_url}/session/0123")
+        self.assertEqual(response.status_code, 501)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: BSD-2-Clause
+
+import concurrent.futures
+import os
+from pathlib import Path
+import unittest
+
+import requests
+from server_test import DEFAULT_GLTF_FILE, ServerFixture
+
+# Memory leaks are slow, so it takes thousands of frames to tell them apart
+# from noise.
+NUM_FRAMES = 2000
+
+# How much the server's resident memory may grow after its warm-up frames.
+RSS_TOLERANCE_BYTES = 64 * 2**20
+
+
+class MemoryFixture(ServerFixture):
+    """Renders many tiny label images as quickly as possible (i.e., with Cycles
+    at one sample per pixel) while keeping an eye on the server's metrics.
+    """
+
+    @classmethod
+    def server_args(cls):
+        tmpdir = Path(os.environ["TEST_TMPDIR"])
+        settings_path = tmpdir / "bpy_settings.py"
+        with open(settings_path, "w", encoding="utf-8") as f:
+            f.write('bpy.context.scene.render.engine = "CYCLES"\n')
+            f.write("bpy.context.scene.cycles.samples = 1\n")
+        return [f"--bpy_settings_file={settings_path}"]
+
+    def _render_frame(self):
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            form_data = self._create_request_form(image_type="label")
+            form_data.update(
+                width="64", height="48", center_x="31.5", center_y="23.5"
+            )
+            response = requests.post(
+                url=f"http://127.0.0.1:{self.server_port}/render",
+                data=form_data,
+                files={"scene": scene},
+            )
+        self.assertEqual(response.status_code, 200, response.text)
+
+    def _get_metrics(self):
+        response = requests.get(
+            url=f"http://127.0.0.1:{self.server_port}/metrics"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class MemoryGrowthTest(MemoryFixture):
+    """Checks that a long-running server doesn't accumulate datablocks or
+    resident memory."""
+
+    def test_memory_is_bounded(self):
+        for _ in range(100):
+            self._render_frame()
+        baseline = self._get_metrics()
+
+        for i in range(1, NUM_FRAMES + 1):
+            self._render_frame()
+            if i % 250 != 0:
+                continue
+            metrics = self._get_metrics()
+            self.assertEqual(metrics["pid"], baseline["pid"])
+            self.assertEqual(metrics["bpy_data"], baseline["bpy_data"])
+            self.assertLessEqual(
+                metrics["rss_bytes"],
+                baseline["rss_bytes"] + RSS_TOLERANCE_BYTES,
+                f"After {i} frames",
+            )
+
+
+class RecyclingTest(MemoryFixture):
+    """Checks that the server transparently recycles its render process."""
+
+    MAX_REQUESTS = 100
+
+    @classmethod
+    def server_args(cls):
+        return super().server_args() + [f"--max_requests={cls.MAX_REQUESTS}"]
+
+    def test_recycling(self):
+        pids = set()
+        for i in range(1, NUM_FRAMES // 2 + 1):
+            # Every request must succeed, even the ones that happen while a
+            # render process is being replaced.
+            self._render_frame()
+            metrics = self._get_metrics()
+            self.assertLessEqual(metrics["render_count"], self.MAX_REQUESTS)
+            pids.add(metrics["pid"])
+        self.assertGreaterEqual(
+            len(pids), NUM_FRAMES // 2 // self.MAX_REQUESTS
+        )
+
+    def test_concurrent_recycling(self):
+        """Checks that no request fails while a render process is being
+        replaced, even with several clients sending requests at once (so that
+        some are in flight as their process retires).
+        """
+        num_clients = 4
+        num_frames = 3 * self.MAX_REQUESTS // num_clients
+        pids = set()
+
+        def client():
+            for _ in range(num_frames):
+                self._render_frame()
+                pids.add(self._get_metrics()["pid"])
+
+        with concurrent.futures.ThreadPoolExecutor(num_clients) as pool:
+            futures = [pool.submit(client) for _ in range(num_clients)]
+            for future in futures:
+                future.result()
+        self.assertGreaterEqual(len(pids), 2)
+
+    def test_sessions_unavailable(self):
+        """Checks that the /session endpoints are refused, since recycling
+        would silently drop the sessions.
+        """
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(
+                url=f"http://127.0.0.1:{self.server_port}/session",
+                files={"scene": scene},
+            )
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("--max_requests", response.json()["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
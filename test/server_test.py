@@ -1,7 +1,11 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
+import base64
 from collections import namedtuple
+import concurrent.futures
 import datetime
+import email
+import io
 import json
 import os
 from pathlib import Path
@@ -10,6 +14,7 @@ import shutil
 import signal
 import subprocess
 import sys
+import threading
 import time
 import unittest
 
@@ -22,6 +27,14 @@ DEPTH_PIXEL_THRESHOLD = 1  # Depth measurement tolerance in millimeters.
 LABEL_PIXEL_THRESHOLD = 0
 INVALID_PIXEL_FRACTION = 0.02
 
+# Budgets (in seconds) for the server's startup, without the warm-up renders:
+# for `server --help` (which mustn't need to import bpy), and until the server
+# is ready to render. They leave plenty of headroom for slow machines; the
+# point is to catch, e.g., a heavy import that sneaks back onto the startup
+# path.
+HELP_BUDGET_SECONDS = 2.0
+STARTUP_BUDGET_SECONDS = 10.0
+
 # The most basic glTF file containing two diffuse color boxes for testing.
 DEFAULT_GLTF_FILE = "test/two_rgba_boxes.gltf"
 # The basic blend file for testing. It contains only a texture box and a
@@ -29,13 +42,53 @@ DEFAULT_GLTF_FILE = "test/two_rgba_boxes.gltf"
 DEFAULT_BLEND_FILE = "test/one_texture_box.blend"
 
 
+def _record_wall_time(**kwargs):
+    """Prints the given timings, and appends them (as a line of JSON) to the
+    wall_time.jsonl file among the test outputs.
+    """
+    print(f"[timing] {kwargs}", file=sys.stderr)
+    save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+    with open(save_dir / "wall_time.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(kwargs) + "\n")
+
+
+_module_start_time = None
+
+
+def setUpModule():
+    global _module_start_time
+    _module_start_time = time.time()
+
+
+def tearDownModule():
+    _record_wall_time(
+        name=__name__, total_seconds=time.time() - _module_start_time
+    )
+
+
 class ServerFixture(unittest.TestCase):
     """Encapsulates the testing infrastructure, e.g., starting and stopping the
     server subprocess, sending rendering requests, and conducting the per-pixel
     image differencing.
+
+    All of the tests in a class share one server subprocess (with the command
+    line arguments from server_args()), both to save on startup time and to
+    check that the server doesn't carry any state over from one request to
+    the next.
     """
 
-    def setUp(self, extra_server_args=None):
+    @classmethod
+    def server_args(cls):
+        """Returns the extra command line arguments for this class's server,
+        e.g., the path to a blend file.
+        """
+        return []
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._class_start_time = time.time()
+
         # Start the server on the other process. Bind to port 0 and let the OS
         # assign an available port later on.
         server_path = Path("server").absolute().resolve()
@@ -45,31 +98,57 @@ class ServerFixture(unittest.TestCase):
             "--port=0",
         ]
         # Append extra server args, e.g., the path to a blend file.
-        if extra_server_args:
-            server_args.extend(extra_server_args)
+        server_args.extend(cls.server_args())
 
-        self.server_proc = subprocess.Popen(
+        cls.server_proc = subprocess.Popen(
             server_args,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
         )
 
         # Wait to hear which port it's using.
-        self.server_port = None
-        start_time = time.time()
-        while time.time() < start_time + 30.0:
-            line = self.server_proc.stdout.readline().decode("utf-8")
+        cls.server_port = None
+        while time.time() < cls._class_start_time + 30.0:
+            line = cls.server_proc.stdout.readline().decode("utf-8")
             print(f"[server] {line}", file=sys.stderr, end="")
             match = re.search(r"Running on http://127.0.0.1:([0-9]+)", line)
             if match:
-                (self.server_port,) = match.groups()
+                (cls.server_port,) = match.groups()
                 break
         else:
-            self.fail("Could not connect after 30 seconds")
+            cls.server_proc.kill()
+            raise RuntimeError("Could not connect after 30 seconds")
+        cls._startup_seconds = time.time() - cls._class_start_time
+
+        # Keep echoing the server's output, so that it never blocks on a full
+        # pipe during long tests.
+        threading.Thread(
+            target=cls._echo_server_output,
+            args=(cls.server_proc.stdout,),
+            daemon=True,
+        ).start()
+
+    @staticmethod
+    def _echo_server_output(stdout):
+        for line in stdout:
+            print(f"[server] {line.decode('utf-8')}", file=sys.stderr, end="")
 
-    def tearDown(self):
-        self.server_proc.terminate()
-        self.assertEqual(self.server_proc.wait(10.0), -signal.SIGTERM)
+    @classmethod
+    def tearDownClass(cls):
+        cls.server_proc.terminate()
+        returncode = cls.server_proc.wait(10.0)
+        _record_wall_time(
+            name=cls.__name__,
+            startup_seconds=cls._startup_seconds,
+            total_seconds=time.time() - cls._class_start_time,
+        )
+        super().tearDownClass()
+        if returncode != -signal.SIGTERM:
+            raise AssertionError(f"The server exited with {returncode}")
+
+    def setUp(self):
+        # When an earlier test has crashed the shared server, say so up front.
+        self.assertIsNone(self.server_proc.poll(), "The server has exited")
 
     def _render_and_check(
         self,
@@ -101,7 +180,7 @@ class ServerFixture(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
         # Save the output image for offline inspection. It will be archived
-        # into `.bazel/testlogs/server_test/test.outputs/outputs.zip`.
+        # into `.bazel/testlogs/test/server_test_*/test.outputs/outputs.zip`.
         save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
         timestamp = datetime.datetime.now().strftime("%H-%M-%S-%f")
         rendered_image_path = save_dir / f"{timestamp}.png"
@@ -238,6 +317,172 @@ class RpcOnlyServerTest(ServerFixture):
             threshold=DEPTH_PIXEL_THRESHOLD,
         )
 
+    def test_multiple_cameras(self):
+        """Renders several images of one scene in a single request: a color,
+        depth, and label image from the scene's own camera, and another color
+        image from a copy of that camera under a different name.
+        """
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            gltf = json.load(f)
+        (camera_node,) = [x for x in gltf["nodes"] if "camera" in x]
+        gltf["nodes"].append(dict(camera_node, name="Other Camera"))
+        renderer_node = [x for x in gltf["nodes"] if "children" in x][0]
+        renderer_node["children"].append(len(gltf["nodes"]) - 1)
+
+        cameras = [
+            dict(image_type="color"),
+            dict(image_type="depth", min_depth=0.01, max_depth=10.0),
+            dict(image_type="label"),
+            dict(image_type="color", camera="Other Camera"),
+        ]
+        form_data = self._create_request_form(image_type="color")
+        form_data["cameras"] = json.dumps(cameras)
+        response = requests.post(
+            url=f"http://127.0.0.1:{self.server_port}/render",
+            data=form_data,
+            files={"scene": json.dumps(gltf).encode()},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        # Split up the multipart response.
+        content_type = response.headers["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/mixed"))
+        message = email.message_from_bytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + response.content
+        )
+        parts = message.get_payload()
+        self.assertEqual(len(parts), len(cameras))
+
+        references = [
+            ("test/two_rgba_boxes.color.png", COLOR_PIXEL_THRESHOLD),
+            ("test/depth.png", DEPTH_PIXEL_THRESHOLD),
+            ("test/label.png", LABEL_PIXEL_THRESHOLD),
+            ("test/two_rgba_boxes.color.png", COLOR_PIXEL_THRESHOLD),
+        ]
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        for i, (part, (reference, threshold)) in enumerate(
+            zip(parts, references)
+        ):
+            self.assertEqual(part.get_content_type(), "image/png")
+            rendered_image_path = save_dir / f"multiple_cameras_{i}.png"
+            with open(rendered_image_path, "wb") as image:
+                image.write(part.get_payload(decode=True))
+            self._assert_images_equal(
+                rendered_image_path,
+                reference,
+                threshold,
+                INVALID_PIXEL_FRACTION,
+                f"Camera {i}: {part.get_filename()} vs {reference}",
+            )
+
+    def test_quality_tiers(self):
+        """Renders a draft color image and then a default one from the same
+        scene, checking that the draft is full size and that its settings
+        don't leak into the next image.
+        """
+        cameras = [
+            dict(quality="draft", samples=4, denoise=False),
+            dict(),
+        ]
+        form_data = self._create_request_form(image_type="color")
+        form_data["cameras"] = json.dumps(cameras)
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(
+                url=f"http://127.0.0.1:{self.server_port}/render",
+                data=form_data,
+                files={"scene": scene},
+            )
+        self.assertEqual(response.status_code, 200)
+        content_type = response.headers["Content-Type"]
+        message = email.message_from_bytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + response.content
+        )
+        draft, final = message.get_payload()
+
+        image = Image.open(io.BytesIO(draft.get_payload(decode=True)))
+        self.assertEqual(image.size, (640, 480))
+
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        rendered_image_path = save_dir / "quality_tiers.png"
+        with open(rendered_image_path, "wb") as f:
+            f.write(final.get_payload(decode=True))
+        self._assert_images_equal(
+            rendered_image_path,
+            "test/two_rgba_boxes.color.png",
+            COLOR_PIXEL_THRESHOLD,
+            INVALID_PIXEL_FRACTION,
+            "The quality settings leaked from one image into the next",
+        )
+
+    def test_invalid_quality(self):
+        """Checks that out-of-range quality knobs are rejected."""
+        for image_type, name, value in (
+            ("color", "samples", "0"),
+            ("color", "quality", "best"),
+            ("color", "denoise", "maybe"),
+            ("depth", "resolution_percentage", "50"),
+        ):
+            with self.subTest(name=name, value=value):
+                form_data = self._create_request_form(image_type=image_type)
+                form_data[name] = value
+                with open(DEFAULT_GLTF_FILE, "rb") as scene:
+                    response = requests.post(
+                        url=f"http://127.0.0.1:{self.server_port}/render",
+                        data=form_data,
+                        files={"scene": scene},
+                    )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(name, response.json()["message"])
+
+    def test_draft_label_render(self):
+        """Checks that the quality knobs leave label images alone."""
+        form_data = self._create_request_form(image_type="label")
+        form_data.update(quality="draft", samples="1", denoise="true")
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(
+                url=f"http://127.0.0.1:{self.server_port}/render",
+                data=form_data,
+                files={"scene": scene},
+            )
+        self.assertEqual(response.status_code, 200)
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        rendered_image_path = save_dir / "draft_label.png"
+        with open(rendered_image_path, "wb") as f:
+            f.write(response.content)
+        self._assert_images_equal(
+            rendered_image_path,
+            "test/label.png",
+            LABEL_PIXEL_THRESHOLD,
+            INVALID_PIXEL_FRACTION,
+            "The quality knobs changed the label image",
+        )
+
+    def test_invalid_scene(self):
+        """Checks that malformed scenes, and scenes without the requested
+        camera, are rejected before they're imported.
+        """
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            gltf = json.load(f)
+        missing_mesh = json.loads(json.dumps(gltf))
+        missing_mesh["nodes"][0]["mesh"] = len(gltf["meshes"])
+        no_camera = json.loads(json.dumps(gltf))
+        for node in no_camera["nodes"]:
+            if node.get("name") == "Camera Node":
+                node["name"] = "Some Node"
+        for name, scene, message in (
+            ("truncated", json.dumps(gltf)[:100], "JSONDecodeError"),
+            ("missing_mesh", json.dumps(missing_mesh), "nodes[0].mesh"),
+            ("no_camera", json.dumps(no_camera), "Camera Node"),
+        ):
+            with self.subTest(name=name):
+                response = requests.post(
+                    url=f"http://127.0.0.1:{self.server_port}/render",
+                    data=self._create_request_form(image_type="label"),
+                    files={"scene": (f"{name}.gltf", scene.encode())},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()["message"])
+
     def test_consistency(self):
         """Tests the consistency of the render results from consecutive
         requests. Each image type is first rendered and compared with the
@@ -278,12 +523,110 @@ class RpcOnlyServerTest(ServerFixture):
                 invalid_fraction=0.0,
             )
 
+    def test_no_state_leaks(self):
+        """Checks that one request leaves nothing behind that could change the
+        next one. Since every test in a class shares the same server, this is
+        what keeps the tests independent of one another (and of their order).
+        """
+        first_image = self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+        first_counts = self._get_datablock_counts()
+
+        # Render an unrelated scene and other image types in between.
+        self._render_and_check(
+            gltf_path="test/one_rgba_one_texture_boxes.gltf",
+            image_type="color",
+            reference_image_path="test/one_rgba_one_texture_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD,
+        )
+        self._render_and_check(
+            gltf_path="test/one_rgba_one_texture_boxes.gltf",
+            image_type="depth",
+            reference_image_path="test/depth.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+        )
+
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path=first_image,
+            threshold=0.0,
+            invalid_fraction=0.0,
+        )
+        self.assertEqual(self._get_datablock_counts(), first_counts)
+
+    def _get_datablock_counts(self):
+        response = requests.get(
+            url=f"http://127.0.0.1:{self.server_port}/metrics"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["bpy_data"]
+
+
+class NumpyDepthServerTest(ServerFixture):
+    """Tests the server's NumPy depth pipeline against the same references as
+    the default pipeline (see RpcOnlyServerTest).
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--depth_pipeline=numpy"]
+
+    def test_depth_render(self):
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="depth",
+            reference_image_path="test/depth.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+        )
+
+    def test_depth_render_clipped(self):
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="depth",
+            reference_image_path="test/depth_clipped.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+            min_depth=0.32,
+            max_depth=0.33,
+        )
+
+
+class KeepDuplicateMeshesServerTest(ServerFixture):
+    """Tests the server with each client object importing a mesh of its own,
+    against the same references as the default (see RpcOnlyServerTest).
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--keep_duplicate_meshes"]
+
+    def test_color_render(self):
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="color",
+            reference_image_path="test/two_rgba_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD,
+        )
+
+    def test_label_render(self):
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
 
 class BlendFileServerTest(ServerFixture):
     """Tests the server with both RPC data and a blend file as input."""
 
-    def setUp(self):
-        super().setUp(extra_server_args=[f"--blend_file={DEFAULT_BLEND_FILE}"])
+    @classmethod
+    def server_args(cls):
+        return [f"--blend_file={DEFAULT_BLEND_FILE}"]
 
     def test_rpc_blend_color_render(self):
         self._render_and_check(
@@ -312,19 +655,463 @@ class BlendFileServerTest(ServerFixture):
         )
 
 
+class CompositorBlendFileServerTest(ServerFixture):
+    """Tests the server with a blend file whose scene has compositor nodes of
+    its own: a horizontal flip of the whole image, which a settings file adds
+    after the blend file is loaded.
+    """
+
+    @classmethod
+    def server_args(cls):
+        settings_path = Path(os.environ["TEST_TMPDIR"]) / "flip_compositor.py"
+        with open(settings_path, "w", encoding="utf-8") as f:
+            f.write(
+                "scene = bpy.context.scene\n"
+                "scene.use_nodes = True\n"
+                "nodes = scene.node_tree.nodes\n"
+                "links = scene.node_tree.links\n"
+                "nodes.clear()\n"
+                'render_layers = nodes.new("CompositorNodeRLayers")\n'
+                'flip = nodes.new("CompositorNodeFlip")\n'
+                'flip.axis = "X"\n'
+                'composite = nodes.new("CompositorNodeComposite")\n'
+                'links.new(render_layers.outputs["Image"], flip.inputs[0])\n'
+                "links.new(flip.outputs[0], composite.inputs[0])\n"
+            )
+        return [
+            f"--blend_file={DEFAULT_BLEND_FILE}",
+            f"--bpy_settings_file={settings_path}",
+        ]
+
+    def test_rpc_blend_label_render(self):
+        """Checks that the blend file's compositor applies to label images,
+        too.
+        """
+        reference_path = Path(os.environ["TEST_TMPDIR"]) / "flipped.label.png"
+        Image.open("test/one_gltf_one_blend.label.png").transpose(
+            Image.Transpose.FLIP_LEFT_RIGHT
+        ).save(reference_path)
+        self._render_and_check(
+            gltf_path="test/one_rgba_box.gltf",
+            image_type="label",
+            reference_image_path=reference_path,
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+    def test_session_compositor(self):
+        """Renders a session's scene as a color image, a depth image, and
+        another color image, which must still go through the blend file's
+        compositor just like the first one.
+        """
+        url = f"http://127.0.0.1:{self.server_port}"
+        with open("test/one_rgba_box.gltf", "rb") as scene:
+            response = requests.post(f"{url}/session", files={"scene": scene})
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()["session_id"]
+
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        color_paths = []
+        for i, image_type in enumerate(["color", "depth", "color"]):
+            # The same camera as usual, at 1/4 of the resolution.
+            form_data = self._create_request_form(image_type=image_type)
+            form_data.update(
+                width="160",
+                height="120",
+                focal_x="144.853",
+                focal_y="144.853",
+                center_x="79.5",
+                center_y="59.5",
+            )
+            response = requests.post(
+                f"{url}/session/{session_id}/render", data=form_data
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            if image_type == "color":
+                path = save_dir / f"session_compositor_{i}.png"
+                with open(path, "wb") as f:
+                    f.write(response.content)
+                color_paths.append(path)
+        self._assert_images_equal(
+            color_paths[1],
+            color_paths[0],
+            COLOR_PIXEL_THRESHOLD,
+            0,
+            "The depth image spoiled the compositor",
+        )
+
+
+class CryptomatteLabelServerTest(ServerFixture):
+    """Tests the server's cryptomatte label pipeline against the same
+    references as the default pipeline.
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--label_pipeline=cryptomatte"]
+
+    def test_label_render(self):
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+
+class CryptomatteLabelBlendFileServerTest(ServerFixture):
+    """Tests the server's cryptomatte label pipeline with a blend file."""
+
+    @classmethod
+    def server_args(cls):
+        return [
+            "--label_pipeline=cryptomatte",
+            f"--blend_file={DEFAULT_BLEND_FILE}",
+        ]
+
+    def test_label_render(self):
+        # Meshes from the blend file are painted white, like the background.
+        self._render_and_check(
+            gltf_path="test/one_rgba_box.gltf",
+            image_type="label",
+            reference_image_path="test/one_gltf_one_blend.label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+
+class BackgroundCacheServerTest(ServerFixture):
+    """Tests the server's cached background layer against the same references
+    as BlendFileServerTest. Each test renders twice, so that the second render
+    reuses the cached background.
+    """
+
+    @classmethod
+    def server_args(cls):
+        return [
+            f"--blend_file={DEFAULT_BLEND_FILE}",
+            "--background_cache_size=4",
+        ]
+
+    def test_color_render(self):
+        for _ in range(2):
+            self._render_and_check(
+                gltf_path="test/one_rgba_box.gltf",
+                image_type="color",
+                reference_image_path=(
+                    "test/one_rgba_one_texture_boxes.color.png"
+                ),
+                threshold=COLOR_PIXEL_THRESHOLD,
+            )
+
+    def test_depth_render(self):
+        for _ in range(2):
+            self._render_and_check(
+                gltf_path="test/one_rgba_box.gltf",
+                image_type="depth",
+                reference_image_path="test/depth.png",
+                threshold=DEPTH_PIXEL_THRESHOLD,
+            )
+
+    def test_label_render(self):
+        for _ in range(2):
+            self._render_and_check(
+                gltf_path="test/one_rgba_box.gltf",
+                image_type="label",
+                reference_image_path="test/one_gltf_one_blend.label.png",
+                threshold=LABEL_PIXEL_THRESHOLD,
+            )
+
+
+class FrustumCullingServerTest(ServerFixture):
+    """Tests the server's frustum culling against the same references as
+    BlendFileServerTest, with an extra box that lies out of view.
+    """
+
+    @classmethod
+    def server_args(cls):
+        return [
+            f"--blend_file={DEFAULT_BLEND_FILE}",
+            "--frustum_culling_margin=1.0",
+        ]
+
+    def _out_of_view_gltf(self):
+        """Returns the path of a copy of one_rgba_box.gltf with a second box,
+        far beyond the camera's far clipping plane.
+        """
+        with open("test/one_rgba_box.gltf", encoding="utf-8") as f:
+            gltf = json.load(f)
+        gltf["nodes"].append(
+            {
+                "matrix": [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, -50, 0, 1],
+                "mesh": 0,
+                "name": "out_of_view",
+            }
+        )
+        gltf["nodes"][2]["children"].append(len(gltf["nodes"]) - 1)
+        path = Path(os.environ["TEST_TMPDIR"]) / "out_of_view.gltf"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(gltf, f)
+        return path
+
+    def test_color_render(self):
+        self._render_and_check(
+            gltf_path=self._out_of_view_gltf(),
+            image_type="color",
+            reference_image_path="test/one_rgba_one_texture_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD,
+        )
+
+    def test_depth_render(self):
+        self._render_and_check(
+            gltf_path=self._out_of_view_gltf(),
+            image_type="depth",
+            reference_image_path="test/depth.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+        )
+
+    def test_label_render(self):
+        self._render_and_check(
+            gltf_path=self._out_of_view_gltf(),
+            image_type="label",
+            reference_image_path="test/one_gltf_one_blend.label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+
+class LevelOfDetailServerTest(ServerFixture):
+    """Tests the server's level-of-detail proxies against the references for
+    DEFAULT_GLTF_FILE, with its boxes finely subdivided into heavy meshes.
+    (Decimating a flat face loses nothing, so the proxies stay exact.)
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--lod_max_error=4.0"]
+
+    def _heavy_gltf(self, subdivisions=32):
+        """Returns the path of a copy of DEFAULT_GLTF_FILE with each box's
+        faces split into a grid of subdivisions x subdivisions squares.
+        """
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            gltf = json.load(f)
+        for mesh in gltf["meshes"]:
+            (primitive,) = mesh["primitives"]
+            bounds = gltf["accessors"][primitive["attributes"]["POSITION"]]
+            lower, upper = np.array(bounds["min"]), np.array(bounds["max"])
+            steps = np.linspace(0, 1, subdivisions + 1)
+            positions = []
+            indices = []
+            for axis in range(3):
+                for side in (0, 1):
+                    # A grid on the box's face normal to the axis, wound so
+                    # that it faces outward.
+                    u, v = [(axis + 1) % 3, (axis + 2) % 3][:: 2 * side - 1]
+                    grid = np.zeros((len(steps), len(steps), 3))
+                    grid[..., axis] = side
+                    grid[..., u] = steps[:, np.newaxis]
+                    grid[..., v] = steps[np.newaxis, :]
+                    start = len(positions) * len(steps) ** 2
+                    positions.append(lower + grid * (upper - lower))
+                    index = start + np.arange(len(steps) ** 2).reshape(
+                        len(steps), len(steps)
+                    )
+                    a, b = index[:-1, :-1], index[1:, :-1]
+                    c, d = index[1:, 1:], index[:-1, 1:]
+                    indices.append(np.stack([a, b, c, a, c, d], axis=-1))
+            positions = np.concatenate(positions).reshape(-1, 3)
+            indices = np.concatenate(indices).ravel()
+            primitive["attributes"] = {
+                "POSITION": self._add_accessor(
+                    gltf,
+                    positions.astype(np.float32),
+                    5126,
+                    "VEC3",
+                    min=bounds["min"],
+                    max=bounds["max"],
+                )
+            }
+            primitive["indices"] = self._add_accessor(
+                gltf, indices.astype(np.uint32), 5125, "SCALAR"
+            )
+        path = Path(os.environ["TEST_TMPDIR"]) / "heavy_boxes.gltf"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(gltf, f)
+        return path
+
+    @staticmethod
+    def _add_accessor(gltf, array, component_type, kind, **kwargs):
+        """Appends the array to the glTF data as an embedded buffer, and
+        returns the index of its new accessor.
+        """
+        data = array.tobytes()
+        gltf["buffers"].append(
+            {
+                "byteLength": len(data),
+                "uri": "data:application/octet-stream;base64,"
+                + base64.b64encode(data).decode(),
+            }
+        )
+        gltf["bufferViews"].append(
+            {
+                "buffer": len(gltf["buffers"]) - 1,
+                "byteOffset": 0,
+                "byteLength": len(data),
+            }
+        )
+        gltf["accessors"].append(
+            {
+                "bufferView": len(gltf["bufferViews"]) - 1,
+                "componentType": component_type,
+                "count": len(array),
+                "type": kind,
+                **kwargs,
+            }
+        )
+        return len(gltf["accessors"]) - 1
+
+    def test_color_render(self):
+        self._render_and_check(
+            gltf_path=self._heavy_gltf(),
+            image_type="color",
+            reference_image_path="test/two_rgba_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD,
+        )
+
+    def test_depth_render(self):
+        self._render_and_check(
+            gltf_path=self._heavy_gltf(),
+            image_type="depth",
+            reference_image_path="test/depth.png",
+            threshold=DEPTH_PIXEL_THRESHOLD,
+        )
+
+    def test_label_render(self):
+        self._render_and_check(
+            gltf_path=self._heavy_gltf(),
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+
+
+class TextureDownscalingServerTest(ServerFixture):
+    """Tests the server with its texture images downscaled to half of the
+    test texture's size, against the full-size references. (The texture's
+    colors come in blocks much bigger than the pixels that get averaged, so
+    only the blocks' edges blur a little.)
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--max_texture_size=16"]
+
+    def test_texture_color_render(self):
+        self._render_and_check(
+            gltf_path="test/one_rgba_one_texture_boxes.gltf",
+            image_type="color",
+            reference_image_path="test/one_rgba_one_texture_boxes.color.png",
+            threshold=COLOR_PIXEL_THRESHOLD + 2,
+        )
+
+    def test_data_uri_texture_color_render(self):
+        """Checks a texture image embedded as a data uri (instead of in a
+        buffer), twice in a row so that the second render reuses the first
+        one's downscaled image.
+        """
+        with open(
+            "test/one_rgba_one_texture_boxes.gltf", encoding="utf-8"
+        ) as f:
+            gltf = json.load(f)
+        (image,) = gltf["images"]
+        view = gltf["bufferViews"][image.pop("bufferView")]
+        buffer = gltf["buffers"][view["buffer"]]
+        data = base64.b64decode(buffer["uri"].split(",", 1)[1])
+        start = view.get("byteOffset", 0)
+        end = start + view["byteLength"]
+        texture = data[start:end]
+        image["uri"] = "data:image/png;base64," + base64.b64encode(
+            texture
+        ).decode("ascii")
+        path = Path(os.environ["TEST_TMPDIR"]) / "data_uri_texture.gltf"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(gltf, f)
+        for _ in range(2):
+            self._render_and_check(
+                gltf_path=path,
+                image_type="color",
+                reference_image_path=(
+                    "test/one_rgba_one_texture_boxes.color.png"
+                ),
+                threshold=COLOR_PIXEL_THRESHOLD + 2,
+            )
+
+
+class AutoTextureDownscalingServerTest(ServerFixture):
+    """Tests the server with its texture images downscaled to the size of
+    each color image.
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--max_texture_size=auto"]
+
+    def test_session_texture_detail(self):
+        """Renders a session's scene as a tiny color image (which downscales
+        its texture) and then as a full-size one, which must get the
+        texture's full detail back.
+        """
+        url = f"http://127.0.0.1:{self.server_port}"
+        with open("test/one_rgba_one_texture_boxes.gltf", "rb") as scene:
+            response = requests.post(f"{url}/session", files={"scene": scene})
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()["session_id"]
+
+        # The same camera as usual, at 1/40 of the resolution.
+        form_data = self._create_request_form(image_type="color")
+        form_data.update(
+            width="16",
+            height="12",
+            focal_x="14.485",
+            focal_y="14.485",
+            center_x="7.5",
+            center_y="5.5",
+        )
+        response = requests.post(
+            f"{url}/session/{session_id}/render", data=form_data
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = requests.post(
+            f"{url}/session/{session_id}/render",
+            data=self._create_request_form(image_type="color"),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        rendered_image_path = save_dir / "session_texture_detail.png"
+        with open(rendered_image_path, "wb") as f:
+            f.write(response.content)
+        self._assert_images_equal(
+            rendered_image_path,
+            "test/one_rgba_one_texture_boxes.color.png",
+            COLOR_PIXEL_THRESHOLD,
+            INVALID_PIXEL_FRACTION,
+            "The texture stayed downscaled",
+        )
+
+
 class ExtraSettingsServerTest(ServerFixture):
     """Tests the server against custom settings files."""
 
-    def setUp(self):
-        # Create a placeholder settings file.
+    @classmethod
+    def server_args(cls):
+        # Create a placeholder settings file. Each test writes its own
+        # settings into it; the server reads it anew for every request.
         tmpdir = Path(os.environ["TEST_TMPDIR"])
-        self._settings_path = tmpdir / "bpy_settings.py"
-        with open(self._settings_path, "w", encoding="utf-8") as f:
+        cls._settings_path = tmpdir / "bpy_settings.py"
+        with open(cls._settings_path, "w", encoding="utf-8") as f:
             pass
 
         # Tell the server to use it.
-        args = [f"--bpy_settings_file={self._settings_path}"]
-        super().setUp(extra_server_args=args)
+        return [f"--bpy_settings_file={cls._settings_path}"]
 
     def _call_rpc(self, status_code=200):
         """Makes a basic RPC call and returns the http response."""
@@ -354,5 +1141,292 @@ class ExtraSettingsServerTest(ServerFixture):
         self.assertIn("Kilroy was here", error["message"])
 
 
+class MultipleWorkersServerTest(ServerFixture):
+    """Tests the server with several render processes."""
+
+    @classmethod
+    def server_args(cls):
+        return ["--workers=2"]
+
+    def test_concurrent_renders(self):
+        """Checks that concurrent requests are all rendered correctly."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [
+                pool.submit(
+                    self._render_and_check,
+                    gltf_path=DEFAULT_GLTF_FILE,
+                    image_type="label",
+                    reference_image_path="test/label.png",
+                    threshold=LABEL_PIXEL_THRESHOLD,
+                )
+                for _ in range(2)
+            ]
+            for future in futures:
+                future.result()
+
+    def test_sessions_unavailable(self):
+        """Checks that the /session endpoints are refused, since a session
+        would only exist in one of the render processes.
+        """
+        url = f"http://127.0.0.1:{self.server_port}"
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(f"{url}/session", files={"scene": scene})
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("--workers", response.json()["message"])
+        response = requests.delete(f"{url}/session/0123")
+        self.assertEqual(response.status_code, 501)
+
+
+class SchedulerServerTest(ServerFixture):
+    """Tests the server with shortest-expected-first scheduling."""
+
+    @classmethod
+    def server_args(cls):
+        return ["--scheduler=shortest_expected_first"]
+
+    def test_concurrent_renders(self):
+        """Checks that concurrent requests of different costs are all
+        rendered correctly, and that the server learns their costs.
+        """
+        test_cases = [
+            ("label", "test/label.png", LABEL_PIXEL_THRESHOLD),
+            ("depth", "test/depth.png", DEPTH_PIXEL_THRESHOLD),
+        ] * 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [
+                pool.submit(
+                    self._render_and_check,
+                    gltf_path=DEFAULT_GLTF_FILE,
+                    image_type=image_type,
+                    reference_image_path=reference,
+                    threshold=threshold,
+                )
+                for image_type, reference, threshold in test_cases
+            ]
+            for future in futures:
+                future.result()
+
+        url = f"http://127.0.0.1:{self.server_port}"
+        cost_model = requests.get(f"{url}/metrics").json()["cost_model"]
+        self.assertEqual(cost_model["num_samples"], len(test_cases))
+        self.assertGreater(cost_model["weights"]["jobs"], 0)
+
+
+class SessionServerTest(ServerFixture):
+    """Tests rendering via the /session endpoints."""
+
+    def _session_render(self, session_id, image_type, poses=None):
+        """Renders an image of the session's scene, and returns its path."""
+        form_data = self._create_request_form(image_type=image_type)
+        if poses is not None:
+            form_data["poses"] = json.dumps(poses)
+        response = requests.post(
+            url=f"http://127.0.0.1:{self.server_port}/session/{session_id}"
+            "/render",
+            data=form_data,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        save_dir = Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+        timestamp = datetime.datetime.now().strftime("%H-%M-%S-%f")
+        rendered_image_path = save_dir / f"session_{timestamp}.png"
+        with open(rendered_image_path, "wb") as image:
+            image.write(response.content)
+        return rendered_image_path
+
+    def test_session(self):
+        """Uploads a scene once, and then renders it several times: a label
+        image and a color image (which must not be spoiled by the label), and
+        then a label image after moving one of the boxes, which must match a
+        plain /render of the moved scene.
+        """
+        url = f"http://127.0.0.1:{self.server_port}"
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(f"{url}/session", files={"scene": scene})
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()["session_id"]
+
+        for image_type, reference, threshold in (
+            ("label", "test/label.png", LABEL_PIXEL_THRESHOLD),
+            ("color", "test/two_rgba_boxes.color.png", COLOR_PIXEL_THRESHOLD),
+        ):
+            self._assert_images_equal(
+                self._session_render(session_id, image_type),
+                reference,
+                threshold,
+                INVALID_PIXEL_FRACTION,
+                f"Session {image_type} image vs {reference}",
+            )
+
+        # Move the first box sideways, both in the session and in a copy of
+        # the glTF file.
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            gltf = json.load(f)
+        node = gltf["nodes"][0]
+        node["matrix"][12] += 0.05
+        moved_gltf_path = (
+            Path(os.environ["TEST_TMPDIR"]) / "session_moved.gltf"
+        )
+        with open(moved_gltf_path, "w", encoding="utf-8") as f:
+            json.dump(gltf, f)
+        moved = self._session_render(
+            session_id, "label", poses={node["name"]: node["matrix"]}
+        )
+        self._render_and_check(
+            gltf_path=moved_gltf_path,
+            image_type="label",
+            reference_image_path=moved,
+            threshold=LABEL_PIXEL_THRESHOLD,
+            invalid_fraction=0.0,
+        )
+        with self.assertRaises(AssertionError):
+            self._assert_images_equal(
+                moved,
+                "test/label.png",
+                LABEL_PIXEL_THRESHOLD,
+                INVALID_PIXEL_FRACTION,
+                "The box did not move",
+            )
+
+        # Once deleted, the session is gone.
+        response = requests.delete(f"{url}/session/{session_id}")
+        self.assertEqual(response.status_code, 204)
+        response = requests.post(
+            f"{url}/session/{session_id}/render",
+            data=self._create_request_form(image_type="label"),
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class DirtyRegionServerTest(SessionServerTest):
+    """Tests the server's dirty region rendering of sessions against full
+    renders (and reruns the plain session tests, too).
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--dirty_region_max_area=0.5"]
+
+    def test_dirty_region(self):
+        """Renders each image type of a session's scene, and then again twice
+        after nudging one of the boxes. Afterwards (since a plain /render ends
+        the session's residency in Blender) checks every session image
+        against a full render of the moved scene.
+        """
+        url = f"http://127.0.0.1:{self.server_port}"
+        with open(DEFAULT_GLTF_FILE, "rb") as scene:
+            response = requests.post(f"{url}/session", files={"scene": scene})
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()["session_id"]
+        with open(DEFAULT_GLTF_FILE, encoding="utf-8") as f:
+            gltf = json.load(f)
+        node = gltf["nodes"][0]
+
+        rendered = []
+        for step in range(3):
+            moved_gltf_path = (
+                Path(os.environ["TEST_TMPDIR"]) / f"dirty_region_{step}.gltf"
+            )
+            with open(moved_gltf_path, "w", encoding="utf-8") as f:
+                json.dump(gltf, f)
+            for image_type in ("color", "depth", "label"):
+                image = self._session_render(
+                    session_id,
+                    image_type,
+                    poses={node["name"]: node["matrix"]},
+                )
+                rendered.append((moved_gltf_path, image_type, image))
+            node["matrix"][12] += 0.02
+            node["matrix"][13] += 0.01
+
+        # A region of a color image doesn't get quite the same (anti-aliasing)
+        # samples as the whole image, so we allow one level of difference.
+        thresholds = dict(
+            color=COLOR_PIXEL_THRESHOLD + 1,
+            depth=DEPTH_PIXEL_THRESHOLD,
+            label=LABEL_PIXEL_THRESHOLD,
+        )
+        for moved_gltf_path, image_type, image in rendered:
+            self._render_and_check(
+                gltf_path=moved_gltf_path,
+                image_type=image_type,
+                reference_image_path=image,
+                threshold=thresholds[image_type],
+            )
+
+
+class WarmupServerTest(ServerFixture):
+    """Tests the server's warm-up and readiness endpoints."""
+
+    @classmethod
+    def server_args(cls):
+        return ["--warmup_image_types", "label"]
+
+    def test_readiness(self):
+        url = f"http://127.0.0.1:{self.server_port}"
+
+        # The server is alive right away, but not ready until it's warm
+        # (which, on a fast machine, it may already be).
+        response = requests.get(f"{url}/healthz")
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f"{url}/readyz")
+        if response.status_code != 200:
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["status"], "warming_up")
+
+        start_time = time.time()
+        while requests.get(f"{url}/readyz").status_code != 200:
+            self.assertLess(time.time(), start_time + 300.0)
+            time.sleep(0.1)
+
+        # Once warm, it renders just like a cold server would.
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+        response = requests.get(f"{url}/readyz")
+        self.assertEqual(response.status_code, 200)
+
+
+class StartupServerTest(ServerFixture):
+    """Tests the server's startup timeline (as reported by /metrics) against
+    our budgets, with the lean runtime profile.
+    """
+
+    @classmethod
+    def server_args(cls):
+        return ["--bpy_runtime_profile=lean"]
+
+    def test_help_budget(self):
+        start_time = time.time()
+        subprocess.run(
+            [Path("server").absolute().resolve(), "--help"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        self.assertLess(time.time() - start_time, HELP_BUDGET_SECONDS)
+
+    def test_startup_budget(self):
+        url = f"http://127.0.0.1:{self.server_port}"
+        response = requests.get(f"{url}/metrics")
+        self.assertEqual(response.status_code, 200)
+        startup = response.json()["startup"]
+        for stage in ("import_bpy", "addons", "load_base_scene", "ready"):
+            self.assertIn(stage, startup)
+        self.assertLess(startup["ready"], STARTUP_BUDGET_SECONDS, startup)
+
+        # The first render (without a warm-up, that's the first request's)
+        # is part of the timeline, too.
+        self._render_and_check(
+            gltf_path=DEFAULT_GLTF_FILE,
+            image_type="label",
+            reference_image_path="test/label.png",
+            threshold=LABEL_PIXEL_THRESHOLD,
+        )
+        response = requests.get(f"{url}/metrics")
+        self.assertIn("first_render", response.json()["startup"])
+
+
 if __name__ == "__main__":
     unittest.main()